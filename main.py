@@ -1,39 +1,271 @@
 #!/usr/bin/env python3
 
-from time import sleep
+import argparse
+from random import Random
+from time import perf_counter, sleep
 
-from src.games.escalator import EscalatorGame
+from src.agents.escalator import EscalatorAgent
+from src.agents.mcts import MCTS, MCTSAgent, Ponderer, Position
+from src.agents.policies import AgentPolicy, greedy_policy, random_policy
+from src.games.base import Card
+from src.games.escalator import (
+    DECK_SIZE,
+    FULL_PYRAMID_MASK,
+    PYRAMID_ROWS,
+    SLOT_COLS,
+    SLOT_ROWS,
+    BitboardEscalatorGame,
+)
+from src.games.render import TerminalRenderer
+from src.training.metrics import GameStats
+from src.training.rollout import Policy, RolloutFarm
+
+
+def make_policy(name: str, move_time: float, search_workers: int) -> Policy:
+    if name == "random":
+        return random_policy
+    if name == "greedy":
+        return greedy_policy
+    if name == "mcts":
+        return MCTSAgent(time_limit=move_time, num_workers=search_workers)
+    return AgentPolicy(EscalatorAgent(save_itr_count=1))
+
+
+def evaluate(
+    policy: Policy,
+    games: int,
+    workers: int | None,
+    seed: int,
+    detect_dead_ends: bool = False,
+) -> tuple[GameStats, float]:
+    """
+    Play games with a policy, without displaying them.
+
+    Games found to be dead ends are only cut short if asked, as doing so
+    changes the scores and lengths of the games lost.
+
+    Returns:
+        The statistics of the games, and the seconds taken to play them
+    """
+
+    stats = GameStats(seed=seed)
+    start = perf_counter()
+    with RolloutFarm(
+        policy, workers, detect_dead_ends=detect_dead_ends
+    ) as farm:
+        for trajectory in farm.run(range(seed, seed + games)):
+            stats.add_trajectory(trajectory)
+    return stats, perf_counter() - start
+
+
+def watch(
+    policy: Policy, games: int, seed: int, max_fps: float, delay: float
+) -> None:
+    """
+    Play games with a policy, drawing them as they are played.
+    """
+
+    renderer = TerminalRenderer(max_fps=max_fps)
+    wins = 0
+    for number, game_seed in enumerate(range(seed, seed + games), 1):
+        rng = Random(game_seed)
+        game = BitboardEscalatorGame(seed=game_seed)
+        game.deal()
+        renderer.render(game)
+        while not (game.in_winning_state or game.in_losing_state):
+            game.move_action(policy(game, rng))
+            renderer.render(game)
+            if delay > 0:
+                sleep(delay)
+
+        # Only the end of the last game must be drawn
+        wins += game.in_winning_state
+        if renderer.render(game, force=number == games):
+            renderer.status(
+                f"Game {number}: "
+                f"{'won' if game.in_winning_state else 'lost'}"
+                f", {wins} of {number} won"
+            )
+    renderer.close()
+
+
+def read_cards(prompt: str, count: int, unseen: set[int]) -> list[int]:
+    """
+    Ask for cards on one line until they are all cards not yet seen, and
+    take them from those unseen.
+
+    Returns:
+        The values of the cards
+    """
+
+    while True:
+        text = input(f"{prompt}: ")
+        try:
+            cards = [Card.parse(word).value for word in text.split()]
+        except ValueError as error:
+            print(error)
+            continue
+        if len(cards) != count:
+            print(f"Expected {count} card{'s' if count != 1 else ''}")
+        elif len(set(cards)) != count or not unseen.issuperset(cards):
+            print("Cards must be ones not yet seen")
+        else:
+            unseen.difference_update(cards)
+            return cards
+
+
+def play(move_time: float) -> None:
+    """
+    Choose the moves of a game dealt by hand, searching in the background
+    while waiting for the card turned up by each flip of the stock.
+    """
+
+    unseen = set(range(DECK_SIZE))
+    pyramid = []
+    for row in range(PYRAMID_ROWS):
+        pyramid += read_cards(
+            f"Pyramid row {row + 1} from the left", row + 1, unseen
+        )
+    position = Position(tuple(pyramid), 0, -1, tuple(sorted(unseen)))
+
+    tree = MCTS()
+    ponderer = Ponderer(tree)
+    # Each move is searched at least as much as the first move was
+    target = None
+    try:
+        while True:
+            start = perf_counter()
+            tree.set_position(position)
+            if target is None:
+                target = tree.search(time_limit=move_time)
+            elif tree.root.total < target:
+                tree.search(target - tree.root.total, move_time)
+            action = tree.best_action()
+            if action < 0:
+                break
+
+            thought = f"({perf_counter() - start:.2f}s)"
+            if action == 0:
+                print(f"Flip the stock {thought}")
+                ponderer.start(first_action=0)
+                card = read_cards("Card turned up", 1, unseen)[0]
+                ponderer.stop()
+                position = position.after(0, card)
+            else:
+                slot = action - 1
+                print(
+                    f"Clear {Card.DECK[position.pyramid[slot]]} from row "
+                    f"{SLOT_ROWS[slot] + 1}, position {SLOT_COLS[slot] + 1}"
+                    f" {thought}"
+                )
+                position = position.after(action)
+    finally:
+        ponderer.close()
+    print("Won!" if position.cleared == FULL_PYRAMID_MASK else "Lost")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Escalator Solitaire")
+    parser.add_argument(
+        "--headless", action="store_true",
+        help="play many games without displaying them, and report results",
+    )
+    parser.add_argument(
+        "--play", action="store_true",
+        help="choose the moves of a game dealt by hand, by searching",
+    )
+    parser.add_argument(
+        "--games", type=int, default=None,
+        help="number of games to play (defaults to 1000 headless, or 1)",
+    )
+    parser.add_argument(
+        "--policy", choices=("random", "greedy", "agent", "mcts"),
+        default="random",
+        help="policy choosing the moves",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="number of worker processes, 0 to play in this process "
+        "(defaults to one per CPU)",
+    )
+    parser.add_argument(
+        "--move-time", type=float, default=0.1,
+        help="seconds of search per move for the mcts policy, or to play",
+    )
+    parser.add_argument(
+        "--search-workers", type=int, default=0,
+        help="number of worker processes searching for the mcts policy, "
+        "0 to search in this process",
+    )
+    parser.add_argument(
+        "--detect-dead-ends", action="store_true",
+        help="end games headless as soon as they cannot be won, which is "
+        "faster but lowers the scores and lengths of the games lost",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="seed of the first game"
+    )
+    parser.add_argument(
+        "--fps", type=float, default=30.0,
+        help="most frames drawn per second, frames beyond are dropped "
+        "(0 for no limit)",
+    )
+    parser.add_argument(
+        "--delay", type=float, default=0.05,
+        help="seconds to wait after each move while watching",
+    )
+    args = parser.parse_args()
+    if args.headless and args.search_workers != 0 and args.workers != 0:
+        # Games played in worker processes cannot share the searchers
+        parser.error("--search-workers needs --workers 0 when headless")
+    if args.games is not None and args.games < 1:
+        parser.error("--games must be at least 1")
 
-    def clear_screen():
-        print("\033c", end="")
-        # print("\033[H\033[J", end="")
-
-    def move_cursor_up(n):
-        print("\033[{}A".format(n), end="")
-
-    game = EscalatorGame()
-    game.deal()
-    num_lines = game.display().count("\n") + 1
-
-    while not (game.in_winning_state or game.in_losing_state):
-        # Display
-        clear_screen()
-        print(game.display())
-        print()
-        # print([move[1] for move in game.available_moves])
-        # move = int(input("Move: "))
-        if len(game.available_moves) == 1:
-            move = game.available_moves[0][1]
+    if args.play:
+        try:
+            play(args.move_time)
+        except (EOFError, KeyboardInterrupt):
+            # Input ended, so the game is abandoned
+            print()
+    else:
+        policy = make_policy(
+            args.policy, args.move_time, args.search_workers
+        )
+        if args.headless:
+            games = 1000 if args.games is None else args.games
+            stats, elapsed = evaluate(
+                policy, games, args.workers, args.seed,
+                args.detect_dead_ends,
+            )
+            score = stats.score.summary()
+            length = stats.length.summary()
+            chain = stats.chain.summary()
+            moves = stats.flips + stats.clears
+            print(f"Games:         {games}")
+            print(f"Win rate:      {stats.win_rate:.2%}")
+            print(
+                f"Score:         {score['mean']:.2f} average, "
+                f"{score['p50']:.0f} median, {score['p90']:.0f} p90"
+            )
+            print(
+                f"Game length:   {length['mean']:.1f} moves average, "
+                f"{length['p90']:.0f} p90"
+            )
+            if chain["count"] != 0:
+                print(
+                    f"Chains:        {chain['mean']:.2f} clears average, "
+                    f"{chain['max']:.0f} longest"
+                )
+            print(
+                f"Moves:         {stats.clears / moves:.1%} clears, "
+                f"{stats.flips / moves:.1%} flips"
+            )
+            print(f"Moves/sec:     {moves / elapsed:.0f}")
+            print(f"Games/sec:     {games / elapsed:.1f}")
         else:
-            move = game.available_moves[1][1]
-        game.move(move)
-        move_cursor_up(num_lines + 3)
-        sleep(0.05)
-
-    print(game.display())
-    print()
-    print()
-    print(f"Game over! You {'won' if game.in_winning_state else 'lost'}!")
+            watch(
+                policy, 1 if args.games is None else args.games,
+                args.seed, args.fps, args.delay,
+            )
+        if isinstance(policy, MCTSAgent):
+            policy.close()
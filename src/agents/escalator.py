@@ -6,30 +6,64 @@ Reinformcement Learning Agent for Escalator Solitaire
 
 from pathlib import Path
 
+import numpy as np
+
+from src.agents.replay import ReplayBuffer
+from src.games.escalator import OBSERVATION_SIZE
+from src.instrumentation import timed
+from src.training.checkpoints import (
+    CheckpointWriter,
+    checkpoint_paths,
+    load_checkpoint,
+)
+
 
 class EscalatorAgent:
     """
     Agent for playing Escalator Solitaire.
 
     Offline learning agent.
+
+    Saves of the model are written in the background, so the agent must be
+    closed, or used in a with block, for the newest save to be written
+    before the process exits;
+        with EscalatorAgent(save_itr_count=100) as agent:
+            ...
     """
 
-    def __init__(self, save_itr_count: int):
+    def __init__(
+        self,
+        save_itr_count: int,
+        history_capacity: int = 100_000,
+        batch_size: int = 64,
+        keep_checkpoints: int = 3,
+        save_path: Path = Path("models", "escalator_agent"),
+    ):
         """
         Args:
             save_itr_count: The number of iterations between saving the model.
+            history_capacity: The number of observations kept to learn from.
+            batch_size: The number of transitions learnt from at a time.
+            keep_checkpoints: The number of newest saves kept.
+            save_path: The directory the model is saved to.
         """
 
-        # The model is saved to checkpoint training progress
+        # The model is saved to checkpoint training progress, in the
+        # background so that learning carries on while it is written
         self._iteration = 0
         self._save_itr_count = save_itr_count
-        self._save_path = Path("models", "escalator_agent")
-        self._save_path.mkdir(parents=True, exist_ok=True)
-
-        # Stateful information
-        self._history = []
-
-    def decide_move(self, state: list[list], available_moves: list) -> int:
+        # The directory is only made on the first save, so that an agent
+        # only playing leaves nothing behind
+        self._save_path = Path(save_path)
+        self._keep_checkpoints = keep_checkpoints
+        self._checkpoints: CheckpointWriter | None = None
+
+        # Stateful information, see EscalatorGame.observation()
+        self._batch_size = batch_size
+        self._history = ReplayBuffer(history_capacity, (OBSERVATION_SIZE,))
+
+    @timed
+    def decide_move(self, state: np.ndarray, available_moves: list) -> int:
         """
         Choose an action to take.
 
@@ -44,10 +78,10 @@ class EscalatorAgent:
 
     def observe(
         self,
-        state: list[list],
+        state: np.ndarray,
         action: int,
         reward: int,
-        next_state: list[list],
+        next_state: np.ndarray,
         is_terminal_state: bool = False,
     ) -> None:
         """
@@ -61,31 +95,95 @@ class EscalatorAgent:
             is_terminal_state: Whether the next state is a terminal state.
         """
 
-        # We track all of the moves and states in the game to learn offline
-        self._history.append((state, action, reward, next_state))
+        # We track the moves and states of recent games to learn offline
+        self._history.add(state, action, reward, next_state, is_terminal_state)
 
-        # We learn from the final results of the game
+        # We learn at the end of each game
         if is_terminal_state:
             self.learn()
-            self._history.clear()
 
+    @timed
     def learn(self) -> None:
         """
         Learn from the observed results.
         """
 
-        # Learn the effects of actions towards final state
-        for state, action, reward, next_state in reversed(self._history):
-            pass
+        # TODO: learn the effects of actions from minibatches of the recent
+        # games, self._history.sample(self._batch_size), once there is a
+        # model to train. Until then nothing is sampled, as it would only
+        # be thrown away.
 
         # Save the model every so often
         self._iteration += 1
         if self._iteration % self._save_itr_count == 0:
             self.save_model()
 
+    def state_dict(self) -> dict[str, np.ndarray]:
+        """
+        A copy of the state of the agent, as arrays by name.
+        """
+
+        state = {"iteration": np.array(self._iteration)}
+        for name, array in self._history.state_dict().items():
+            state["history." + name] = array
+        return state
+
+    def load_state_dict(self, state: dict[str, np.ndarray]) -> None:
+        """
+        Restore the state of the agent from state_dict().
+        """
+
+        self._iteration = int(state["iteration"])
+        self._history.load_state_dict({
+            name.removeprefix("history."): array
+            for name, array in state.items()
+            if name.startswith("history.")
+        })
+
     def save_model(self) -> None:
         """
-        Save the model.
+        Save the model, without waiting for it to be written.
         """
 
-        pass
+        # The writer thread is only started once needed
+        if self._checkpoints is None:
+            self._checkpoints = CheckpointWriter(
+                self._save_path, self._keep_checkpoints
+            )
+        self._checkpoints.submit(self._iteration, self.state_dict())
+
+    def load_model(self, path: Path | None = None) -> bool:
+        """
+        Load a saved model.
+
+        Args:
+            path: The save to load, or None for the newest.
+
+        Returns:
+            Whether there was a save to load
+        """
+
+        if self._checkpoints is not None:
+            self._checkpoints.flush()
+        if path is None:
+            paths = checkpoint_paths(self._save_path)
+            if len(paths) == 0:
+                return False
+            path = paths[-1]
+        self.load_state_dict(load_checkpoint(path))
+        return True
+
+    def close(self) -> None:
+        """
+        Finish writing any save of the model.
+        """
+
+        if self._checkpoints is not None:
+            self._checkpoints.close()
+            self._checkpoints = None
+
+    def __enter__(self) -> "EscalatorAgent":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
@@ -0,0 +1,662 @@
+#!/usr/bin/env python3
+
+"""
+Monte Carlo Tree Search agent for Escalator Solitaire
+
+The pyramid and the waste are in plain sight, but the order of the stock is
+not, so each iteration of the search deals the unseen cards into the stock
+in a random order, and plays that deal down the tree. Clearing a slot always
+leads to the same position, while flipping the stock leads to one of many,
+so the children of a node are keyed by the action, and for a flip also by
+the card that was turned up. The statistics used to choose an action are
+kept per action, over all of the cards it has turned up.
+
+Positions are simulated directly on bit masks (see BitboardEscalatorGame),
+with the game only read to set up the root. A rollout clears a card at
+random whenever it can, and otherwise flips the stock, and is scored by the
+fraction of the pyramid cleared, so a win scores 1.
+
+Between moves the subtree below the move made, and the card it turned up, is
+kept as the new root. Searches can also run across worker processes, each
+growing its own tree from the same position (root parallelisation), with the
+action statistics of all the trees summed to choose the move.
+
+While waiting on a player, such as for the card turned up by a flip, a
+Ponderer keeps searching the tree in a background thread. The flip's
+subtree then already holds a search below each card it may turn up.
+"""
+
+import multiprocessing
+import signal
+import threading
+from math import log, sqrt
+from random import Random
+from time import perf_counter
+from typing import NamedTuple
+
+from src.games.escalator import (
+    ADJACENT_RANKS,
+    BLOCKER_MASKS,
+    FULL_PYRAMID_MASK,
+    NUM_ACTIONS,
+    PYRAMID_SIZE,
+    SLOT_PARENTS,
+    BaseEscalatorGame,
+)
+
+
+# How often the clock is checked, in iterations
+_CLOCK_INTERVAL = 16
+
+
+class Position(NamedTuple):
+    """
+    What can be seen of a game.
+    """
+
+    # The card in each pyramid slot, -1 once cleared
+    pyramid: tuple[int, ...]
+    # The mask of cleared slots
+    cleared: int
+    # The card on the waste, -1 if empty
+    waste: int
+    # The cards in the stock, in no particular order
+    stock: tuple[int, ...]
+
+    @classmethod
+    def of(cls, game: BaseEscalatorGame) -> "Position":
+        """
+        The position of a game, with the order of its stock hidden.
+        """
+
+        observation = game.observation()
+        pyramid = tuple(int(card) for card in observation[:PYRAMID_SIZE])
+        cleared = 0
+        for slot, card in enumerate(pyramid):
+            if card < 0:
+                cleared |= 1 << slot
+        stock = tuple(sorted(
+            card.value for card in game.stock if card is not None
+        ))
+        return cls(pyramid, cleared, int(observation[PYRAMID_SIZE]), stock)
+
+    def follows(self, previous: "Position") -> bool:
+        """
+        Whether the position could be reached from the previous position.
+        """
+
+        return all(
+            card == previous.pyramid[slot]
+            for slot, card in enumerate(self.pyramid)
+            if card >= 0
+        ) and self.cleared & previous.cleared == previous.cleared
+
+    def after(self, action: int, card: int = -1) -> "Position":
+        """
+        The position after a move.
+
+        Args:
+            action: The action index of the move.
+            card: The card turned up, for a flip of the stock.
+
+        Raises:
+            ValueError: If the card turned up is not in the stock
+        """
+
+        if action == 0:
+            if card not in self.stock:
+                raise ValueError("Card is not in the stock")
+            stock = list(self.stock)
+            stock.remove(card)
+            return self._replace(waste=card, stock=tuple(stock))
+
+        slot = action - 1
+        pyramid = list(self.pyramid)
+        pyramid[slot] = -1
+        return self._replace(
+            pyramid=tuple(pyramid),
+            cleared=self.cleared | 1 << slot,
+            waste=self.pyramid[slot],
+        )
+
+
+class Node:
+    """
+    A position in the search tree, with statistics for each action from it.
+    """
+
+    __slots__ = ("visits", "values", "total", "children")
+
+    def __init__(self):
+        self.visits = [0] * NUM_ACTIONS
+        self.values = [0.0] * NUM_ACTIONS
+        self.total = 0
+        # Keyed by the action, or NUM_ACTIONS + card for a flip
+        self.children: dict[int, "Node"] = {}
+
+
+class MCTS:
+    """
+    Search tree for one process.
+    """
+
+    def __init__(self, exploration: float = 0.7, seed: int | None = None):
+        """
+        Args:
+            exploration: The UCT exploration constant.
+            seed: Seed for dealing the stock and the rollouts.
+        """
+
+        self._exploration = exploration
+        self._rng = Random(seed)
+        self._position: Position | None = None
+        self._root = Node()
+        self._ranks: list[int] = []
+        self._rank_masks: list[int] = []
+        self._exposed = 0
+
+    @property
+    def root(self) -> Node:
+        return self._root
+
+    @property
+    def legal_actions(self) -> int:
+        """
+        The legal actions from the root, as a bit mask (see EscalatorGame).
+        """
+
+        position = self._position
+        if position is None or position.cleared == FULL_PYRAMID_MASK:
+            return 0
+        legal = 1 if len(position.stock) != 0 else 0
+        if position.waste >= 0:
+            rank_up, rank_down = ADJACENT_RANKS[position.waste // 4 + 1]
+            legal |= (
+                (self._rank_masks[rank_up] | self._rank_masks[rank_down])
+                & self._exposed
+            ) << 1
+        return legal
+
+    def best_action(self) -> int:
+        """
+        The most visited legal action from the root, or -1 if there are no
+        legal actions.
+        """
+
+        legal = self.legal_actions
+        visits = self._root.visits
+        return max(
+            (action for action in range(NUM_ACTIONS) if legal >> action & 1),
+            key=lambda action: visits[action],
+            default=-1,
+        )
+
+    def set_position(self, position: Position) -> bool:
+        """
+        Move the root to the position, keeping the subtree below it if it is
+        one move on from the current root.
+
+        Returns:
+            Whether the tree was kept
+        """
+
+        reused = False
+        if position == self._position:
+            reused = True
+        elif (
+            self._position is not None
+            and position.follows(self._position)
+        ):
+            child = self._root.children.get(self._child_key(position))
+            if child is not None:
+                self._root = child
+                reused = True
+        if not reused:
+            self._root = Node()
+
+        self._position = position
+        self._ranks = [card // 4 + 1 for card in position.pyramid]
+        self._rank_masks = [0] * 14
+        self._exposed = 0
+        for slot in range(PYRAMID_SIZE):
+            if position.cleared >> slot & 1:
+                continue
+            self._rank_masks[self._ranks[slot]] |= 1 << slot
+            blockers = BLOCKER_MASKS[slot]
+            if position.cleared & blockers == blockers:
+                self._exposed |= 1 << slot
+        return reused
+
+    def search(
+        self,
+        iterations: int | None = None,
+        time_limit: float | None = None,
+        first_action: int | None = None,
+    ) -> int:
+        """
+        Grow the tree from the root, until either budget is spent.
+
+        Args:
+            iterations: The most iterations to run.
+            time_limit: The most seconds to search for.
+            first_action: The action to take from the root, to search only
+                below it, or None to choose as usual.
+
+        Returns:
+            The number of iterations run
+
+        Raises:
+            ValueError: If there is no budget, no position to search, or the
+                first action is not legal
+        """
+
+        if iterations is None and time_limit is None:
+            raise ValueError("No search budget")
+        if self._position is None:
+            raise ValueError("No position to search")
+        if first_action is not None and not (
+            self.legal_actions >> first_action & 1
+        ):
+            raise ValueError("Invalid move")
+
+        deadline = None if time_limit is None else perf_counter() + time_limit
+        done = 0
+        while iterations is None or done < iterations:
+            if (
+                deadline is not None
+                and done % _CLOCK_INTERVAL == 0
+                and perf_counter() >= deadline
+            ):
+                break
+            self._iterate(first_action)
+            done += 1
+        return done
+
+    def _child_key(self, position: Position) -> int:
+        """
+        The key of the child of the root leading to the position, or -1.
+        """
+
+        previous = self._position
+        newly_cleared = position.cleared & ~previous.cleared
+        if newly_cleared == 0:
+            # A flip, turning up the card now on the waste
+            if (
+                len(position.stock) + 1 == len(previous.stock)
+                and position.waste in previous.stock
+            ):
+                return NUM_ACTIONS + position.waste
+        elif (
+            newly_cleared & newly_cleared - 1 == 0
+            and position.stock == previous.stock
+        ):
+            # A single slot cleared
+            return newly_cleared.bit_length()
+        return -1
+
+    def _iterate(self, first_action: int | None) -> None:
+        """
+        Deal the unseen stock, select down the tree, expand one node, roll
+        out, and back up the result.
+        """
+
+        rng = self._rng
+        ranks = self._ranks
+        rank_masks = self._rank_masks
+        position = self._position
+
+        stock = list(position.stock)
+        rng.shuffle(stock)
+        cleared = position.cleared
+        exposed = self._exposed
+        waste_rank = position.waste // 4 + 1 if position.waste >= 0 else 0
+
+        node = self._root
+        path = []
+        while cleared != FULL_PYRAMID_MASK:
+            playable = 0
+            if waste_rank != 0:
+                rank_up, rank_down = ADJACENT_RANKS[waste_rank]
+                playable = (
+                    (rank_masks[rank_up] | rank_masks[rank_down]) & exposed
+                )
+            if playable == 0 and len(stock) == 0:
+                break
+
+            if first_action is None:
+                action = self._select(node, playable, len(stock) != 0)
+            else:
+                action = first_action
+                first_action = None
+            path.append((node, action))
+            if action == 0:
+                card = stock.pop()
+                waste_rank = card // 4 + 1
+                key = NUM_ACTIONS + card
+            else:
+                slot = action - 1
+                cleared |= 1 << slot
+                exposed &= ~(1 << slot)
+                for parent in SLOT_PARENTS[slot]:
+                    blockers = BLOCKER_MASKS[parent]
+                    if cleared & blockers == blockers:
+                        exposed |= 1 << parent
+                waste_rank = ranks[slot]
+                key = action
+
+            child = node.children.get(key)
+            if child is None:
+                node.children[key] = Node()
+                break
+            node = child
+
+        value = self._rollout(cleared, exposed, stock, waste_rank)
+        for node, action in path:
+            node.visits[action] += 1
+            node.values[action] += value
+            node.total += 1
+
+    def _select(self, node: Node, playable: int, can_flip: bool) -> int:
+        """
+        Choose the action to take from the node by UCT, trying every action
+        once first.
+        """
+
+        actions = []
+        if can_flip:
+            actions.append(0)
+        while playable:
+            slot = playable.bit_length() - 1
+            playable ^= 1 << slot
+            actions.append(slot + 1)
+
+        visits = node.visits
+        untried = [action for action in actions if visits[action] == 0]
+        if len(untried) != 0:
+            return self._rng.choice(untried)
+
+        values = node.values
+        scale = self._exploration * sqrt(log(node.total))
+        return max(
+            actions,
+            key=lambda action: (
+                values[action] / visits[action]
+                + scale / sqrt(visits[action])
+            ),
+        )
+
+    def _rollout(
+        self, cleared: int, exposed: int, stock: list[int], waste_rank: int
+    ) -> float:
+        """
+        Play out the game, clearing a card at random whenever possible.
+
+        Returns:
+            The fraction of the pyramid cleared
+        """
+
+        rng = self._rng
+        ranks = self._ranks
+        rank_masks = self._rank_masks
+        while True:
+            playable = 0
+            if waste_rank != 0:
+                rank_up, rank_down = ADJACENT_RANKS[waste_rank]
+                playable = (
+                    (rank_masks[rank_up] | rank_masks[rank_down]) & exposed
+                )
+            if playable:
+                slots = []
+                while playable:
+                    slot = playable.bit_length() - 1
+                    playable ^= 1 << slot
+                    slots.append(slot)
+                slot = rng.choice(slots)
+                cleared |= 1 << slot
+                exposed &= ~(1 << slot)
+                for parent in SLOT_PARENTS[slot]:
+                    blockers = BLOCKER_MASKS[parent]
+                    if cleared & blockers == blockers:
+                        exposed |= 1 << parent
+                waste_rank = ranks[slot]
+            elif len(stock) != 0:
+                waste_rank = stock.pop() // 4 + 1
+            else:
+                break
+        return cleared.bit_count() / PYRAMID_SIZE
+
+
+class Ponderer:
+    """
+    Searches a tree in a background thread, such as while waiting for the
+    card turned up by a flip of the stock;
+        ponderer.start(first_action=0)
+        card = input()
+        ponderer.stop()
+        tree.set_position(position.after(0, card))
+
+    The tree must only be used by others while the ponderer is stopped.
+    """
+
+    def __init__(self, tree: MCTS, chunk: int = 64):
+        """
+        Args:
+            tree: The tree to search.
+            chunk: The iterations searched at a time, and so the most that
+                stopping can wait for.
+        """
+
+        self._tree = tree
+        self._chunk = chunk
+        self._first_action = None
+        self._iterations = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            with self._lock:
+                if self._closed:
+                    return
+                if self._wake.is_set():
+                    self._iterations += self._tree.search(
+                        self._chunk, first_action=self._first_action
+                    )
+
+    def start(self, first_action: int | None = None) -> bool:
+        """
+        Start searching from the root of the tree.
+
+        Args:
+            first_action: The action to search below, or None for all.
+
+        Returns:
+            Whether there is anything to search
+        """
+
+        legal = self._tree.legal_actions
+        if first_action is not None:
+            legal &= 1 << first_action
+        if legal == 0:
+            return False
+        with self._lock:
+            self._first_action = first_action
+            self._iterations = 0
+            self._wake.set()
+        return True
+
+    def stop(self) -> int:
+        """
+        Stop searching, once the current chunk is done.
+
+        Returns:
+            The number of iterations searched since started
+        """
+
+        self._wake.clear()
+        with self._lock:
+            return self._iterations
+
+    def close(self) -> None:
+        """
+        Stop searching, and end the thread.
+        """
+
+        with self._lock:
+            self._closed = True
+            self._wake.set()
+        self._thread.join()
+
+
+def _run_worker(connection, exploration: float, seed: int | None) -> None:
+    """
+    Serve searches from the parent, keeping the tree between them.
+    """
+
+    # Interrupts are handled by the parent, which then stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    tree = MCTS(exploration, seed)
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        position, iterations, time_limit = request
+        tree.set_position(position)
+        done = tree.search(iterations, time_limit)
+        connection.send((tree.root.visits, tree.root.values, done))
+    connection.close()
+
+
+class MCTSAgent:
+    """
+    Chooses moves by Monte Carlo Tree Search.
+
+    Can be used as a policy (see policies.py). With workers, use as a
+    context manager so that they are shut down when done;
+        with MCTSAgent(time_limit=0.1, num_workers=4) as agent:
+            action = agent(game, rng)
+    """
+
+    def __init__(
+        self,
+        iterations: int | None = None,
+        time_limit: float | None = None,
+        num_workers: int = 0,
+        exploration: float = 0.7,
+        seed: int | None = None,
+    ):
+        """
+        Args:
+            iterations: The most iterations per move, in each process.
+            time_limit: The most seconds to search per move.
+            num_workers: The number of worker processes to search in, 0 to
+                search in this process.
+            exploration: The UCT exploration constant.
+            seed: Seed for the searches, each worker is seeded from it.
+
+        Raises:
+            ValueError: If there is no budget per move
+        """
+
+        if iterations is None and time_limit is None:
+            raise ValueError("No search budget")
+        self._iterations = iterations
+        self._time_limit = time_limit
+        self._tree = MCTS(exploration, seed)
+        self._last_iterations = 0
+        self._last_elapsed = 0.0
+
+        self._workers = []
+        for worker in range(num_workers):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_run_worker,
+                args=(
+                    child, exploration,
+                    None if seed is None else seed + worker + 1,
+                ),
+                daemon=True,
+            )
+            process.start()
+            child.close()
+            self._workers.append((process, parent))
+
+    @property
+    def last_iterations(self) -> int:
+        """
+        The number of iterations run for the last move, over all processes.
+        """
+        return self._last_iterations
+
+    @property
+    def simulations_per_second(self) -> float:
+        """
+        The rate of iterations for the last move, over all processes.
+        """
+        if self._last_elapsed == 0:
+            return 0.0
+        return self._last_iterations / self._last_elapsed
+
+    def __enter__(self) -> "MCTSAgent":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __call__(self, game: BaseEscalatorGame, rng: Random) -> int:
+        return self.decide_action(game)
+
+    def decide_action(self, game: BaseEscalatorGame) -> int:
+        """
+        Choose the move to make.
+
+        Returns:
+            The action index of the move
+
+        Raises:
+            ValueError: If the game has no legal moves
+        """
+
+        legal = game.legal_actions
+        if legal == 0:
+            raise ValueError("No legal moves")
+
+        start = perf_counter()
+        position = Position.of(game)
+        for _, connection in self._workers:
+            connection.send((position, self._iterations, self._time_limit))
+
+        self._tree.set_position(position)
+        done = self._tree.search(self._iterations, self._time_limit)
+        visits = list(self._tree.root.visits)
+        for _, connection in self._workers:
+            worker_visits, _, worker_done = connection.recv()
+            done += worker_done
+            visits = [a + b for a, b in zip(visits, worker_visits)]
+
+        self._last_iterations = done
+        self._last_elapsed = perf_counter() - start
+
+        # The most visited action, which must be legal here
+        return max(
+            (action for action in range(NUM_ACTIONS) if legal >> action & 1),
+            key=lambda action: visits[action],
+        )
+
+    def close(self) -> None:
+        """
+        Shut down the worker processes.
+        """
+
+        for process, connection in self._workers:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            connection.close()
+            process.join()
+        self._workers = []
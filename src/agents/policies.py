@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+"""
+Simple policies for Escalator Solitaire
+
+A policy is a function taking the game and a random number generator, and
+returning the action index of the move to make (see EscalatorGame). Policies
+are plain functions (or picklable objects) so that they can be sent to
+worker processes.
+"""
+
+from random import Random
+
+from src.agents.escalator import EscalatorAgent
+from src.games.escalator import DESTINATION_ACTIONS, BaseEscalatorGame
+
+
+def legal_actions(game: BaseEscalatorGame) -> list[int]:
+    """
+    The action indices of the legal moves, in order.
+    """
+
+    actions = []
+    bits = game.legal_actions
+    while bits:
+        lowest = bits & -bits
+        actions.append(lowest.bit_length() - 1)
+        bits ^= lowest
+    return actions
+
+
+def random_policy(game: BaseEscalatorGame, rng: Random) -> int:
+    """
+    Make any legal move, all equally likely.
+    """
+    return rng.choice(legal_actions(game))
+
+
+def greedy_policy(game: BaseEscalatorGame, rng: Random) -> int:
+    """
+    Clear a card whenever possible, choosing the clear that leaves the most
+    cards to clear next (ties broken at random), and otherwise flip.
+    """
+
+    clears = [action for action in legal_actions(game) if action != 0]
+    if len(clears) == 0:
+        return 0
+
+    best = []
+    most = -1
+    for action in clears:
+        game.move_action(action, record=True)
+        follow_ups = (game.legal_actions >> 1).bit_count()
+        game.undo()
+        if follow_ups > most:
+            best = [action]
+            most = follow_ups
+        elif follow_ups == most:
+            best.append(action)
+    return rng.choice(best)
+
+
+class AgentPolicy:
+    """
+    Make the moves chosen by an agent.
+
+    The agent is sent along with the policy to worker processes, so each
+    worker plays with its own copy of it.
+    """
+
+    def __init__(self, agent: EscalatorAgent):
+        self._agent = agent
+
+    def __call__(self, game: BaseEscalatorGame, rng: Random) -> int:
+        moves = game.available_moves
+        index = self._agent.decide_move(game.observation(), moves)
+        return DESTINATION_ACTIONS[moves[index][1]]
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+
+"""
+Replay buffer
+
+A fixed capacity ring of transitions, held in contiguous arrays.
+
+Each observation is only stored once. The transitions of an episode are
+added in order, so the next state of a transition is the observation in the
+following slot of the ring, and only the last observation of an episode has
+no transition of its own.
+"""
+
+import numpy as np
+
+
+class ReplayBuffer:
+    """
+    Ring buffer of transitions, with uniform and prioritized sampling.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        observation_shape: tuple[int, ...],
+        observation_dtype: np.dtype = np.int8,
+        alpha: float = 0.6,
+        seed: int | None = None,
+    ):
+        """
+        Args:
+            capacity: The number of observations held, the oldest are
+                overwritten once full.
+            observation_shape: The shape of a single observation.
+            observation_dtype: The type of the observations.
+            alpha: How strongly priorities weight prioritized sampling, 0
+                for uniform.
+            seed: Seed for the sampling.
+        """
+
+        if capacity < 2:
+            raise ValueError("Capacity must be at least 2")
+
+        self._capacity = capacity
+        self._alpha = alpha
+        self._rng = np.random.default_rng(seed)
+
+        self._observations = np.zeros(
+            (capacity, *observation_shape), dtype=observation_dtype
+        )
+        self._actions = np.zeros(capacity, dtype=np.int16)
+        self._rewards = np.zeros(capacity, dtype=np.float32)
+        self._dones = np.zeros(capacity, dtype=bool)
+        # Whether a slot starts a transition, so its next state is held
+        self._valid = np.zeros(capacity, dtype=bool)
+        # Priority ** alpha of each slot, 0 for slots that are not valid
+        self._priorities = np.zeros(capacity, dtype=np.float64)
+        self._max_priority = 1.0
+
+        self._head = 0
+        self._size = 0
+        self._transitions = 0
+        # Whether the last observation written is the next state of an
+        # episode still being played
+        self._open = False
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def __len__(self) -> int:
+        """
+        The number of transitions that can be sampled.
+        """
+        return self._transitions
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The memory held by the buffer's arrays.
+        """
+        return sum(
+            array.nbytes for array in (
+                self._observations, self._actions, self._rewards,
+                self._dones, self._valid, self._priorities,
+            )
+        )
+
+    def add(
+        self,
+        state: np.ndarray,
+        action: int,
+        reward: float,
+        next_state: np.ndarray,
+        done: bool,
+    ) -> int:
+        """
+        Add a transition.
+
+        The state is only stored if it starts an episode, otherwise it is
+        taken to be the next state of the transition before.
+
+        Args:
+            state: The observation the action was taken from.
+            action: The action taken.
+            reward: The reward for the action.
+            next_state: The observation after the action.
+            done: Whether the next state ends the episode.
+
+        Returns:
+            The index of the transition
+        """
+
+        if not self._open:
+            self._write(state)
+        index = (self._head - 1) % self._capacity
+        self._actions[index] = action
+        self._rewards[index] = reward
+        self._dones[index] = done
+        self._write(next_state)
+
+        # The next state is in place, so the transition can now be sampled
+        self._valid[index] = True
+        self._priorities[index] = self._max_priority
+        self._transitions += 1
+        self._open = not done
+        return index
+
+    def sample(
+        self, batch_size: int
+    ) -> tuple[np.ndarray, ...]:
+        """
+        Sample transitions uniformly.
+
+        Args:
+            batch_size: The number of transitions to sample.
+
+        Returns:
+            The states, actions, rewards, next states, done flags and
+            indices of the transitions
+
+        Raises:
+            ValueError: If there are no transitions to sample
+        """
+
+        if self._transitions == 0:
+            raise ValueError("No transitions to sample")
+
+        # Only the last observation of each episode is not a transition, so
+        # redrawing those rarely takes more than a round or two
+        indices = self._rng.integers(0, self._size, batch_size)
+        invalid = ~self._valid[indices]
+        while invalid.any():
+            indices[invalid] = self._rng.integers(
+                0, self._size, invalid.sum()
+            )
+            invalid = ~self._valid[indices]
+        return self._gather(indices)
+
+    def sample_prioritized(
+        self, batch_size: int, beta: float = 0.4
+    ) -> tuple[np.ndarray, ...]:
+        """
+        Sample transitions in proportion to their priority.
+
+        Args:
+            batch_size: The number of transitions to sample.
+            beta: How much to correct for the bias of prioritized sampling,
+                1 for fully.
+
+        Returns:
+            The states, actions, rewards, next states, done flags and
+            indices of the transitions, and their importance weights
+
+        Raises:
+            ValueError: If there are no transitions to sample
+        """
+
+        if self._transitions == 0:
+            raise ValueError("No transitions to sample")
+
+        cumulative = np.cumsum(self._priorities[:self._size])
+        total = cumulative[-1]
+        indices = np.searchsorted(
+            cumulative, self._rng.random(batch_size) * total, side="right"
+        )
+        np.minimum(indices, self._size - 1, out=indices)
+
+        probabilities = self._priorities[indices] / total
+        weights = (self._transitions * probabilities) ** -beta
+        weights /= weights.max()
+        return (*self._gather(indices), weights.astype(np.float32))
+
+    def update_priorities(
+        self, indices: np.ndarray, priorities: np.ndarray
+    ) -> None:
+        """
+        Set the priorities of sampled transitions, such as their TD errors.
+
+        Args:
+            indices: The indices of the transitions.
+            priorities: Their new priorities, greater than 0.
+        """
+
+        priorities = np.asarray(priorities, dtype=np.float64)
+        self._max_priority = max(
+            self._max_priority, float(priorities.max()) ** self._alpha
+        )
+        indices = np.asarray(indices)
+        still_valid = self._valid[indices]
+        self._priorities[indices[still_valid]] = (
+            priorities[still_valid] ** self._alpha
+        )
+
+    def state_dict(self) -> dict[str, np.ndarray]:
+        """
+        A copy of the contents of the buffer, as arrays by name.
+        """
+
+        return {
+            "observations": self._observations.copy(),
+            "actions": self._actions.copy(),
+            "rewards": self._rewards.copy(),
+            "dones": self._dones.copy(),
+            "valid": self._valid.copy(),
+            "priorities": self._priorities.copy(),
+            "counters": np.array(
+                [self._head, self._size, self._transitions, self._open],
+                dtype=np.int64,
+            ),
+            "max_priority": np.array(self._max_priority),
+        }
+
+    def load_state_dict(self, state: dict[str, np.ndarray]) -> None:
+        """
+        Replace the contents of the buffer with those from state_dict().
+
+        Raises:
+            ValueError: If the contents do not fit the buffer
+        """
+
+        if state["observations"].shape != self._observations.shape:
+            raise ValueError("State does not match the buffer")
+
+        for name in (
+            "observations", "actions", "rewards", "dones", "valid",
+            "priorities",
+        ):
+            getattr(self, "_" + name)[...] = state[name]
+        head, size, transitions, is_open = state["counters"].tolist()
+        self._head = head
+        self._size = size
+        self._transitions = transitions
+        self._open = bool(is_open)
+        self._max_priority = float(state["max_priority"])
+
+    def _write(self, observation: np.ndarray) -> None:
+        """
+        Write an observation at the head of the ring.
+        """
+
+        index = self._head
+        if self._valid[index]:
+            # Overwriting the oldest transition
+            self._valid[index] = False
+            self._priorities[index] = 0
+            self._transitions -= 1
+        self._observations[index] = observation
+        self._head = (index + 1) % self._capacity
+        self._size = min(self._size + 1, self._capacity)
+
+    def _gather(self, indices: np.ndarray) -> tuple[np.ndarray, ...]:
+        return (
+            self._observations[indices],
+            self._actions[indices],
+            self._rewards[indices],
+            self._observations[(indices + 1) % self._capacity],
+            self._dones[indices],
+            indices,
+        )
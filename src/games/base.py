@@ -41,10 +41,21 @@ The common game workflow is as follows;
 
 """
 
+from random import Random
+from typing import Sequence
+
+import numpy as np
+
+from src.instrumentation import timed
+
 
 class Card:
     """
     Represents a playing card.
+
+    There is only one instance of each of the 52 cards, which is shared
+    between every deck and game. Cards cannot be changed, and whether a card
+    is face up is down to the pile it is in (see SolitaireGame).
     """
 
     RANKS = (
@@ -59,12 +70,21 @@ class Card:
         "\N{BLACK DIAMOND SUIT}",
     ]
 
-    def __init__(self, rank: int, suit: int, visible: bool = False):
+    # Every card, indexed by value
+    DECK: tuple["Card", ...] = ()
+
+    __slots__ = ("rank", "suit", "value", "_str")
+
+    rank: int
+    suit: int
+    # The value encodes the specific card out of 52 to a unique integer
+    value: int
+
+    def __new__(cls, rank: int, suit: int) -> "Card":
         """
         Args:
             rank: The numeric value of the card
-            suit: The suit of the card (index into )
-            visible: Whether the card is has the playing side facing up
+            suit: The suit of the card (index into SUITS)
         """
 
         # Sanity checks
@@ -73,51 +93,78 @@ class Card:
         if suit < 0 or suit > 3:
             raise ValueError("Suit must be between 0 and 3")
 
-        self._rank = rank
-        self._suit = suit
-        self._visible = visible
-
-    @property
-    def rank(self) -> int:
-        return self._rank
-
-    @property
-    def suit(self) -> int:
-        return self._suit
+        return cls.DECK[(rank - 1) * 4 + suit]
 
-    @property
-    def visible(self) -> bool:
-        return self._visible
+    @classmethod
+    def _create(cls, value: int) -> "Card":
+        card = object.__new__(cls)
+        object.__setattr__(card, "rank", value // 4 + 1)
+        object.__setattr__(card, "suit", value % 4)
+        object.__setattr__(card, "value", value)
+        object.__setattr__(
+            card, "_str", Card.RANKS[card.rank] + Card.SUITS[card.suit]
+        )
+        return card
 
-    @property
-    def value(self) -> int:
+    @classmethod
+    def parse(cls, text: str) -> "Card":
         """
-        The value of the card.
-        This value encodes the specific card out of 52 to a unique integer.
+        Read a card as written by str(), or with the suit as a letter, such
+        as "AS", "XD" or "10d".
 
-        Missing cards value = 0
-        Flipped cards value = 1
-        Other cards value = func(rank, suit)
+        Raises:
+            ValueError: If the text is not a card
         """
 
-        if not self._visible:
-            return 1
-        return (self._rank - 1) * 4 + self._suit
+        text = text.strip().upper()
+        rank = _PARSE_RANKS.get(text[:-1])
+        suit = _PARSE_SUITS.get(text[-1:])
+        if rank is None or suit is None:
+            raise ValueError(f"Invalid card: {text!r}")
+        return cls(rank, suit)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Cards cannot be changed")
+
+    def __reduce__(self):
+        return Card, (self.rank, self.suit)
+
+    def __copy__(self) -> "Card":
+        return self
+
+    def __deepcopy__(self, memo) -> "Card":
+        return self
 
     def __str__(self) -> str:
-        if self.visible:
-            str_rank = Card.RANKS[self._rank]
-            str_suit = Card.SUITS[self._suit]
-        else:
-            str_rank = "?"
-            str_suit = "?"
-        return f"[{str_rank}{str_suit}]"
+        return self._str
+
+    def __repr__(self) -> str:
+        return f"Card({self.rank}, {self.suit})"
 
-    def flip(self):
-        self._visible = True
 
-    def hide(self):
-        self._visible = False
+Card.DECK = tuple(Card._create(value) for value in range(52))
+
+# What Card.parse() accepts for each rank and suit
+_PARSE_RANKS = {
+    name: rank for rank, name in enumerate(Card.RANKS) if rank != 0
+} | {"10": 10, "T": 10}
+_PARSE_SUITS = {
+    symbol: suit for suit, symbol in enumerate(Card.SUITS)
+} | {letter: suit for suit, letter in enumerate("SCHD")}
+
+
+def _zobrist_keys(rng: Random, places: int) -> list[list[int]]:
+    return [[rng.getrandbits(64) for _ in range(52)] for _ in range(places)]
+
+
+# Zobrist keys, one per card for every place in every pile that it can be.
+# These come from a fixed seed so that hashes agree between processes.
+_zobrist_rng = Random(0x5011)
+ZOBRIST_STOCK = _zobrist_keys(_zobrist_rng, 52)
+ZOBRIST_WASTE = _zobrist_keys(_zobrist_rng, 52)
+ZOBRIST_FOUNDATION = _zobrist_keys(_zobrist_rng, 8)  # By pile, not position
+ZOBRIST_TABLEAU = [_zobrist_keys(_zobrist_rng, 20) for _ in range(13)]
+ZOBRIST_RESERVE = _zobrist_keys(_zobrist_rng, 52)
 
 
 class SolitaireGame:
@@ -125,6 +172,27 @@ class SolitaireGame:
     Base class for all solitaire games.
     """
 
+    # Whether the cards in each pile are face up
+    STOCK_VISIBLE = False
+    WASTE_VISIBLE = True
+    FOUNDATION_VISIBLE = True
+    TABLEAU_VISIBLE = True
+    RESERVE_VISIBLE = True
+
+    # Each pile is encoded as a plane of one flag per card, and a count of
+    # the cards in the pile that are not visible
+    ENCODED_PILES = 5
+    ENCODED_PILE_SIZE = 52 + 1
+    ENCODING_SIZE = ENCODED_PILES * ENCODED_PILE_SIZE
+
+    # Or with rank_only, a count of the visible cards of each rank instead
+    RANK_ENCODED_PILE_SIZE = 13 + 1
+    RANK_ENCODING_SIZE = ENCODED_PILES * RANK_ENCODED_PILE_SIZE
+
+    # Whether the foundation is part of the state hash, games where it takes
+    # no part in play leave it out so that more states hash the same
+    HASH_FOUNDATION = True
+
     def __init__(self):
         self._stock: list[Card] = []
         self._waste: list[Card] = []
@@ -135,12 +203,22 @@ class SolitaireGame:
         self._restock_cycle_remaining = 0
         self._score = 0
 
+        # Undo entries of the moves made with record=True, most recent last
+        self._journal: list[tuple] = []
+
+        # Zobrist hash of the state, kept up to date by move()
+        self._hash = 0
+
+        # Bumped by every change to the state, so that anything derived from
+        # the state can be cached until the state next changes
+        self._version = 0
+
     @staticmethod
     def create_deck() -> list[Card]:
         """
         Create a deck of cards.
         """
-        return [Card(rank, suit) for rank in range(1, 14) for suit in range(4)]
+        return list(Card.DECK)
 
     @property
     def in_winning_state(self) -> bool:
@@ -204,6 +282,52 @@ class SolitaireGame:
     def score(self) -> int:
         return self._score
 
+    @property
+    def version(self) -> int:
+        """
+        Counter of the changes made to the game state.
+        """
+        return self._version
+
+    @property
+    def state_hash(self) -> int:
+        """
+        64 bit Zobrist hash of the game state.
+
+        This is kept up to date as moves are made, see compute_hash().
+        """
+        return self._hash
+
+    def compute_hash(self) -> int:
+        """
+        Compute the Zobrist hash of the game state from scratch.
+
+        The hash is the XOR of a key for every card in the game, chosen by
+        the card and where it is. Only the set of cards in a foundation pile
+        counts, as those cannot be played in order anyway.
+        """
+
+        state_hash = 0
+        for position, card in enumerate(self.stock):
+            if card is not None:
+                state_hash ^= ZOBRIST_STOCK[position][card.value]
+        for position, card in enumerate(self.waste):
+            if card is not None:
+                state_hash ^= ZOBRIST_WASTE[position][card.value]
+        if self.HASH_FOUNDATION:
+            for pile, cards in enumerate(self.foundation):
+                for card in cards:
+                    if card is not None:
+                        state_hash ^= ZOBRIST_FOUNDATION[pile][card.value]
+        for row, cards in enumerate(self.tableau):
+            for col, card in enumerate(cards):
+                if card is not None:
+                    state_hash ^= ZOBRIST_TABLEAU[row][col][card.value]
+        for position, card in enumerate(self.reserve):
+            if card is not None:
+                state_hash ^= ZOBRIST_RESERVE[position][card.value]
+        return state_hash
+
     def update_available_moves(self) -> None:
         """
         Update the list of available moves.
@@ -239,7 +363,9 @@ class SolitaireGame:
             "deal() must be implemented by subclasses to set up the game."
         )
 
-    def move(self, source: int, destination: int) -> int:
+    def move(
+        self, source: int, destination: int, record: bool = False
+    ) -> int:
         """
         The Agent / User makes an effect on the world state.
 
@@ -257,6 +383,7 @@ class SolitaireGame:
         Args:
             source: The index of the source to move from
             destination: The index of the destination to move to
+            record: Whether to record the move so that it can be undone
 
         Returns:
             The score for the move
@@ -269,22 +396,146 @@ class SolitaireGame:
             " logic."
         )
 
+    def undo(self) -> None:
+        """
+        Take back the last move that was recorded, restoring the game to
+        exactly the state before it.
+
+        This method should be overridden by subclasses that record moves.
+
+        Raises:
+            ValueError: If there is no recorded move to undo
+        """
+        raise NotImplementedError(
+            "undo() must be implemented by subclasses to take back moves."
+        )
+
+    @timed
     def encode(self) -> list[list[int]]:
         """
         Encode the current game state into a list of integers.
+
+        Missing cards value = 0
+        Face down cards value = 1
+        Other cards value = Card.value
         """
 
-        def encode_pile(pile: list[Card]) -> list[int]:
-            return [card.value for card in pile]
+        def encode_pile(pile: list[Card], visible: bool) -> list[int]:
+            return [
+                0 if card is None else card.value if visible else 1
+                for card in pile
+            ]
 
         return (
-            encode_pile(self.stock),
-            encode_pile(self.waste),
-            [encode_pile(pile) for pile in self.foundation],
-            [encode_pile(pile) for pile in self.tableau],
-            encode_pile(self.reserve),
+            encode_pile(self.stock, self.STOCK_VISIBLE),
+            encode_pile(self.waste, self.WASTE_VISIBLE),
+            [
+                encode_pile(pile, self.FOUNDATION_VISIBLE)
+                for pile in self.foundation
+            ],
+            [
+                encode_pile(pile, self.TABLEAU_VISIBLE)
+                for pile in self.tableau
+            ],
+            encode_pile(self.reserve, self.RESERVE_VISIBLE),
+        )
+
+    @timed
+    def encode_into(
+        self, buffer: np.ndarray, rank_only: bool = False
+    ) -> np.ndarray:
+        """
+        Encode the current game state into a fixed length array.
+
+        The piles are encoded in the same order as encode(), each as a plane
+        flagging the visible cards in the pile, followed by the count of the
+        cards in the pile that are not visible.
+
+        Encoding only the ranks gives the same encoding to states that only
+        differ by suits, which is all that matters in some games.
+
+        Args:
+            buffer: The array of ENCODING_SIZE (or RANK_ENCODING_SIZE) to
+                write the encoding into
+            rank_only: Whether to count the visible cards of each rank,
+                rather than flag each card
+
+        Returns:
+            The buffer
+        """
+
+        buffer[:] = 0
+        piles = (
+            (self.stock, self.STOCK_VISIBLE),
+            (self.waste, self.WASTE_VISIBLE),
+            (
+                [card for pile in self.foundation for card in pile],
+                self.FOUNDATION_VISIBLE,
+            ),
+            (
+                [card for pile in self.tableau for card in pile],
+                self.TABLEAU_VISIBLE,
+            ),
+            (self.reserve, self.RESERVE_VISIBLE),
+        )
+        plane_size = (
+            self.RANK_ENCODED_PILE_SIZE if rank_only
+            else self.ENCODED_PILE_SIZE
+        )
+        for plane, (pile, visible) in enumerate(piles):
+            offset = plane * plane_size
+            cards = [card for card in pile if card is not None]
+            if not visible:
+                buffer[offset + plane_size - 1] = len(cards)
+            elif rank_only:
+                ranks = [offset + card.rank - 1 for card in cards]
+                np.add.at(buffer, ranks, 1)
+            else:
+                buffer[[offset + card.value for card in cards]] = 1
+        return buffer
+
+    def encode_array(self, rank_only: bool = False) -> np.ndarray:
+        """
+        Encode the current game state into a new fixed length array.
+        See encode_into().
+        """
+        size = self.RANK_ENCODING_SIZE if rank_only else self.ENCODING_SIZE
+        return self.encode_into(
+            np.zeros(size, dtype=np.float32), rank_only
         )
 
+    @staticmethod
+    def encode_batch(
+        games: Sequence["SolitaireGame"],
+        out: np.ndarray | None = None,
+        rank_only: bool = False,
+    ) -> np.ndarray:
+        """
+        Encode many games into the rows of one array.
+        See encode_into().
+
+        Args:
+            games: The games to encode, all of the same kind
+            out: The array to write the encodings into, a new one is made if
+                not given
+            rank_only: Whether to encode only the ranks of the cards
+
+        Returns:
+            The array of encodings, one row per game
+        """
+
+        if out is None:
+            size = 0
+            if len(games) != 0:
+                size = (
+                    games[0].RANK_ENCODING_SIZE if rank_only
+                    else games[0].ENCODING_SIZE
+                )
+            out = np.zeros((len(games), size), dtype=np.float32)
+        for row, game in zip(out, games):
+            game.encode_into(row, rank_only)
+        return out
+
     def display(self) -> str:
         """
         Display the current game state.
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+"""
+Deals of a 52 card deck
+
+A deal is a permutation of card indices (see Card.value). Each of the 52!
+deals is numbered by its Lehmer code, so any deal can be named by a single
+integer, and deals can be drawn in bulk from a seeded generator.
+"""
+
+from math import factorial
+from typing import Sequence
+
+import numpy as np
+
+from src.games.base import Card
+
+
+DECK_SIZE = len(Card.DECK)
+NUM_DEALS = factorial(DECK_SIZE)
+
+_FACTORIALS = tuple(factorial(n) for n in range(DECK_SIZE))
+
+
+def deal_from_index(index: int) -> list[int]:
+    """
+    The deal numbered by the index.
+
+    Args:
+        index: The number of the deal, from 0 (the unshuffled deck) to
+            NUM_DEALS - 1.
+
+    Returns:
+        The card indices of the deal
+
+    Raises:
+        ValueError: If there is no deal with the index
+    """
+
+    if not 0 <= index < NUM_DEALS:
+        raise ValueError("Invalid deal index")
+
+    cards = list(range(DECK_SIZE))
+    deal = []
+    for position in range(DECK_SIZE - 1, -1, -1):
+        digit, index = divmod(index, _FACTORIALS[position])
+        deal.append(cards.pop(digit))
+    return deal
+
+
+def deal_to_index(deal: Sequence[int]) -> int:
+    """
+    The number of the deal, the inverse of deal_from_index().
+
+    Raises:
+        ValueError: If the deal is not a permutation of the card indices
+    """
+
+    cards = list(range(DECK_SIZE))
+    if sorted(deal) != cards:
+        raise ValueError("Invalid deal")
+
+    index = 0
+    for position, card in zip(range(DECK_SIZE - 1, -1, -1), deal):
+        digit = cards.index(card)
+        cards.pop(digit)
+        index += digit * _FACTORIALS[position]
+    return index
+
+
+def generate_deals(
+    count: int, seed: int | np.random.Generator | None = None
+) -> np.ndarray:
+    """
+    Draw deals uniformly at random.
+
+    Args:
+        count: The number of deals.
+        seed: Seed for the deals, or the generator to draw them from.
+
+    Returns:
+        The deals, one per row, as a (count, 52) array of card indices
+    """
+
+    deals = np.tile(np.arange(DECK_SIZE, dtype=np.uint8), (count, 1))
+    np.random.default_rng(seed).permuted(deals, axis=1, out=deals)
+    return deals
@@ -30,22 +30,461 @@ Scoring:
     multiplies the score based on the chain of cards removed.
 """
 
-from random import shuffle
+from random import Random
+from typing import Sequence
 
-from src.games.base import SolitaireGame, Card
+import numpy as np
 
+from src.games.base import (
+    ZOBRIST_STOCK,
+    ZOBRIST_TABLEAU,
+    ZOBRIST_WASTE,
+    SolitaireGame,
+    Card,
+)
+from src.games.deals import deal_from_index
+from src.instrumentation import timed
 
-class EscalatorGame(SolitaireGame):
-    """Represents a game of Escalator Solitaire."""
 
-    def __init__(self):
+# The pyramid is 7 rows tall, and its slots are numbered row by row from the
+# peak. Slot s is at SLOT_ROWS[s], SLOT_COLS[s] and is the destination
+# SLOT_DESTINATIONS[s] of a move.
+PYRAMID_ROWS = 7
+PYRAMID_SIZE = PYRAMID_ROWS * (PYRAMID_ROWS + 1) // 2
+DECK_SIZE = 52
+SLOT_ROWS = tuple(row for row in range(PYRAMID_ROWS) for _ in range(row + 1))
+SLOT_COLS = tuple(col for row in range(PYRAMID_ROWS) for col in range(row + 1))
+SLOT_DESTINATIONS = tuple(
+    (row + 1) * 10 + col + 1 for row, col in zip(SLOT_ROWS, SLOT_COLS)
+)
+DESTINATION_SLOTS = {dest: slot for slot, dest in enumerate(SLOT_DESTINATIONS)}
+
+# A slot is blocked by the two slots below it, and blocks the (up to) two
+# slots above it.
+SLOT_BLOCKERS = tuple(
+    ()
+    if row == PYRAMID_ROWS - 1
+    else (slot + row + 1, slot + row + 2)
+    for slot, row in enumerate(SLOT_ROWS)
+)
+SLOT_PARENTS = tuple(
+    tuple(parent for parent in range(PYRAMID_SIZE)
+          if slot in SLOT_BLOCKERS[parent])
+    for slot in range(PYRAMID_SIZE)
+)
+BLOCKER_MASKS = tuple(
+    sum(1 << blocker for blocker in blockers) for blockers in SLOT_BLOCKERS
+)
+FULL_PYRAMID_MASK = (1 << PYRAMID_SIZE) - 1
+
+
+def _above_masks() -> tuple[int, ...]:
+    # Parents always have lower slot numbers, so are done first
+    above = []
+    for slot in range(PYRAMID_SIZE):
+        above.append(0)
+        for parent in SLOT_PARENTS[slot]:
+            above[slot] |= 1 << parent | above[parent]
+    return tuple(above)
+
+
+# The slots that cannot be cleared until the slot itself is cleared
+ABOVE_MASKS = _above_masks()
+
+# Moves also have a dense action index, 0 flips the stock and 1 + slot
+# clears that pyramid slot
+NUM_ACTIONS = PYRAMID_SIZE + 1
+ACTION_DESTINATIONS = (0,) + SLOT_DESTINATIONS
+DESTINATION_ACTIONS = {
+    dest: action for action, dest in enumerate(ACTION_DESTINATIONS)
+}
+_ACTION_BITS = np.left_shift(1, np.arange(NUM_ACTIONS, dtype=np.int64))
+
+# A compact observation is the card in each pyramid slot (-1 once cleared),
+# the card on the waste (-1 if empty), and the number of cards in the stock
+OBSERVATION_SIZE = PYRAMID_SIZE + 2
+
+# Zobrist keys of the cards in each slot, and on top of the waste
+_SLOT_ZOBRIST = tuple(
+    ZOBRIST_TABLEAU[row][col] for row, col in zip(SLOT_ROWS, SLOT_COLS)
+)
+_WASTE_ZOBRIST = ZOBRIST_WASTE[0]
+
+# Ranks in a rank key are 4 bits each, see EscalatorGame.rank_key
+_WASTE_RANK_SHIFT = 4 * PYRAMID_SIZE
+_STOCK_RANK_SHIFT = _WASTE_RANK_SHIFT + 4
+_NIBBLE_SPREAD = tuple(
+    sum(0xF << 4 * bit for bit in range(7) if bits >> bit & 1)
+    for bits in range(1 << 7)
+)
+
+# Where each card goes in the array encodings
+_DECK_VALUES = tuple(range(DECK_SIZE))
+_DECK_RANKS_FROM_ZERO = tuple(card // 4 for card in range(DECK_SIZE))
+
+# The ranks a card can be played on, wrapping King to Ace
+ADJACENT_RANKS = tuple(
+    ((rank % 13) + 1, ((rank - 2) % 13) + 1) if rank else ()
+    for rank in range(14)
+)
+
+# Sets of ranks as bit masks, bit r for rank r
+ALL_RANKS = sum(1 << rank for rank in range(1, 14))
+_ADJACENT_RANK_BITS = tuple(
+    sum(1 << adjacent for adjacent in ADJACENT_RANKS[rank])
+    for rank in range(14)
+)
+
+
+def find_dead_end(
+    rank_masks: Sequence[int],
+    remaining: int,
+    spare_ranks: int,
+    ranks: int = ALL_RANKS,
+) -> bool:
+    """
+    Whether some card left in the pyramid can never be cleared.
+
+    A card can only be cleared onto a card of an adjacent rank on the waste,
+    which can only come from the waste as it is, the stock, or a pyramid card
+    cleared before it, so any card left that is not above it. If there is
+    none of those for some card then the game is lost, however it is played.
+    This never calls a game that can still be won a dead end, but does not
+    catch every game that cannot be.
+
+    Args:
+        rank_masks: The mask of pyramid slots holding each rank, which may
+            include cleared slots.
+        remaining: The mask of the slots not yet cleared.
+        spare_ranks: Bit r is set when a card of rank r is on the waste or in
+            the stock.
+        ranks: Bit r is set for the ranks of the cards to check.
+    """
+
+    while ranks:
+        rank = ranks.bit_length() - 1
+        ranks ^= 1 << rank
+        slots = rank_masks[rank] & remaining
+        if slots == 0:
+            continue
+        rank_up, rank_down = ADJACENT_RANKS[rank]
+        if spare_ranks >> rank_up & 1 or spare_ranks >> rank_down & 1:
+            continue
+
+        helpers = (rank_masks[rank_up] | rank_masks[rank_down]) & remaining
+        while slots:
+            slot = slots.bit_length() - 1
+            slots ^= 1 << slot
+            if helpers & ~ABOVE_MASKS[slot] == 0:
+                return True
+    return False
+
+
+def _slot_nibbles(mask: int) -> int:
+    """
+    Spread a mask of pyramid slots out to a mask of 4 bits per slot.
+    """
+    return (
+        _NIBBLE_SPREAD[mask & 0x7F]
+        | _NIBBLE_SPREAD[mask >> 7 & 0x7F] << 28
+        | _NIBBLE_SPREAD[mask >> 14 & 0x7F] << 56
+        | _NIBBLE_SPREAD[mask >> 21 & 0x7F] << 84
+    )
+
+
+class BaseEscalatorGame(SolitaireGame):
+    """
+    The parts of Escalator Solitaire common to its engines, which only
+    differ in how they hold the position;
+    - EscalatorGame, in the piles of a SolitaireGame, and
+    - BitboardEscalatorGame, as a few integers.
+    """
+
+    HASH_FOUNDATION = False
+
+    def __init__(
+        self, seed: int | None = None, detect_dead_ends: bool = False
+    ):
+        """
+        Args:
+            seed: Seed for shuffling the deals of this game, so that games
+                with the same seed are dealt the same.
+            detect_dead_ends: Whether games that can no longer be won count
+                as lost as soon as that is found (see find_dead_end()),
+                rather than once there are no moves left.
+        """
+
         super().__init__()
+        # The generator is only made on the first deal(), as games only ever
+        # dealt by deal_deck() have no use for it
+        self._seed = seed
+        self._rng: Random | None = None
+
+        # The versions of the state that the cached values are for, they
+        # are only worked out once asked for
+        self._moves_version = -1
+        self._mask_version = -1
+        # Made on the first call to legal_action_mask()
+        self._legal_bits: np.ndarray | None = None
+        self._legal_mask: np.ndarray | None = None
+
+        self._detect_dead_ends = detect_dead_ends
+        # Whether the game is known to be a dead end, and the ranks of the
+        # cards that may have become stuck since it was last checked
+        self._dead_end = False
+        self._dead_end_ranks = ALL_RANKS
+
+    @property
+    def legal_actions(self) -> int:
+        """
+        The legal actions as a bit mask, bit i is set when action i is legal.
+        """
+        raise NotImplementedError(
+            "legal_actions must be implemented by subclasses."
+        )
+
+    @property
+    def in_dead_end_state(self) -> bool:
+        """
+        Whether some card left in the pyramid can never be cleared.
+        """
+
+        # A dead end stays one whatever moves are made, and a card can only
+        # become stuck when a card of an adjacent rank leaves the waste, so
+        # only the cards of those ranks need checking again
+        if self._dead_end_ranks != 0 and not self._dead_end:
+            self._dead_end = self._find_dead_end(self._dead_end_ranks)
+            self._dead_end_ranks = 0
+        return self._dead_end
+
+    def deal_deck(
+        self,
+        deck: Sequence[int],
+        cleared: int = 0,
+        stock_index: int | None = None,
+        waste: int = -1,
+        foundation: Sequence[int] = (),
+    ) -> None:
+        """
+        Deal the game from a permutation of card indices.
+
+        Args:
+            deck: The card indices (see Card.value). The pyramid is dealt
+                row by row from the first 28, and the stock from the rest
+                with the top card last. Cleared slots may hold any value.
+            cleared: The mask of pyramid slots that are already cleared.
+            stock_index: Index into the deck of the top card of the stock,
+                defaults to the last card.
+            waste: The card index on the waste, -1 for an empty waste.
+            foundation: The card indices on the foundation, bottom first.
+        """
+        raise NotImplementedError(
+            "deal_deck() must be implemented by subclasses to set up the "
+            "game."
+        )
+
+    def deal_from_index(self, index: int) -> None:
+        """
+        Deal the game numbered by the index, see deals.deal_from_index().
+        """
+
+        self.deal_deck(deal_from_index(index))
+
+    def _shuffled_deck(self) -> list[int]:
+        """
+        The next deal of the seeded shuffle, as a permutation of card
+        indices.
+        """
+
+        if self._rng is None:
+            self._rng = Random(self._seed)
+        deck = list(range(DECK_SIZE))
+        self._rng.shuffle(deck)
+        return deck
+
+    def display(self) -> str:
+        """
+        Display the game.
+        """
+
+        # First the stock and waste piles
+        stock_and_waste = "{} {}".format(
+            "[??]" if len(self.stock) != 0 else "[  ]",
+            f"[{self.waste[-1]}]" if len(self.waste) != 0 else "[  ]",
+        )
+
+        # Next, every row of the tableau
+        tableau = "\n".join(
+            "  ".join(
+                f"[{card}]"
+                if card is not None
+                else "[  ]"
+                for card in row
+            ).center(4 * 7 + 6 * 2 - 1)
+            for row in self.tableau
+        )
+
+        # As the remainder of the piles are not visible, we return
+        return "\n".join(
+            (stock_and_waste, tableau)
+        )
+
+    def move_action(self, action: int, record: bool = False) -> int:
+        """
+        Make a move given by its action index.
+
+        Args:
+            action: The action index, 0 to flip the stock or 1 + slot to
+                clear a pyramid slot
+            record: Whether to record the move so that it can be undone
+
+        Returns:
+            The score for the move
+
+        Raises:
+            ValueError: If the move is invalid
+        """
+
+        if action < 0 or action >= NUM_ACTIONS:
+            raise ValueError("Invalid move")
+        return self.move(ACTION_DESTINATIONS[action], record)
+
+    def legal_action_mask(self) -> np.ndarray:
+        """
+        The legal actions as a boolean mask over the action indices.
+
+        The mask is reused, and is overwritten by later calls.
+        """
+
+        if self._legal_mask is None:
+            self._legal_bits = np.zeros(NUM_ACTIONS, dtype=np.int64)
+            self._legal_mask = np.zeros(NUM_ACTIONS, dtype=bool)
+        if self._mask_version != self._version:
+            self._mask_version = self._version
+            np.bitwise_and(
+                self.legal_actions, _ACTION_BITS, out=self._legal_bits
+            )
+            np.not_equal(self._legal_bits, 0, out=self._legal_mask)
+        return self._legal_mask
+
+    def observation(self) -> np.ndarray:
+        """
+        The compact observation of the game, as given by BatchEscalatorEnv.
+        """
+        raise NotImplementedError(
+            "observation() must be implemented by subclasses."
+        )
+
+    def _reset_dead_end(self) -> None:
+        """
+        Check every card again, after a change other than a move.
+        """
+
+        self._dead_end = False
+        self._dead_end_ranks = ALL_RANKS
+
+    def _find_dead_end(self, ranks: int) -> bool:
+        """
+        Whether some card of the ranks can never be cleared, see
+        find_dead_end().
+        """
+        raise NotImplementedError(
+            "_find_dead_end() must be implemented by subclasses."
+        )
+
+
+class EscalatorGame(BaseEscalatorGame):
+    """Represents a game of Escalator Solitaire."""
+
+    def __init__(
+        self, seed: int | None = None, detect_dead_ends: bool = False
+    ):
+        """
+        Args:
+            seed: Seed for shuffling the deals of this game, so that games
+                with the same seed are dealt the same.
+            detect_dead_ends: Whether games that can no longer be won count
+                as lost as soon as that is found (see find_dead_end()),
+                rather than once there are no moves left.
+        """
+
+        super().__init__(seed, detect_dead_ends)
         self.foundation.append([])  # Only one foundation pile
 
+        # Slots of the uncovered cards in the tableau, by rank
+        self._uncovered: list[set[int]] = [set() for _ in range(14)]
+        # The number of cards of each rank in the stock
+        self._stock_ranks = [0] * 14
+
+        # Bit i is set when action i is legal
+        self._legal_actions = 0
+
+        self._won_version = -1
+        self._won = False
+
+    @property
+    def legal_actions(self) -> int:
+        return self._legal_actions
+
+    @property
+    def rank_key(self) -> int:
+        """
+        A key for the state that only depends on the ranks of the cards.
+
+        Only ranks matter for which moves can be made, so states with the
+        same key play out the same whatever the suits. The key packs the
+        rank of each pyramid slot (0 once cleared), the rank on the waste,
+        and the ranks of the stock from the bottom up, into 4 bits each.
+        """
+
+        key = 0
+        for slot in range(PYRAMID_SIZE):
+            card = self.tableau[SLOT_ROWS[slot]][SLOT_COLS[slot]]
+            if card is not None:
+                key |= card.rank << 4 * slot
+        if len(self.waste) != 0:
+            key |= self.waste[0].rank << _WASTE_RANK_SHIFT
+        for position, card in enumerate(self.stock):
+            key |= card.rank << _STOCK_RANK_SHIFT + 4 * position
+        return key
+
+    @property
+    def available_moves(self) -> list[tuple[int, int]]:
+        """
+        A move is a tuple of two integers, the first being the index of the
+        operand, and the second being the index of the destination.
+
+        The list is built from the legal actions when first asked for after
+        a change, and is not to be modified.
+        """
+
+        if self._moves_version != self._version:
+            self._moves_version = self._version
+            self._available_moves = [
+                (0, ACTION_DESTINATIONS[action])
+                for action in range(NUM_ACTIONS)
+                if self._legal_actions >> action & 1
+            ]
+        return self._available_moves
+
     @property
     def in_winning_state(self) -> bool:
-        return len(self._tableau) == 0
+        if self._won_version != self._version:
+            self._won_version = self._version
+            # Cleared slots are left as None, so the rows themselves remain
+            self._won = all(
+                card is None for row in self._tableau for card in row
+            )
+        return self._won
+
+    @property
+    def in_losing_state(self) -> bool:
+        return not self.in_winning_state and (
+            self._legal_actions == 0
+            or self._detect_dead_ends and self.in_dead_end_state
+        )
 
+    @timed
     def deal(
         self,
         stock: list[Card] | None = None,
@@ -65,6 +504,8 @@ class EscalatorGame(SolitaireGame):
             reserve: The reserve pile.
         """
 
+        self._journal.clear()
+
         if None not in (stock, waste, tableau, foundation, reserve):
             # NOTE: No sanity checks here
             self.stock.extend(stock)
@@ -72,53 +513,54 @@ class EscalatorGame(SolitaireGame):
             self.tableau.extend(tableau)
             self.foundation.extend(foundation)
             self.reserve.extend(reserve)
+            self.update_available_moves()
+            self._hash = self.compute_hash()
             return
 
         # If everything hasn't been given, then we must deal the game
         # according to the rules.
-        deck = EscalatorGame.create_deck()
-        shuffle(deck)
-        for i in range(7):
-            # 7 rows of the tableau
-            row = deck[:i + 1]
-            deck = deck[i + 1:]
-            self.tableau.append(row)
-
-            # The cards in the tableau are visible
-            for card in row:
-                card.flip()
-
-        self.stock.extend(deck)
-        self.update_available_moves()
+        self.deal_deck(self._shuffled_deck())
 
-    def display(self) -> str:
-        """
-        Display the game.
+    @timed
+    def deal_deck(
+        self,
+        deck: Sequence[int],
+        cleared: int = 0,
+        stock_index: int | None = None,
+        waste: int = -1,
+        foundation: Sequence[int] = (),
+    ) -> None:
         """
+        Deal the game from a permutation of card indices.
 
-        # First the stock and waste piles
-        stock_and_waste = "{} {}".format(
-            self.stock[-1] if len(self.stock) != 0 else "[  ]",
-            self.waste[-1] if len(self.waste) != 0 else "[  ]",
-        )
-
-        # Next, every row of the tableau
-        tableau = "\n".join(
-            "  ".join(
-                str(card)
-                if card is not None
-                else "[  ]"
-                for card in row
-            ).center(4 * 7 + 6 * 2 - 1)
-            for row in self.tableau
-        )
+        Args:
+            deck: The card indices (see Card.value). The pyramid is dealt
+                row by row from the first 28, and the stock from the rest
+                with the top card last. Cleared slots may hold any value.
+            cleared: The mask of pyramid slots that are already cleared.
+            stock_index: Index into the deck of the top card of the stock,
+                defaults to the last card.
+            waste: The card index on the waste, -1 for an empty waste.
+            foundation: The card indices on the foundation, bottom first.
+        """
 
-        # As the remainder of the piles are not visible, we return
-        return "\n".join(
-            (stock_and_waste, tableau)
-        )
+        cards = [Card.DECK[card] for card in deck]
+        if stock_index is None:
+            stock_index = len(cards) - 1
+        self.stock[:] = cards[PYRAMID_SIZE:stock_index + 1]
+        self.waste[:] = [Card.DECK[waste]] if waste >= 0 else []
+        self.tableau[:] = [[] for _ in range(PYRAMID_ROWS)]
+        for slot in range(PYRAMID_SIZE):
+            self.tableau[SLOT_ROWS[slot]].append(
+                None if cleared >> slot & 1 else cards[slot]
+            )
+        self.foundation[:] = [[Card.DECK[card] for card in foundation]]
+        self._journal.clear()
+        self.update_available_moves()
+        self._hash = self.compute_hash()
 
-    def move(self, destination: int) -> int:
+    @timed
+    def move(self, destination: int, record: bool = False) -> int:
         """
         The Agent / User makes an effect on the world state.
 
@@ -132,6 +574,7 @@ class EscalatorGame(SolitaireGame):
 
         Args:
             destination: The index of the destination to move to
+            record: Whether to record the move so that it can be undone
 
         Returns:
             The score for the move
@@ -142,23 +585,34 @@ class EscalatorGame(SolitaireGame):
 
         reward = 0
 
-        if (0, destination) not in self.available_moves:
+        action = DESTINATION_ACTIONS.get(destination, -1)
+        if action < 0 or not self._legal_actions >> action & 1:
             raise ValueError("Invalid move")
 
+        won_known = self._won_version == self._version
+        previous = self.waste[0] if len(self.waste) != 0 else None
+        if record:
+            # The previous waste card is all that is lost by a move, besides
+            # what is known about dead ends
+            self._journal.append((
+                action, previous, self._hash,
+                self._dead_end, self._dead_end_ranks,
+            ))
+        if previous is not None:
+            self._hash ^= _WASTE_ZOBRIST[previous.value]
+
         if destination == 0:
             # Flip stock to waste
-            if len(self.stock) == 0:
-                # No more cards to flip
-                raise ValueError("Invalid move")
-
             if len(self.waste) == 0:
                 self.waste.append(None)
-            self.waste[0] = self.stock.pop()
-            self.waste[0].flip()
+            card = self.stock.pop()
+            self.waste[0] = card
+            self._stock_ranks[card.rank] -= 1
+            self._hash ^= ZOBRIST_STOCK[len(self.stock)][card.value]
         else:
-            # Decode the destination, or flip the stock
-            row = destination // 10 - 1
-            idx = destination % 10 - 1
+            slot = action - 1
+            row = SLOT_ROWS[slot]
+            idx = SLOT_COLS[slot]
 
             # Waste card goes to foundation
             self.foundation[0].append(self.waste[0])
@@ -169,9 +623,28 @@ class EscalatorGame(SolitaireGame):
             # Tableau card slot is emptied
             self.tableau[row][idx] = None
 
+            # Which can only uncover the cards above it
+            card = self.waste[0]
+            self._uncovered[card.rank].discard(slot)
+            for parent in SLOT_PARENTS[slot]:
+                self._uncover(parent)
+            self._hash ^= _SLOT_ZOBRIST[slot][card.value]
+
             reward = 1
 
-        self.update_available_moves()
+        self._hash ^= _WASTE_ZOBRIST[self.waste[0].value]
+        if (
+            previous is not None
+            and self._stock_ranks[previous.rank] == 0
+            and self.waste[0].rank != previous.rank
+        ):
+            # The last card of its rank that could go on the waste is gone,
+            # so the cards of adjacent ranks may now be stuck
+            self._dead_end_ranks |= _ADJACENT_RANK_BITS[previous.rank]
+        self._refresh_legal_actions()
+        if destination == 0 and won_known:
+            # Flipping the stock leaves the pyramid as it was
+            self._won_version = self._version
 
         # Check if the game is terminal
         if self.in_winning_state:
@@ -181,60 +654,526 @@ class EscalatorGame(SolitaireGame):
 
         return reward
 
+    def undo(self) -> None:
+        """
+        Take back the last move that was recorded.
+
+        Raises:
+            ValueError: If there is no recorded move to undo
+        """
+
+        if len(self._journal) == 0:
+            raise ValueError("No move to undo")
+        (
+            action, waste, self._hash,
+            self._dead_end, self._dead_end_ranks,
+        ) = self._journal.pop()
+
+        if action == 0:
+            # Waste card goes back on the stock
+            self.stock.append(self.waste[0])
+            self._stock_ranks[self.waste[0].rank] += 1
+            if waste is None:
+                self.waste.clear()
+            else:
+                self.waste[0] = waste
+        else:
+            slot = action - 1
+            card = self.waste[0]
+
+            # The cards above the slot are covered again
+            for parent in SLOT_PARENTS[slot]:
+                above = self.tableau[SLOT_ROWS[parent]][SLOT_COLS[parent]]
+                if above is not None:
+                    self._uncovered[above.rank].discard(parent)
+
+            # Waste card goes back to the tableau, and the foundation card
+            # back to the waste
+            self.tableau[SLOT_ROWS[slot]][SLOT_COLS[slot]] = card
+            self._uncovered[card.rank].add(slot)
+            self.waste[0] = self.foundation[0].pop()
+
+        self._refresh_legal_actions()
+
+    def observation(self) -> np.ndarray:
+        observation = np.full(OBSERVATION_SIZE, -1, dtype=np.int8)
+        for slot in range(PYRAMID_SIZE):
+            card = self.tableau[SLOT_ROWS[slot]][SLOT_COLS[slot]]
+            if card is not None:
+                observation[slot] = card.value
+        if len(self.waste) != 0:
+            observation[PYRAMID_SIZE] = self.waste[0].value
+        observation[PYRAMID_SIZE + 1] = len(self.stock)
+        return observation
+
+    @timed
     def update_available_moves(self) -> None:
         """
         Update the list of available moves.
+
+        This rescans the whole tableau, and is only needed when the tableau
+        has been set up from outside of move().
         """
 
-        self.available_moves.clear()
+        # The uncovered cards are bucketed by rank, so the moves for a waste
+        # card are just the buckets of the two ranks adjacent to it
+        self._uncovered = [set() for _ in range(14)]
+        for slot in range(PYRAMID_SIZE):
+            self._uncover(slot)
+        self._stock_ranks = [0] * 14
+        for card in self.stock:
+            if card is not None:
+                self._stock_ranks[card.rank] += 1
+        self._reset_dead_end()
 
-        def _rank_adjacent(this: Card, other: Card) -> bool:
-            rank_up = this.rank + 1
-            rank_down = this.rank - 1
-            if rank_up == 14:
-                rank_up = 1
-            if rank_down == 0:
-                rank_down = 13
+        self._refresh_legal_actions()
 
-            return (other.rank == rank_up) or (other.rank == rank_down)
+    def _find_dead_end(self, ranks: int) -> bool:
+        rank_masks = [0] * 14
+        remaining = 0
+        for slot in range(PYRAMID_SIZE):
+            card = self.tableau[SLOT_ROWS[slot]][SLOT_COLS[slot]]
+            if card is not None:
+                rank_masks[card.rank] |= 1 << slot
+                remaining |= 1 << slot
 
-        def _accessible(row: int, col: int) -> bool:
-            if row == len(self.tableau) - 1:
-                # Bottom row is always accessible
-                return True
+        spare_ranks = 0
+        for card in self.stock + self.waste:
+            spare_ranks |= 1 << card.rank
+        return find_dead_end(rank_masks, remaining, spare_ranks, ranks)
 
-            # First check left blocker
-            left_blocker = self.tableau[row + 1][col]
-            if left_blocker is not None:
-                return False
+    def _uncover(self, slot: int) -> None:
+        """
+        Add the card in the slot to its rank bucket if it is uncovered.
+        """
 
-            # Then check right blocker
-            right_blocker = self.tableau[row + 1][col + 1]
-            if right_blocker is not None:
-                return False
+        card = self.tableau[SLOT_ROWS[slot]][SLOT_COLS[slot]]
+        if card is None:
+            return
+        for blocker in SLOT_BLOCKERS[slot]:
+            row, col = SLOT_ROWS[blocker], SLOT_COLS[blocker]
+            if self.tableau[row][col] is not None:
+                return
+        self._uncovered[card.rank].add(slot)
 
-            return True
+    def _refresh_legal_actions(self) -> None:
+        """
+        Work out the legal actions from the rank buckets after a change to
+        the state.
+        """
 
-        # Check for stock flip
-        if len(self.stock) != 0:
-            self.available_moves.append((0, 0))
+        self._version += 1
+        self._legal_actions = 1 if len(self.stock) != 0 else 0
 
         # Check which cards the waste can be stacked on
         if len(self.waste) != 0:
-            waste_card = self.waste[0]
-
-            for row in range(len(self.tableau)):
-                for col in range(len(self.tableau[row])):
-                    tab_card = self.tableau[row][col]
-                    # Check if the card is accessible and playable
-                    if tab_card is None:
-                        continue
-                    if not _rank_adjacent(waste_card, tab_card):
-                        continue
-                    if not _accessible(row, col):
-                        continue
-
-                    # Add this card to the moves
-                    self.available_moves.append(
-                        (0, (row + 1) * 10 + col + 1)
-                    )
+            rank_up, rank_down = ADJACENT_RANKS[self.waste[0].rank]
+            for slot in self._uncovered[rank_up] | self._uncovered[rank_down]:
+                self._legal_actions |= 2 << slot
+
+
+class BitboardEscalatorGame(BaseEscalatorGame):
+    """
+    Escalator Solitaire with the whole position packed into integers.
+
+    The deal is kept as a fixed permutation of card indices (see Card.value),
+    the first 28 of which fill the pyramid row by row, with the rest making
+    up the stock (top card last). The position is then just;
+    - a 28 bit mask of the cleared pyramid slots,
+    - a pointer into the deal for the top card of the stock, and
+    - the rank of the card on the waste (0 for an empty waste).
+
+    Move generation is a handful of mask operations, and a game dealt from
+    the same cards plays identically to an EscalatorGame.
+    The piles are still available, but are built on demand and are not to be
+    modified. The foundation is not tracked, as it takes no part in play.
+    """
+
+    def __init__(
+        self, seed: int | None = None, detect_dead_ends: bool = False
+    ):
+        super().__init__(seed, detect_dead_ends)
+        self._deck: tuple[int, ...] = ()
+        self._rank_masks = [0] * 14
+        self._slot_rank_key = 0
+        self._stock_rank_keys = [0]
+        self._stock_rank_sets = [0] * PYRAMID_SIZE
+        self._cleared = 0
+        self._exposed = 0
+        self._stock_index = PYRAMID_SIZE - 1
+        self._waste_card = -1
+        self._waste_rank = 0
+
+    @property
+    def deck(self) -> tuple[int, ...]:
+        return self._deck
+
+    @property
+    def cleared_mask(self) -> int:
+        return self._cleared
+
+    @property
+    def stock_index(self) -> int:
+        """
+        Index into the deck of the top card of the stock.
+        The stock is empty once this drops below the pyramid.
+        """
+        return self._stock_index
+
+    @property
+    def waste_rank(self) -> int:
+        return self._waste_rank
+
+    @property
+    def stock(self) -> list[Card]:
+        return [
+            Card.DECK[card]
+            for card in self._deck[PYRAMID_SIZE:self._stock_index + 1]
+        ]
+
+    @property
+    def waste(self) -> list[Card]:
+        if self._waste_card < 0:
+            return []
+        return [Card.DECK[self._waste_card]]
+
+    @property
+    def foundation(self) -> list[list[Card]]:
+        # Only one foundation pile, which is not tracked
+        return [[]]
+
+    @property
+    def tableau(self) -> list[list[Card]]:
+        if len(self._deck) == 0:
+            return []
+
+        tableau = []
+        for slot, card in enumerate(self._deck[:PYRAMID_SIZE]):
+            if SLOT_COLS[slot] == 0:
+                tableau.append([])
+            if self._cleared >> slot & 1:
+                tableau[-1].append(None)
+            else:
+                tableau[-1].append(Card.DECK[card])
+        return tableau
+
+    @property
+    def in_winning_state(self) -> bool:
+        return self._cleared == FULL_PYRAMID_MASK
+
+    @property
+    def in_losing_state(self) -> bool:
+        return not self.in_winning_state and (
+            self._stock_index < PYRAMID_SIZE and self._playable() == 0
+            or self._detect_dead_ends and self.in_dead_end_state
+        )
+
+    @property
+    def legal_actions(self) -> int:
+        flip = 1 if self._stock_index >= PYRAMID_SIZE else 0
+        return flip | self._playable() << 1
+
+    @property
+    def available_moves(self) -> list[tuple[int, int]]:
+        if self._moves_version == self._version:
+            return self._available_moves
+
+        moves = []
+        if self._stock_index >= PYRAMID_SIZE:
+            moves.append((0, 0))
+
+        # Slots are numbered row by row, so lowest bit first keeps the moves
+        # in the same order as EscalatorGame
+        playable = self._playable()
+        while playable:
+            lowest = playable & -playable
+            moves.append((0, SLOT_DESTINATIONS[lowest.bit_length() - 1]))
+            playable ^= lowest
+        self._available_moves = moves
+        self._moves_version = self._version
+        return moves
+
+    @property
+    def rank_key(self) -> int:
+        slot_ranks = self._slot_rank_key & ~_slot_nibbles(self._cleared)
+        stock_size = max(self._stock_index - PYRAMID_SIZE + 1, 0)
+        return (
+            slot_ranks
+            | self._waste_rank << _WASTE_RANK_SHIFT
+            | self._stock_rank_keys[stock_size] << _STOCK_RANK_SHIFT
+        )
+
+    def observation(self) -> np.ndarray:
+        return np.array([
+            -1 if self._cleared >> slot & 1 else card
+            for slot, card in enumerate(self._deck[:PYRAMID_SIZE])
+        ] + [
+            self._waste_card, max(self._stock_index - PYRAMID_SIZE + 1, 0)
+        ], dtype=np.int8)
+
+    @timed
+    def encode_into(
+        self, buffer: np.ndarray, rank_only: bool = False
+    ) -> np.ndarray:
+        """
+        Encode the current game state into a fixed length array.
+        See SolitaireGame.encode_into(), the foundation is left empty.
+        """
+
+        buffer[:] = 0
+        if rank_only:
+            plane_size = self.RANK_ENCODED_PILE_SIZE
+            cards = _DECK_RANKS_FROM_ZERO
+        else:
+            plane_size = self.ENCODED_PILE_SIZE
+            cards = _DECK_VALUES
+
+        # Stock, all hidden
+        stock_size = max(self._stock_index - PYRAMID_SIZE + 1, 0)
+        buffer[plane_size - 1] = stock_size
+
+        # Waste
+        if self._waste_card >= 0:
+            buffer[plane_size + cards[self._waste_card]] = 1
+
+        # Tableau
+        offset = 3 * plane_size
+        np.add.at(buffer, [
+            offset + cards[card]
+            for slot, card in enumerate(self._deck[:PYRAMID_SIZE])
+            if not self._cleared >> slot & 1
+        ], 1)
+        return buffer
+
+    @timed
+    def deal(
+        self,
+        stock: list[Card] | None = None,
+        waste: list[Card] | None = None,
+        tableau: list[list[Card]] | None = None,
+        foundation: list[list[Card]] | None = None,
+        reserve: list[Card] | None = None,
+    ) -> None:
+        """
+        Deal the game.
+
+        Args:
+            stock: The stock pile.
+            waste: The waste pile.
+            tableau: The tableau.
+            foundation: The foundation (not tracked).
+            reserve: The reserve pile (unused).
+        """
+
+        if None not in (stock, waste, tableau, foundation, reserve):
+            # NOTE: No sanity checks here
+            slots = [
+                -1 if card is None else card.value
+                for row in tableau
+                for card in row
+            ]
+            cleared = sum(
+                1 << slot for slot, card in enumerate(slots) if card < 0
+            )
+            self.deal_deck(
+                slots + [card.value for card in stock],
+                cleared=cleared,
+                waste=waste[0].value if len(waste) != 0 else -1,
+            )
+            return
+
+        self.deal_deck(self._shuffled_deck())
+
+    @timed
+    def deal_deck(
+        self,
+        deck: Sequence[int],
+        cleared: int = 0,
+        stock_index: int | None = None,
+        waste: int = -1,
+        foundation: Sequence[int] = (),
+    ) -> None:
+        """
+        Deal the game from a permutation of card indices.
+
+        Args:
+            deck: The card indices. The pyramid is dealt from the first 28,
+                and the stock from the rest with the top card last. Cleared
+                slots may hold any value.
+            cleared: The mask of pyramid slots that are already cleared.
+            stock_index: Index into the deck of the top card of the stock,
+                defaults to the last card.
+            waste: The card index on the waste, -1 for an empty waste.
+            foundation: The foundation (not tracked).
+        """
+
+        self._deck = tuple(deck)
+        self._rank_masks = [0] * 14
+        self._slot_rank_key = 0
+        for slot, card in enumerate(self._deck[:PYRAMID_SIZE]):
+            if not cleared >> slot & 1:
+                self._rank_masks[card // 4 + 1] |= 1 << slot
+                self._slot_rank_key |= (card // 4 + 1) << 4 * slot
+
+        # Rank keys of the stock for each number of cards left in it, and the
+        # set of ranks in the stock for each index of its top card
+        self._stock_rank_keys = [0]
+        self._stock_rank_sets = [0] * PYRAMID_SIZE
+        for position, card in enumerate(self._deck[PYRAMID_SIZE:]):
+            self._stock_rank_keys.append(
+                self._stock_rank_keys[-1] | (card // 4 + 1) << 4 * position
+            )
+            self._stock_rank_sets.append(
+                self._stock_rank_sets[-1] | 1 << card // 4 + 1
+            )
+        self._cleared = cleared
+        self._stock_index = (
+            len(self._deck) - 1 if stock_index is None else stock_index
+        )
+        self._waste_card = waste
+        self._waste_rank = waste // 4 + 1 if waste >= 0 else 0
+        self._journal.clear()
+        self.update_available_moves()
+        self._hash = self.compute_hash()
+
+    @timed
+    def move(self, destination: int, record: bool = False) -> int:
+        """
+        The Agent / User makes an effect on the world state.
+
+        Args:
+            destination: The index of the destination to move to
+            record: Whether to record the move so that it can be undone
+
+        Returns:
+            The score for the move
+
+        Raises:
+            ValueError: If the move is invalid
+        """
+
+        reward = 0
+        if record:
+            position = (
+                self._cleared,
+                self._exposed,
+                self._stock_index,
+                self._waste_card,
+                self._hash,
+                self._dead_end,
+                self._dead_end_ranks,
+            )
+
+        if destination == 0:
+            # Flip stock to waste
+            if self._stock_index < PYRAMID_SIZE:
+                raise ValueError("Invalid move")
+
+            card = self._deck[self._stock_index]
+            self._hash ^= ZOBRIST_STOCK[self._stock_index - PYRAMID_SIZE][card]
+            self._stock_index -= 1
+        else:
+            slot = DESTINATION_SLOTS.get(destination, -1)
+            if slot < 0 or not self._playable() >> slot & 1:
+                raise ValueError("Invalid move")
+
+            # Clear the slot, which can only uncover the slots above it
+            self._cleared |= 1 << slot
+            self._exposed &= ~(1 << slot)
+            for parent in SLOT_PARENTS[slot]:
+                blockers = BLOCKER_MASKS[parent]
+                if self._cleared & blockers == blockers:
+                    self._exposed |= (1 << parent) & ~self._cleared
+
+            # Tableau card goes to waste
+            card = self._deck[slot]
+            self._hash ^= _SLOT_ZOBRIST[slot][card]
+
+            reward = 1
+
+        if self._waste_card >= 0:
+            self._hash ^= _WASTE_ZOBRIST[self._waste_card]
+            # Cards can only become stuck once the last card of a rank
+            # adjacent to them that could go on the waste is gone
+            spare_ranks = (
+                self._stock_rank_sets[self._stock_index] | 1 << card // 4 + 1
+            )
+            if not spare_ranks >> self._waste_rank & 1:
+                self._dead_end_ranks |= _ADJACENT_RANK_BITS[self._waste_rank]
+        self._hash ^= _WASTE_ZOBRIST[card]
+        self._waste_card = card
+        self._waste_rank = card // 4 + 1
+        self._version += 1
+        if record:
+            # The whole position is a few integers, so is kept as is
+            self._journal.append(position)
+
+        # Check if the game is terminal
+        if self.in_winning_state:
+            reward += 100
+        elif self.in_losing_state:
+            reward -= 100
+
+        return reward
+
+    def undo(self) -> None:
+        """
+        Take back the last move that was recorded.
+
+        Raises:
+            ValueError: If there is no recorded move to undo
+        """
+
+        if len(self._journal) == 0:
+            raise ValueError("No move to undo")
+        (
+            self._cleared,
+            self._exposed,
+            self._stock_index,
+            self._waste_card,
+            self._hash,
+            self._dead_end,
+            self._dead_end_ranks,
+        ) = self._journal.pop()
+        self._waste_rank = (
+            self._waste_card // 4 + 1 if self._waste_card >= 0 else 0
+        )
+        self._version += 1
+
+    @timed
+    def update_available_moves(self) -> None:
+        """
+        Rebuild the mask of uncovered slots from the cleared slots.
+        """
+
+        self._version += 1
+        self._reset_dead_end()
+        self._exposed = 0
+        for slot in range(PYRAMID_SIZE):
+            blockers = BLOCKER_MASKS[slot]
+            if (
+                not self._cleared >> slot & 1
+                and self._cleared & blockers == blockers
+            ):
+                self._exposed |= 1 << slot
+
+    def _find_dead_end(self, ranks: int) -> bool:
+        return find_dead_end(
+            self._rank_masks,
+            FULL_PYRAMID_MASK & ~self._cleared,
+            self._stock_rank_sets[self._stock_index] | 1 << self._waste_rank,
+            ranks,
+        )
+
+    def _playable(self) -> int:
+        """
+        The mask of the uncovered slots that can take the waste card.
+        """
+
+        if self._waste_rank == 0:
+            return 0
+        rank_up, rank_down = ADJACENT_RANKS[self._waste_rank]
+        return (
+            (self._rank_masks[rank_up] | self._rank_masks[rank_down])
+            & self._exposed
+        )
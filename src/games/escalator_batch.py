@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+"""
+Batched Escalator Solitaire
+
+Many games of Escalator are held in struct-of-arrays form and stepped
+together, so that the cost of a step is shared across the whole batch rather
+than paid per game in the interpreter.
+
+Each game is stored in the same way as a BitboardEscalatorGame;
+- the deal as a permutation of card indices (see Card.value),
+- a mask of the cleared pyramid slots,
+- the index into the deal of the top card of the stock, and
+- the card on the waste (and its rank).
+
+Actions are the dense action indices of EscalatorGame, 0 to flip the stock,
+or 1 + slot to clear a pyramid slot.
+
+Observations are one row of int8 per game;
+- the card in each pyramid slot, or -1 if it is cleared,
+- the card on the waste, or -1 if it is empty, and
+- the number of cards left in the stock.
+"""
+
+import numpy as np
+
+from src.games.deals import generate_deals
+from src.games.escalator import (
+    DECK_SIZE,
+    FULL_PYRAMID_MASK,
+    NUM_ACTIONS,
+    OBSERVATION_SIZE,
+    PYRAMID_SIZE,
+    SLOT_BLOCKERS,
+)
+
+
+_SLOT_BITS = np.left_shift(1, np.arange(PYRAMID_SIZE, dtype=np.uint32))
+_LEFT_BLOCKERS = np.array([b[0] for b in SLOT_BLOCKERS if len(b) != 0])
+_RIGHT_BLOCKERS = np.array([b[1] for b in SLOT_BLOCKERS if len(b) != 0])
+_BLOCKED_SLOTS = len(_LEFT_BLOCKERS)
+
+
+class BatchEscalatorEnv:
+    """
+    Steps a batch of Escalator games at once.
+
+    Finished games are dealt again in the same step that finishes them, so
+    every game in the batch is always in play.
+    """
+
+    def __init__(self, num_games: int, seed: int | None = None):
+        """
+        Args:
+            num_games: The number of games in the batch.
+            seed: Seed for dealing the games.
+        """
+
+        self._num_games = num_games
+        self._rng = np.random.default_rng(seed)
+        self._games = np.arange(num_games)
+
+        self._decks = np.zeros((num_games, DECK_SIZE), dtype=np.int8)
+        self._slot_ranks = np.zeros((num_games, PYRAMID_SIZE), dtype=np.int8)
+        self._cleared = np.zeros(num_games, dtype=np.uint32)
+        self._stock_index = np.zeros(num_games, dtype=np.int8)
+        self._waste_card = np.zeros(num_games, dtype=np.int8)
+        self._waste_rank = np.zeros(num_games, dtype=np.int8)
+
+        self._observation = np.zeros(
+            (num_games, OBSERVATION_SIZE), dtype=np.int8
+        )
+        self._legal = np.zeros((num_games, NUM_ACTIONS), dtype=bool)
+
+    @property
+    def num_games(self) -> int:
+        return self._num_games
+
+    @property
+    def decks(self) -> np.ndarray:
+        """
+        The deal of every game, one row per game.
+        """
+        return self._decks
+
+    def reset(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Deal every game again.
+
+        Returns:
+            The observations and the legal action masks.
+            These arrays are reused, and are overwritten by the next call.
+        """
+
+        self._deal(self._games)
+        self._update()
+        return self._observation, self._legal
+
+    def step(
+        self, actions: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Make one move in every game.
+
+        Args:
+            actions: The action to take in each game.
+
+        Returns:
+            The observations, rewards, done flags and legal action masks.
+            Games that are done have already been dealt again, so their
+            observation and legal actions are for the new game.
+            The observation and legal action arrays are reused, and are
+            overwritten by the next call.
+
+        Raises:
+            ValueError: If any move is invalid
+        """
+
+        actions = np.asarray(actions)
+        # Checked first, as indexing would wrap negative actions around
+        if (
+            actions.shape != self._games.shape
+            or not ((actions >= 0) & (actions < NUM_ACTIONS)).all()
+            or not self._legal[self._games, actions].all()
+        ):
+            raise ValueError("Invalid move")
+
+        # Flip stock to waste
+        flips = actions == 0
+        games = np.flatnonzero(flips)
+        self._waste_card[games] = self._decks[
+            games, self._stock_index[games]
+        ]
+        self._stock_index[games] -= 1
+
+        # Tableau card goes to waste, and its slot is emptied
+        games = np.flatnonzero(~flips)
+        slots = actions[games] - 1
+        self._waste_card[games] = self._decks[games, slots]
+        self._cleared[games] |= _SLOT_BITS[slots]
+
+        self._waste_rank[:] = self._waste_card // 4 + 1
+        self._update()
+
+        # Check which games are terminal
+        won = self._cleared == FULL_PYRAMID_MASK
+        lost = ~won & ~self._legal.any(axis=1)
+        rewards = (~flips).astype(np.int16)
+        rewards += 100 * won.astype(np.int16)
+        rewards -= 100 * lost.astype(np.int16)
+
+        done = won | lost
+        if done.any():
+            games = np.flatnonzero(done)
+            self._deal(games)
+            self._update(games)
+
+        return self._observation, rewards, done, self._legal
+
+    def _deal(self, games: np.ndarray) -> None:
+        """
+        Deal new games into the given rows.
+        """
+
+        self._decks[games] = generate_deals(len(games), self._rng)
+        self._slot_ranks[games] = self._decks[games, :PYRAMID_SIZE] // 4 + 1
+        self._cleared[games] = 0
+        self._stock_index[games] = DECK_SIZE - 1
+        self._waste_card[games] = -1
+        self._waste_rank[games] = 0
+
+    def _update(self, games: np.ndarray | slice = slice(None)) -> None:
+        """
+        Rebuild the observations and legal actions of the given rows.
+        """
+
+        cleared = (self._cleared[games, None] & _SLOT_BITS) != 0
+
+        # A slot is uncovered once both slots below it are cleared
+        uncovered = np.ones_like(cleared)
+        uncovered[:, :_BLOCKED_SLOTS] = (
+            cleared[:, _LEFT_BLOCKERS] & cleared[:, _RIGHT_BLOCKERS]
+        )
+
+        # Ranks are adjacent one up or down, wrapping King to Ace
+        waste_rank = self._waste_rank[games, None]
+        difference = (self._slot_ranks[games] - waste_rank) % 13
+        adjacent = (difference == 1) | (difference == 12)
+
+        self._legal[games, 0] = self._stock_index[games] >= PYRAMID_SIZE
+        self._legal[games, 1:] = (
+            ~cleared & uncovered & adjacent & (waste_rank != 0)
+        )
+
+        observation = self._observation[games]
+        observation[:, :PYRAMID_SIZE] = np.where(
+            cleared, -1, self._decks[games, :PYRAMID_SIZE]
+        )
+        observation[:, PYRAMID_SIZE] = self._waste_card[games]
+        observation[:, PYRAMID_SIZE + 1] = (
+            self._stock_index[games] - PYRAMID_SIZE + 1
+        )
+        self._observation[games] = observation
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+"""
+Terminal rendering of Escalator Solitaire
+
+The frame is laid out as EscalatorGame.display() lays it out, the stock and
+waste on the first line and the pyramid below. Every card sits in a cell of
+fixed position, so once the first frame is drawn, each later frame only
+rewrites the cells that changed (usually the waste and a cleared slot) by
+moving the cursor straight to them.
+"""
+
+import sys
+from time import perf_counter
+from typing import Callable, TextIO
+
+from src.games.base import Card
+from src.games.escalator import (
+    PYRAMID_ROWS,
+    PYRAMID_SIZE,
+    SLOT_COLS,
+    SLOT_ROWS,
+    BaseEscalatorGame,
+)
+
+
+_CARD_CELLS = tuple(f"[{card}]" for card in Card.DECK)
+_EMPTY_CELL = "[  ]"
+_HIDDEN_CELL = "[??]"
+
+# The line and column of each cell, the stock, the waste, then the slots
+_CELL_POSITIONS = ((0, 0), (0, 5)) + tuple(
+    (SLOT_ROWS[slot] + 1, 3 * (PYRAMID_ROWS - 1 - SLOT_ROWS[slot])
+     + 6 * SLOT_COLS[slot])
+    for slot in range(PYRAMID_SIZE)
+)
+FRAME_LINES = PYRAMID_ROWS + 1
+
+
+def _cells(game: BaseEscalatorGame) -> list[str]:
+    """
+    The text of every cell of the game, in the order of _CELL_POSITIONS.
+    """
+
+    cells = [
+        _HIDDEN_CELL if len(game.stock) != 0 else _EMPTY_CELL,
+        _CARD_CELLS[game.waste[-1].value]
+        if len(game.waste) != 0 else _EMPTY_CELL,
+    ]
+    for row in game.tableau:
+        cells.extend(
+            _CARD_CELLS[card.value] if card is not None else _EMPTY_CELL
+            for card in row
+        )
+    return cells
+
+
+class TerminalRenderer:
+    """
+    Draws games to a terminal, only rewriting what has changed.
+
+    Frames can be capped to a maximum rate, in which case frames asked for
+    too soon after the last are dropped. As each frame is drawn against the
+    last frame drawn, dropping frames never leaves the screen out of date
+    once a frame is drawn.
+    """
+
+    def __init__(
+        self,
+        stream: TextIO = sys.stdout,
+        max_fps: float | None = 30.0,
+        top: int = 1,
+        clock: Callable[[], float] = perf_counter,
+    ):
+        """
+        Args:
+            stream: The terminal to draw to.
+            max_fps: The most frames drawn per second, None (or 0 or less)
+                for no limit.
+            top: The terminal line (from 1) of the top of the frame.
+            clock: The time in seconds, for the frame rate.
+        """
+
+        self._stream = stream
+        self._interval = (
+            0.0 if max_fps is None or max_fps <= 0 else 1.0 / max_fps
+        )
+        self._top = top
+        self._clock = clock
+        self._moves = tuple(
+            f"\033[{top + line};{column + 1}H"
+            for line, column in _CELL_POSITIONS
+        )
+        self._drawn: list[str] | None = None
+        self._last_frame = None
+        self._dropped = 0
+
+    @property
+    def dropped(self) -> int:
+        """
+        The number of frames dropped.
+        """
+        return self._dropped
+
+    def render(self, game: BaseEscalatorGame, force: bool = False) -> bool:
+        """
+        Draw the game.
+
+        Args:
+            game: The game to draw.
+            force: Whether to draw even if it is too soon for a frame, such
+                as for the last frame of a game.
+
+        Returns:
+            Whether the frame was drawn
+        """
+
+        now = self._clock()
+        if (
+            not force
+            and self._last_frame is not None
+            and now - self._last_frame < self._interval
+        ):
+            self._dropped += 1
+            return False
+        self._last_frame = now
+
+        cells = _cells(game)
+        if self._drawn is None:
+            # Clear the whole screen for the first frame
+            output = ["\033[2J"]
+            output.extend(
+                move + cell for move, cell in zip(self._moves, cells)
+            )
+        else:
+            output = [
+                move + cell
+                for move, cell, drawn in zip(self._moves, cells, self._drawn)
+                if cell != drawn
+            ]
+        self._drawn = cells
+
+        if len(output) != 0:
+            self._stream.write("".join(output))
+            self._stream.flush()
+        return True
+
+    def status(self, text: str) -> None:
+        """
+        Write a line of text below the frame.
+        """
+
+        self._stream.write(
+            f"\033[{self._top + FRAME_LINES + 1};1H\033[K{text}"
+        )
+        self._stream.flush()
+
+    def reset(self) -> None:
+        """
+        Redraw everything on the next frame.
+        """
+
+        self._drawn = None
+        self._last_frame = None
+
+    def close(self) -> None:
+        """
+        Move the cursor below the frame and its status line.
+        """
+
+        self._stream.write(f"\033[{self._top + FRAME_LINES + 2};1H")
+        self._stream.flush()
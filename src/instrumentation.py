@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+"""
+Opt-in instrumentation of the hot paths
+
+Methods marked with @timed have their calls counted and their wall time
+summed, but only while instrumentation is enabled. Marking a method leaves
+it untouched, and enabling swaps in a timing wrapper on its class, so there
+is no cost at all while disabled.
+
+Instrumentation is enabled either for a block;
+    with profiling():
+        ...
+    print(report())
+or for the whole process by setting the environment variable
+SOLITAIRE_PROFILE to "table" or "json", in which case a report is written
+at exit to stderr, or to the file named by SOLITAIRE_PROFILE_FILE (where any
+"{pid}" is replaced by the process ID). Worker processes started by
+multiprocessing report as they finish, each with their own figures.
+
+Times are inclusive, so a timed method that calls another is also charged
+for the time of the other.
+"""
+
+import atexit
+import json
+import multiprocessing.util
+import os
+import sys
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+from typing import Callable, Iterator
+
+PROFILE_ENV = "SOLITAIRE_PROFILE"
+PROFILE_FILE_ENV = "SOLITAIRE_PROFILE_FILE"
+REPORT_FORMATS = ("table", "json")
+
+# The marked functions by name, and their wrappers
+_originals: dict[str, Callable] = {}
+_wrappers: dict[str, Callable] = {}
+# The number of calls and total seconds by name
+_stats: dict[str, list] = {}
+_enabled = False
+
+
+def _owner(function: Callable) -> object:
+    """
+    The class (or module) that a function is defined on.
+    """
+
+    owner = sys.modules[function.__module__]
+    for part in function.__qualname__.split(".")[:-1]:
+        owner = getattr(owner, part)
+    return owner
+
+
+def _wrap(name: str, function: Callable) -> Callable:
+    stat = _stats.setdefault(name, [0, 0.0])
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            stat[0] += 1
+            stat[1] += perf_counter() - start
+
+    return wrapper
+
+
+def timed(function: Callable) -> Callable:
+    """
+    Mark a method to be timed while instrumentation is enabled.
+    """
+
+    name = function.__qualname__
+    _originals[name] = function
+    _wrappers[name] = _wrap(name, function)
+    # The class does not exist yet, so if already enabled then it is given
+    # the wrapper in place of the method
+    return _wrappers[name] if _enabled else function
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def enable() -> None:
+    """
+    Start timing the marked methods.
+    """
+
+    global _enabled
+    if _enabled:
+        return
+    _enabled = True
+    for name, wrapper in _wrappers.items():
+        setattr(_owner(_originals[name]), name.split(".")[-1], wrapper)
+
+
+def disable() -> None:
+    """
+    Stop timing the marked methods, keeping the figures so far.
+    """
+
+    global _enabled
+    if not _enabled:
+        return
+    _enabled = False
+    for name, function in _originals.items():
+        setattr(_owner(function), name.split(".")[-1], function)
+
+
+def reset() -> None:
+    """
+    Clear the figures so far.
+    """
+
+    for stat in _stats.values():
+        stat[0] = 0
+        stat[1] = 0.0
+
+
+@contextmanager
+def profiling(clear: bool = True) -> Iterator[None]:
+    """
+    Time the marked methods for the duration of the block.
+
+    Args:
+        clear: Whether to clear the figures so far first.
+    """
+
+    was_enabled = _enabled
+    if clear:
+        reset()
+    enable()
+    try:
+        yield
+    finally:
+        if not was_enabled:
+            disable()
+
+
+def stats() -> dict[str, dict[str, float]]:
+    """
+    The figures of the methods that have been called, by name.
+    """
+
+    return {
+        name: {"calls": calls, "seconds": seconds}
+        for name, (calls, seconds) in sorted(_stats.items())
+        if calls != 0
+    }
+
+
+def report(format: str = "table") -> str:
+    """
+    Report the figures so far, slowest first.
+
+    Args:
+        format: "table" for a table to read, or "json".
+
+    Raises:
+        ValueError: If the format is not known
+    """
+
+    figures = stats()
+    if format == "json":
+        return json.dumps({"pid": os.getpid(), "stats": figures})
+    if format != "table":
+        raise ValueError("Invalid report format")
+
+    lines = [
+        f"Profile of process {os.getpid()}",
+        f"{'':<46} {'calls':>10} {'seconds':>10} {'us/call':>10}",
+    ]
+    for name, stat in sorted(
+        figures.items(), key=lambda item: item[1]["seconds"], reverse=True
+    ):
+        lines.append(
+            f"{name:<46} {stat['calls']:>10} {stat['seconds']:>10.3f}"
+            f" {stat['seconds'] / stat['calls'] * 1e6:>10.2f}"
+        )
+    return "\n".join(lines)
+
+
+def _report_at_exit() -> None:
+    format = os.environ.get(PROFILE_ENV, "table")
+    text = report(format if format in REPORT_FORMATS else "table")
+    path = os.environ.get(PROFILE_FILE_ENV)
+    if path is None:
+        # Written at once, so that reports from workers do not interleave
+        sys.stderr.write(text + "\n")
+        sys.stderr.flush()
+        return
+    with open(path.format(pid=os.getpid()), "a") as file:
+        file.write(text + "\n")
+
+
+def _after_fork(_) -> None:
+    # A forked worker starts its own figures, and skips the atexit handlers
+    # when it finishes, so reports through multiprocessing instead
+    reset()
+    multiprocessing.util.Finalize(None, _report_at_exit, exitpriority=0)
+
+
+if os.environ.get(PROFILE_ENV):
+    enable()
+    atexit.register(_report_at_exit)
+    multiprocessing.util.register_after_fork(_report_at_exit, _after_fork)
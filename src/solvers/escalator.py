@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+"""
+Solver for Escalator Solitaire
+
+Decides whether a deal of Escalator can be won, and finds the shortest
+winning sequence of moves. This is the ground truth for labelling deals, and
+for measuring how far an agent is from playing perfectly.
+
+Every winning game clears the same 28 slots, so the shortest win is the one
+that flips the fewest cards from the stock. The search is an iterative
+deepening depth first search on the number of flips allowed, over the
+position as held by BitboardEscalatorGame. Only the ranks matter for which
+moves can be made, so positions are keyed by;
+- the mask of cleared pyramid slots,
+- the index of the top card of the stock, and
+- the rank of the card on the waste.
+Positions that cannot be won within a number of flips are kept in a
+transposition table, and as the stock only ever shrinks, a position that
+fails with some flips to spare also fails with fewer.
+"""
+
+from src.games.escalator import (
+    ADJACENT_RANKS,
+    BLOCKER_MASKS,
+    DECK_SIZE,
+    FULL_PYRAMID_MASK,
+    PYRAMID_SIZE,
+    SLOT_DESTINATIONS,
+    SLOT_PARENTS,
+    BaseEscalatorGame,
+    BitboardEscalatorGame,
+    find_dead_end,
+)
+
+
+class EscalatorSolver:
+    """
+    Exhaustive solver for Escalator Solitaire.
+    """
+
+    def __init__(self, prune_dead_ends: bool = False):
+        """
+        Args:
+            prune_dead_ends: Whether to stop searching from positions that
+                are found to be dead ends (see find_dead_end()).
+        """
+
+        self._prune_dead_ends = prune_dead_ends
+        self._ranks: list[int] = []
+        self._rank_masks: list[int] = []
+        # The set of ranks in the stock by the index of its top card
+        self._stock_ranks: list[int] = []
+        # Position key to the lowest stock index it failed to win from
+        self._failed: dict[int, int] = {}
+        self._floor = 0
+        self._path: list[int] = []
+        self._nodes = 0
+
+    @property
+    def nodes(self) -> int:
+        """
+        The number of positions searched by the last solve.
+        """
+        return self._nodes
+
+    def is_winnable(self, game: BaseEscalatorGame) -> bool:
+        """
+        Decide whether the game can still be won.
+
+        Args:
+            game: The game to solve, which is not changed.
+
+        Returns:
+            Whether there is a winning sequence of moves
+        """
+
+        position = self._load(game)
+        return self._search_floor(position, PYRAMID_SIZE - 1)
+
+    def solve(self, game: BaseEscalatorGame) -> list[int] | None:
+        """
+        Find the shortest winning sequence of moves.
+
+        Args:
+            game: The game to solve, which is not changed.
+
+        Returns:
+            The destinations to pass to move() in turn to win the game, or
+            None if the game cannot be won
+        """
+
+        position = self._load(game)
+        stock_index = position[2]
+
+        # A quick search with every flip allowed settles whether the game
+        # can be won, and its failures prune all of the deeper searches
+        if not self._search_floor(position, PYRAMID_SIZE - 1):
+            return None
+        for floor in range(stock_index, PYRAMID_SIZE - 2, -1):
+            if self._search_floor(position, floor):
+                return list(self._path)
+
+        # The quick search found a win, so the last floor must have too
+        raise AssertionError("Unreachable")
+
+    def _load(self, game: BaseEscalatorGame) -> tuple[int, int, int, int]:
+        """
+        Set up the tables for the game, and return its position.
+        """
+
+        if not isinstance(game, BitboardEscalatorGame):
+            bitboard = BitboardEscalatorGame()
+            bitboard.deal(
+                stock=game.stock,
+                waste=game.waste,
+                tableau=game.tableau,
+                foundation=game.foundation,
+                reserve=game.reserve,
+            )
+            game = bitboard
+
+        cleared = game.cleared_mask
+        self._ranks = [card // 4 + 1 for card in game.deck]
+        self._rank_masks = [0] * 14
+        exposed = 0
+        for slot in range(PYRAMID_SIZE):
+            if cleared >> slot & 1:
+                continue
+            self._rank_masks[self._ranks[slot]] |= 1 << slot
+            blockers = BLOCKER_MASKS[slot]
+            if cleared & blockers == blockers:
+                exposed |= 1 << slot
+
+        self._stock_ranks = [0] * PYRAMID_SIZE
+        for rank in self._ranks[PYRAMID_SIZE:]:
+            self._stock_ranks.append(self._stock_ranks[-1] | 1 << rank)
+
+        self._failed.clear()
+        self._nodes = 0
+        return cleared, exposed, game.stock_index, game.waste_rank
+
+    def _search_floor(
+        self, position: tuple[int, int, int, int], floor: int
+    ) -> bool:
+        """
+        Search for a win that does not flip the stock below the floor.
+        """
+
+        self._floor = floor
+        self._path.clear()
+        return self._search(*position)
+
+    def _search(
+        self, cleared: int, exposed: int, stock_index: int, waste_rank: int
+    ) -> bool:
+        """
+        Depth first search for a win from the position, leaving the moves
+        to it in the path.
+        """
+
+        if cleared == FULL_PYRAMID_MASK:
+            return True
+
+        key = cleared | stock_index << PYRAMID_SIZE | waste_rank << 34
+        # Positions not yet searched are above every floor
+        if self._failed.get(key, DECK_SIZE) <= self._floor:
+            return False
+        self._nodes += 1
+
+        if self._prune_dead_ends and find_dead_end(
+            self._rank_masks,
+            FULL_PYRAMID_MASK & ~cleared,
+            self._stock_ranks[stock_index] | 1 << waste_rank,
+        ):
+            # Lost however many flips are allowed
+            self._failed[key] = PYRAMID_SIZE - 1
+            return False
+
+        # Clearing a slot never costs a flip, so try them first, from the
+        # bottom of the pyramid up as those uncover the most
+        if waste_rank != 0:
+            rank_up, rank_down = ADJACENT_RANKS[waste_rank]
+            playable = (
+                (self._rank_masks[rank_up] | self._rank_masks[rank_down])
+                & exposed
+            )
+            while playable:
+                slot = playable.bit_length() - 1
+                bit = 1 << slot
+                playable ^= bit
+
+                next_cleared = cleared | bit
+                next_exposed = exposed & ~bit
+                for parent in SLOT_PARENTS[slot]:
+                    blockers = BLOCKER_MASKS[parent]
+                    if next_cleared & blockers == blockers:
+                        next_exposed |= 1 << parent
+
+                self._path.append(SLOT_DESTINATIONS[slot])
+                if self._search(
+                    next_cleared, next_exposed, stock_index, self._ranks[slot]
+                ):
+                    return True
+                self._path.pop()
+
+        # Flip the stock, if allowed
+        if stock_index > self._floor and stock_index >= PYRAMID_SIZE:
+            self._path.append(0)
+            if self._search(
+                cleared, exposed, stock_index - 1, self._ranks[stock_index]
+            ):
+                return True
+            self._path.pop()
+
+        self._failed[key] = self._floor
+        return False
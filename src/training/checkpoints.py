@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+"""
+Background checkpoint writing
+
+A checkpoint is a set of arrays by name, written as one .npz file per
+iteration;
+    directory/checkpoint-0000001000.npz
+
+Checkpoints are written by a background thread, so that training only pays
+for taking the snapshot. If snapshots come faster than they can be written,
+only the newest waiting snapshot is written, and the others are dropped.
+
+Each file is written under a temporary name and renamed into place, so a
+checkpoint is either whole or not there at all, even if the process dies
+part way through writing it. Only the newest few checkpoints are kept.
+
+The thread is a daemon so that it never keeps the process alive, which means
+a snapshot still waiting at exit is lost; close() the writer (or use it in a
+with block) to be sure the newest snapshot is written.
+"""
+
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+
+_SUFFIX = ".npz"
+_TEMP_SUFFIX = ".tmp"
+
+
+def checkpoint_paths(
+    directory: Path, prefix: str = "checkpoint"
+) -> list[Path]:
+    """
+    The checkpoints in a directory, oldest first.
+    """
+
+    return sorted(Path(directory).glob(f"{prefix}-*{_SUFFIX}"))
+
+
+def load_checkpoint(path: Path) -> dict[str, np.ndarray]:
+    """
+    Read the arrays of a checkpoint.
+    """
+
+    with np.load(path) as arrays:
+        return dict(arrays)
+
+
+class CheckpointWriter:
+    """
+    Writes checkpoints in a background thread.
+
+    Errors met while writing are raised by the next call to submit(),
+    flush() or close().
+    """
+
+    def __init__(
+        self, directory: Path, keep: int = 3, prefix: str = "checkpoint"
+    ):
+        """
+        Args:
+            directory: The directory to write to, made if need be.
+            keep: The number of newest checkpoints kept.
+            prefix: The start of the name of each checkpoint file.
+        """
+
+        if keep < 1:
+            raise ValueError("Must keep at least one checkpoint")
+
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._keep = keep
+        self._prefix = prefix
+
+        self._condition = threading.Condition()
+        self._pending: tuple[int, dict[str, np.ndarray]] | None = None
+        self._writing = False
+        self._closed = False
+        self._error: BaseException | None = None
+        self._written = 0
+        self._dropped = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def written(self) -> int:
+        """
+        The number of checkpoints written.
+        """
+        return self._written
+
+    @property
+    def dropped(self) -> int:
+        """
+        The number of snapshots replaced by newer ones before being written.
+        """
+        return self._dropped
+
+    def path(self, iteration: int) -> Path:
+        """
+        The path of the checkpoint of an iteration.
+        """
+        return self._directory / f"{self._prefix}-{iteration:010d}{_SUFFIX}"
+
+    def submit(self, iteration: int, state: dict[str, np.ndarray]) -> None:
+        """
+        Queue a snapshot to be written, without waiting.
+
+        The arrays must not be changed afterwards, so should be copies.
+
+        Args:
+            iteration: The training iteration, which orders checkpoints.
+            state: The arrays to write, by name.
+        """
+
+        with self._condition:
+            self._raise_error()
+            if self._closed:
+                raise ValueError("Checkpoint writer is closed")
+            if self._pending is not None:
+                self._dropped += 1
+            self._pending = (iteration, state)
+            self._condition.notify_all()
+
+    def flush(self) -> None:
+        """
+        Wait until every queued snapshot is written.
+        """
+
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._pending is None and not self._writing
+            )
+            self._raise_error()
+
+    def close(self) -> None:
+        """
+        Write any queued snapshot, and stop the thread.
+        """
+
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        with self._condition:
+            self._raise_error()
+
+    def __enter__(self) -> "CheckpointWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._pending is not None or self._closed
+                )
+                if self._pending is None:
+                    return
+                iteration, state = self._pending
+                self._pending = None
+                self._writing = True
+
+            try:
+                self._write(iteration, state)
+            except BaseException as error:
+                with self._condition:
+                    self._error = error
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+    def _write(self, iteration: int, state: dict[str, np.ndarray]) -> None:
+        path = self.path(iteration)
+        temp_path = path.with_name(path.name + _TEMP_SUFFIX)
+        try:
+            with open(temp_path, "wb") as file:
+                np.savez(file, **state)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            # A partial checkpoint is never left behind
+            temp_path.unlink(missing_ok=True)
+            raise
+        self._written += 1
+
+        for old in checkpoint_paths(self._directory, self._prefix)[
+            :-self._keep
+        ]:
+            old.unlink(missing_ok=True)
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+
+"""
+On-disk episode store for Escalator Solitaire
+
+Trajectories are kept in a directory of shards, each a directory of flat
+binary files;
+- index.bin, one EPISODE_DTYPE record per episode, holding its seed, deal,
+  whether it was won, and where its moves are in the other files,
+- actions.bin, the action index of every move (uint8), and
+- rewards.bin, the reward of every move (int16).
+
+The moves of an episode are written before its index record, so an episode
+is only seen by readers once it is complete, and a writer that dies part way
+through an episode leaves nothing but unreferenced moves behind. Each writer
+starts new shards, each claimed by creating its directory, so writers never
+append to the same files, even when writing at the same time.
+
+Readers memory-map the shards, so only the parts read are loaded.
+"""
+
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+import numpy as np
+
+from src.games.escalator import DECK_SIZE
+from src.training.rollout import Trajectory
+
+
+EPISODE_DTYPE = np.dtype([
+    ("seed", "<i8"),
+    ("deal", "u1", (DECK_SIZE,)),
+    ("won", "?"),
+    ("offset", "<i8"),
+    ("length", "<u4"),
+])
+ACTION_DTYPE = np.dtype("u1")
+REWARD_DTYPE = np.dtype("<i2")
+
+_INDEX_FILE = "index.bin"
+_ACTIONS_FILE = "actions.bin"
+_REWARDS_FILE = "rewards.bin"
+_SHARD_PREFIX = "shard-"
+
+
+def _shard_number(path: Path) -> int:
+    """
+    The number of a shard from its path, -1 if it is not a shard.
+    """
+
+    number = path.name[len(_SHARD_PREFIX):]
+    return int(number) if number.isdigit() else -1
+
+
+def _shard_paths(root: Path) -> list[Path]:
+    """
+    The shards of a store, in order of their numbers.
+    """
+
+    shards = [
+        path for path in root.glob(f"{_SHARD_PREFIX}*")
+        if _shard_number(path) >= 0
+    ]
+    return sorted(shards, key=_shard_number)
+
+
+class EpisodeBatch(NamedTuple):
+    """
+    A batch of episodes, with their moves laid end to end.
+
+    The moves of episode i are actions[offsets[i]:offsets[i + 1]], and the
+    same for the rewards.
+    """
+
+    seeds: np.ndarray
+    deals: np.ndarray
+    won: np.ndarray
+    offsets: np.ndarray
+    actions: np.ndarray
+    rewards: np.ndarray
+
+
+class EpisodeWriter:
+    """
+    Appends episodes to a store.
+
+    Episodes are buffered, and are only seen by readers once flushed.
+    Use as a context manager, so that the last episodes are flushed;
+        with EpisodeWriter("episodes") as writer:
+            writer.write_all(farm.run(range(10000)))
+    """
+
+    def __init__(
+        self, root: str | Path, shard_moves: int = 1 << 24,
+        flush_episodes: int = 1024,
+    ):
+        """
+        Args:
+            root: The directory of the store, created if needed
+            shard_moves: The number of moves after which a new shard is
+                started
+            flush_episodes: The number of episodes buffered between flushes
+        """
+
+        self._root = Path(root)
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._shard_moves = shard_moves
+        self._flush_episodes = flush_episodes
+
+        shards = _shard_paths(self._root)
+        # Only where to start looking, other writers may take shards first
+        self._next_shard = (
+            _shard_number(shards[-1]) + 1 if len(shards) != 0 else 0
+        )
+        self._index = None
+        self._actions = None
+        self._rewards = None
+        self._shard_offset = 0
+        self._pending = []
+
+    def __enter__(self) -> "EpisodeWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def write(self, trajectory: Trajectory) -> None:
+        """
+        Add an episode.
+
+        Raises:
+            ValueError: If the writer has been closed
+        """
+
+        if self._pending is None:
+            raise ValueError("The writer has been closed")
+        if self._index is None or self._shard_offset >= self._shard_moves:
+            self._start_shard()
+
+        length = len(trajectory.actions)
+        self._actions.write(
+            np.asarray(trajectory.actions, dtype=ACTION_DTYPE).tobytes()
+        )
+        self._rewards.write(
+            np.asarray(trajectory.rewards, dtype=REWARD_DTYPE).tobytes()
+        )
+        self._pending.append((
+            trajectory.seed, trajectory.deal, trajectory.won,
+            self._shard_offset, length,
+        ))
+        self._shard_offset += length
+
+        if len(self._pending) >= self._flush_episodes:
+            self.flush()
+
+    def write_all(self, trajectories: Iterable[Trajectory]) -> None:
+        for trajectory in trajectories:
+            self.write(trajectory)
+
+    def flush(self) -> None:
+        """
+        Make the buffered episodes visible to readers.
+        """
+
+        if self._index is None or len(self._pending) == 0:
+            return
+
+        # The moves must be in the files before the index points to them
+        self._actions.flush()
+        self._rewards.flush()
+        self._index.write(np.array(self._pending, EPISODE_DTYPE).tobytes())
+        self._index.flush()
+        self._pending.clear()
+
+    def close(self) -> None:
+        """
+        Flush the buffered episodes, and close the shard files.
+        """
+
+        if self._pending is None:
+            return
+        self._close_shard()
+        self._pending = None
+
+    def _start_shard(self) -> None:
+        self._close_shard()
+        # Making the directory claims the shard, so if another writer has
+        # taken it then try the next
+        while True:
+            shard = self._root / f"{_SHARD_PREFIX}{self._next_shard:05d}"
+            self._next_shard += 1
+            try:
+                shard.mkdir()
+                break
+            except FileExistsError:
+                continue
+        self._index = open(shard / _INDEX_FILE, "wb")
+        self._actions = open(shard / _ACTIONS_FILE, "wb")
+        self._rewards = open(shard / _REWARDS_FILE, "wb")
+        self._shard_offset = 0
+
+    def _close_shard(self) -> None:
+        if self._index is None:
+            return
+        self.flush()
+        for file in (self._index, self._actions, self._rewards):
+            file.close()
+        self._index = self._actions = self._rewards = None
+
+
+class _Shard(NamedTuple):
+    index: np.ndarray
+    actions: np.ndarray
+    rewards: np.ndarray
+
+
+class EpisodeReader:
+    """
+    Reads episodes from a store.
+
+    The episodes are those flushed when the reader was opened, or last
+    refreshed.
+    """
+
+    def __init__(self, root: str | Path):
+        """
+        Args:
+            root: The directory of the store
+        """
+
+        self._root = Path(root)
+        self._shards = []
+        self._starts = np.zeros(1, dtype=np.int64)
+        self.refresh()
+
+    def __len__(self) -> int:
+        """
+        The number of episodes.
+        """
+        return int(self._starts[-1])
+
+    @property
+    def num_moves(self) -> int:
+        return sum(int(shard.index["length"].sum()) for shard in self._shards)
+
+    def refresh(self) -> None:
+        """
+        Pick up the episodes flushed since the reader was opened.
+        """
+
+        self._shards = []
+        for path in _shard_paths(self._root):
+            size = (path / _INDEX_FILE).stat().st_size
+            count = size // EPISODE_DTYPE.itemsize
+            if count == 0:
+                continue
+            index = np.memmap(
+                path / _INDEX_FILE, EPISODE_DTYPE, "r", shape=(count,)
+            )
+            moves = int(index["offset"][-1] + index["length"][-1])
+            if moves == 0:
+                actions = np.zeros(0, ACTION_DTYPE)
+                rewards = np.zeros(0, REWARD_DTYPE)
+            else:
+                actions = np.memmap(
+                    path / _ACTIONS_FILE, ACTION_DTYPE, "r", shape=(moves,)
+                )
+                rewards = np.memmap(
+                    path / _REWARDS_FILE, REWARD_DTYPE, "r", shape=(moves,)
+                )
+            self._shards.append(_Shard(index, actions, rewards))
+
+        self._starts = np.zeros(len(self._shards) + 1, dtype=np.int64)
+        np.cumsum(
+            [len(shard.index) for shard in self._shards],
+            out=self._starts[1:],
+        )
+
+    def episode(self, i: int) -> Trajectory:
+        """
+        Read an episode.
+
+        Raises:
+            IndexError: If there is no such episode
+        """
+
+        if not 0 <= i < len(self):
+            raise IndexError("Episode index out of range")
+        shard_index = int(np.searchsorted(self._starts, i, side="right")) - 1
+        shard = self._shards[shard_index]
+        record = shard.index[i - self._starts[shard_index]]
+        moves = slice(
+            int(record["offset"]), int(record["offset"] + record["length"])
+        )
+        return Trajectory(
+            int(record["seed"]),
+            tuple(record["deal"].tolist()),
+            tuple(shard.actions[moves].tolist()),
+            tuple(shard.rewards[moves].tolist()),
+            bool(record["won"]),
+        )
+
+    def __iter__(self) -> Iterator[Trajectory]:
+        for i in range(len(self)):
+            yield self.episode(i)
+
+    def batches(self, batch_size: int) -> Iterator[EpisodeBatch]:
+        """
+        Read the episodes in order, a batch at a time.
+
+        A batch does not cross shards, so the last batch of each shard may
+        be smaller.
+
+        Args:
+            batch_size: The number of episodes in a batch
+        """
+
+        for shard in self._shards:
+            for start in range(0, len(shard.index), batch_size):
+                records = shard.index[start:start + batch_size]
+                first = int(records["offset"][0])
+                last = int(records["offset"][-1] + records["length"][-1])
+                offsets = np.zeros(len(records) + 1, dtype=np.int64)
+                offsets[:-1] = records["offset"] - first
+                offsets[-1] = last - first
+                yield EpisodeBatch(
+                    np.array(records["seed"]),
+                    np.array(records["deal"]),
+                    np.array(records["won"]),
+                    offsets,
+                    np.array(shard.actions[first:last]),
+                    np.array(shard.rewards[first:last]),
+                )
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+
+"""
+Streaming statistics of games played
+
+Every figure is kept in constant memory however many games are played, by
+online algorithms;
+- RunningMoments, the count, mean, variance, minimum and maximum (by
+  Welford's method),
+- Histogram, counts in fixed width bins, and
+- QuantileSketch, approximate quantiles from a KLL sketch, a stack of
+  buffers each half as finely sampled as the one below.
+
+Each can be merged with another of its kind, so figures gathered in worker
+processes can be sent back (they pickle) and added together, as if every
+value had been added to one.
+
+GameStats gathers these for the games played, fed with each move as it is
+made, or with whole trajectories.
+"""
+
+from math import ceil, sqrt
+from random import Random
+from typing import Sequence
+
+import numpy as np
+
+from src.games.escalator import DECK_SIZE, PYRAMID_SIZE
+from src.training.rollout import Trajectory
+
+
+class RunningMoments:
+    """
+    The count, mean, variance and range of the values added.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        # Sum of squared differences from the mean
+        self._m2 = 0.0
+        self.minimum = float("inf")
+        self.maximum = float("-inf")
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+
+    def merge(self, other: "RunningMoments") -> None:
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += (
+            other._m2 + delta * delta * self.count * other.count / count
+        )
+        self.count = count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    @property
+    def variance(self) -> float:
+        """
+        The sample variance, 0 for fewer than two values.
+        """
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return sqrt(self.variance)
+
+
+class Histogram:
+    """
+    Counts of the values added in equal bins over a range, with the values
+    below and above the range counted apart.
+    """
+
+    def __init__(self, low: float, high: float, bins: int):
+        """
+        Args:
+            low: The lowest value of the first bin.
+            high: The end of the last bin.
+            bins: The number of bins.
+        """
+
+        if high <= low or bins < 1:
+            raise ValueError("Invalid histogram range")
+
+        self.low = low
+        self.high = high
+        self._width = (high - low) / bins
+        # Below the range first, and above it last
+        self._counts = np.zeros(bins + 2, dtype=np.int64)
+
+    @property
+    def counts(self) -> np.ndarray:
+        """
+        The counts of the bins within the range.
+        """
+        return self._counts[1:-1]
+
+    @property
+    def underflow(self) -> int:
+        return int(self._counts[0])
+
+    @property
+    def overflow(self) -> int:
+        return int(self._counts[-1])
+
+    @property
+    def edges(self) -> np.ndarray:
+        return np.linspace(self.low, self.high, len(self._counts) - 1)
+
+    def add(self, value: float) -> None:
+        if value < self.low:
+            self._counts[0] += 1
+        elif value >= self.high:
+            self._counts[-1] += 1
+        else:
+            self._counts[int((value - self.low) / self._width) + 1] += 1
+
+    def add_many(self, values: Sequence[float]) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        bins = np.floor((values - self.low) / self._width).astype(np.int64)
+        np.add.at(
+            self._counts, np.clip(bins + 1, 0, len(self._counts) - 1), 1
+        )
+
+    def merge(self, other: "Histogram") -> None:
+        if (
+            other.low != self.low
+            or other.high != self.high
+            or len(other._counts) != len(self._counts)
+        ):
+            raise ValueError("Histograms have different bins")
+        self._counts += other._counts
+
+
+class QuantileSketch:
+    """
+    Approximate quantiles of the values added, in memory of about 3k values.
+
+    The error in rank, as a fraction of the number of values, shrinks in
+    proportion to 1 / k, and does not grow with the number of values.
+    """
+
+    def __init__(self, k: int = 200, seed: int | None = None):
+        """
+        Args:
+            k: The size of the top buffer, larger for more accuracy.
+            seed: Seed for which half of each buffer is kept on compacting.
+        """
+
+        if k < 2:
+            raise ValueError("k must be at least 2")
+
+        self._k = k
+        self._rng = Random(seed)
+        # The values kept at each level, each standing for 2 ** level values
+        self._levels: list[list[float]] = [[]]
+        self._count = 0
+
+    def __len__(self) -> int:
+        """
+        The number of values added.
+        """
+        return self._count
+
+    @property
+    def num_retained(self) -> int:
+        return sum(len(level) for level in self._levels)
+
+    def add(self, value: float) -> None:
+        self._levels[0].append(value)
+        self._count += 1
+        if len(self._levels[0]) >= self._capacity(0):
+            self._compact()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        while len(self._levels) < len(other._levels):
+            self._levels.append([])
+        for level, values in enumerate(other._levels):
+            self._levels[level].extend(values)
+        self._count += other._count
+        self._compact()
+
+    def quantile(self, q: float) -> float:
+        """
+        The value with about a fraction q of the values added at or below
+        it.
+
+        Raises:
+            ValueError: If no values have been added, or q is not in [0, 1]
+        """
+
+        if self._count == 0:
+            raise ValueError("No values added")
+        if not 0 <= q <= 1:
+            raise ValueError("Quantile must be between 0 and 1")
+
+        weighted = sorted(
+            (value, 1 << level)
+            for level, values in enumerate(self._levels)
+            for value in values
+        )
+        target = q * sum(weight for _, weight in weighted)
+        total = 0
+        for value, weight in weighted:
+            total += weight
+            if total >= target:
+                return value
+        return weighted[-1][0]
+
+    def _capacity(self, level: int) -> int:
+        # Lower levels are smaller, shrinking by 2/3 with each level below
+        # the top
+        depth = len(self._levels) - level - 1
+        return max(2, ceil(self._k * (2 / 3) ** depth))
+
+    def _compact(self) -> None:
+        """
+        Halve every level that is full into the level above it, keeping
+        either the odd or the even values in order.
+        """
+
+        level = 0
+        while level < len(self._levels):
+            values = self._levels[level]
+            if len(values) >= self._capacity(level):
+                if level + 1 == len(self._levels):
+                    self._levels.append([])
+                values.sort()
+                # An odd value out stays behind
+                kept = [values.pop()] if len(values) % 2 else []
+                self._levels[level + 1].extend(
+                    values[self._rng.getrandbits(1)::2]
+                )
+                self._levels[level] = kept
+                # The level above may now be full
+            level += 1
+
+
+class Distribution:
+    """
+    The moments, histogram and quantiles of a value.
+    """
+
+    def __init__(
+        self, low: float, high: float, bins: int, k: int = 200,
+        seed: int | None = None,
+    ):
+        self.moments = RunningMoments()
+        self.histogram = Histogram(low, high, bins)
+        self.sketch = QuantileSketch(k, seed)
+
+    def add(self, value: float) -> None:
+        self.moments.add(value)
+        self.histogram.add(value)
+        self.sketch.add(value)
+
+    def merge(self, other: "Distribution") -> None:
+        self.moments.merge(other.moments)
+        self.histogram.merge(other.histogram)
+        self.sketch.merge(other.sketch)
+
+    def summary(self) -> dict[str, float]:
+        if self.moments.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.moments.count,
+            "mean": self.moments.mean,
+            "std": self.moments.std,
+            "min": self.moments.minimum,
+            "p50": self.sketch.quantile(0.5),
+            "p90": self.sketch.quantile(0.9),
+            "p99": self.sketch.quantile(0.99),
+            "max": self.moments.maximum,
+        }
+
+
+class GameStats:
+    """
+    Statistics of the games played;
+    - the win rate,
+    - the score, length (in moves) and chains (runs of pyramid clears
+      between flips of the stock) of the games, and
+    - the moves made by type.
+
+    Either feed each move and the end of each game;
+        stats.record_move(action, reward)
+        ...
+        stats.end_game(won)
+    or whole trajectories with add_trajectory().
+    """
+
+    # Scores are 1 per card cleared, and 100 for a win or -100 for a loss
+    SCORE_RANGE = (-100, PYRAMID_SIZE + 101)
+
+    def __init__(self, k: int = 200, seed: int | None = None):
+        """
+        Args:
+            k: The size of the quantile sketches.
+            seed: Seed for the quantile sketches.
+        """
+
+        self.games = 0
+        self.wins = 0
+        self.flips = 0
+        self.clears = 0
+        low, high = self.SCORE_RANGE
+        self.score = Distribution(low, high, high - low, k, seed)
+        self.length = Distribution(0, DECK_SIZE + 1, DECK_SIZE + 1, k, seed)
+        self.chain = Distribution(
+            1, PYRAMID_SIZE + 1, PYRAMID_SIZE, k, seed
+        )
+
+        # The game being played
+        self._moves = 0
+        self._score = 0.0
+        self._chain = 0
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.games if self.games != 0 else 0.0
+
+    def record_move(self, action: int, reward: float) -> None:
+        """
+        Record a move of the game being played.
+        """
+
+        self._moves += 1
+        self._score += reward
+        if action == 0:
+            self.flips += 1
+            if self._chain != 0:
+                self.chain.add(self._chain)
+                self._chain = 0
+        else:
+            self.clears += 1
+            self._chain += 1
+
+    def end_game(self, won: bool) -> None:
+        """
+        Record the end of the game being played.
+        """
+
+        if self._chain != 0:
+            self.chain.add(self._chain)
+        self.games += 1
+        self.wins += won
+        self.score.add(self._score)
+        self.length.add(self._moves)
+        self._moves = 0
+        self._score = 0.0
+        self._chain = 0
+
+    def add_trajectory(self, trajectory: Trajectory) -> None:
+        for action, reward in zip(trajectory.actions, trajectory.rewards):
+            self.record_move(action, reward)
+        self.end_game(trajectory.won)
+
+    def merge(self, other: "GameStats") -> None:
+        """
+        Add the games of another, such as from a worker process. Any game
+        the other is part way through is left out.
+        """
+
+        self.games += other.games
+        self.wins += other.wins
+        self.flips += other.flips
+        self.clears += other.clears
+        self.score.merge(other.score)
+        self.length.merge(other.length)
+        self.chain.merge(other.chain)
+
+    def summary(self) -> dict:
+        return {
+            "games": self.games,
+            "win_rate": self.win_rate,
+            "flips": self.flips,
+            "clears": self.clears,
+            "score": self.score.summary(),
+            "length": self.length.summary(),
+            "chain": self.chain.summary(),
+        }
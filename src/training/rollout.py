@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+"""
+Self-play rollouts for Escalator Solitaire
+
+Complete games are played by a pool of worker processes, and the finished
+trajectories are streamed back as they are done. Every game is played from
+its own seed, which decides both the deal and the choices of the policy, so
+the trajectory for a seed is always the same however many workers there are.
+"""
+
+import multiprocessing
+import signal
+from random import Random
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+from src.games.escalator import DECK_SIZE, BitboardEscalatorGame
+
+
+Policy = Callable[[BitboardEscalatorGame, Random], int]
+
+
+class Trajectory(NamedTuple):
+    """
+    A complete game, as played from a seed.
+    """
+
+    seed: int
+    # The card indices of the deal, see BitboardEscalatorGame.deal_deck()
+    deal: tuple[int, ...]
+    actions: tuple[int, ...]
+    rewards: tuple[int, ...]
+    won: bool
+
+
+def play_episode(
+    policy: Policy, seed: int, detect_dead_ends: bool = True
+) -> Trajectory:
+    """
+    Play a complete game.
+
+    Args:
+        policy: The policy choosing the moves
+        seed: The seed for the deal and the policy
+        detect_dead_ends: Whether to stop the game as lost as soon as it
+            can no longer be won, rather than playing it out
+
+    Returns:
+        The trajectory of the game
+    """
+
+    rng = Random(seed)
+    deal = list(range(DECK_SIZE))
+    rng.shuffle(deal)
+    game = BitboardEscalatorGame(detect_dead_ends=detect_dead_ends)
+    game.deal_deck(deal)
+
+    actions = []
+    rewards = []
+    while not (game.in_winning_state or game.in_losing_state):
+        action = policy(game, rng)
+        rewards.append(game.move_action(action))
+        actions.append(action)
+
+    return Trajectory(
+        seed, tuple(deal), tuple(actions), tuple(rewards),
+        game.in_winning_state,
+    )
+
+
+# The policy of a worker process, and whether it stops at dead ends
+_worker_policy: Policy | None = None
+_worker_detect_dead_ends = True
+
+
+def _init_worker(policy: Policy, detect_dead_ends: bool) -> None:
+    global _worker_policy, _worker_detect_dead_ends
+    _worker_policy = policy
+    _worker_detect_dead_ends = detect_dead_ends
+
+    # Interrupts are handled by the parent, which then stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _play_chunk(seeds: list[int]) -> list[Trajectory]:
+    return [
+        play_episode(_worker_policy, seed, _worker_detect_dead_ends)
+        for seed in seeds
+    ]
+
+
+class RolloutFarm:
+    """
+    Plays games across a pool of worker processes.
+
+    Use as a context manager, so that the workers are shut down when done;
+        with RolloutFarm(random_policy, 8) as farm:
+            for trajectory in farm.run(range(10000)):
+                ...
+    Leaving normally waits for the workers to finish, while leaving on an
+    exception (such as an interrupt) stops them straight away.
+    """
+
+    def __init__(
+        self, policy: Policy, num_workers: int | None = None,
+        chunk_size: int = 16, detect_dead_ends: bool = True,
+    ):
+        """
+        Args:
+            policy: The policy choosing the moves, which must be picklable
+                (such as a module level function)
+            num_workers: The number of worker processes, defaults to one per
+                CPU. With 0 the games are played in this process.
+            chunk_size: The number of games sent to a worker at a time
+            detect_dead_ends: Whether games stop as lost as soon as they can
+                no longer be won, see play_episode()
+        """
+
+        self._policy = policy
+        self._detect_dead_ends = detect_dead_ends
+        self._num_workers = (
+            multiprocessing.cpu_count() if num_workers is None
+            else num_workers
+        )
+        self._chunk_size = chunk_size
+        self._pool = None
+        if self._num_workers > 0:
+            self._pool = multiprocessing.Pool(
+                self._num_workers, _init_worker,
+                (policy, detect_dead_ends),
+            )
+
+    @property
+    def num_workers(self) -> int:
+        return self._num_workers
+
+    def __enter__(self) -> "RolloutFarm":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
+
+    def run(
+        self, seeds: Iterable[int], ordered: bool = False
+    ) -> Iterator[Trajectory]:
+        """
+        Play a game for every seed.
+
+        Args:
+            seeds: The seeds of the games
+            ordered: Whether to give the trajectories in the order of the
+                seeds, rather than as soon as they are done
+
+        Returns:
+            The trajectories of the games
+
+        Raises:
+            ValueError: If the workers have been shut down
+        """
+
+        if self._num_workers == 0:
+            for seed in seeds:
+                yield play_episode(
+                    self._policy, seed, self._detect_dead_ends
+                )
+            return
+
+        if self._pool is None:
+            raise ValueError("The workers have been shut down")
+        imap = self._pool.imap if ordered else self._pool.imap_unordered
+        for trajectories in imap(_play_chunk, self._chunks(seeds)):
+            yield from trajectories
+
+    def close(self) -> None:
+        """
+        Wait for the workers to finish, and shut them down.
+        """
+
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def terminate(self) -> None:
+        """
+        Stop the workers straight away.
+        """
+
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def _chunks(self, seeds: Iterable[int]) -> Iterator[list[int]]:
+        chunk = []
+        for seed in seeds:
+            chunk.append(seed)
+            if len(chunk) == self._chunk_size:
+                yield chunk
+                chunk = []
+        if len(chunk) != 0:
+            yield chunk
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+"""
+Random access to the positions of a recorded episode
+
+An episode is recorded as its deal and its actions, from which any position
+can be had by replaying the actions, but replaying from the deal each time
+is slow for long episodes, and keeping every position is large.
+
+The position of Escalator Solitaire is small though, the deal aside, it is;
+- the mask of cleared pyramid slots,
+- the index into the deal of the top card of the stock, and
+- the card on the waste,
+packed into SNAPSHOT_DTYPE, which is kept every interval moves. Each card
+cleared puts the card on the waste onto the foundation, so the foundation of
+any position is the start of a single sequence for the whole episode, as
+long as the number of cards cleared.
+
+The position after t moves is then dealt from the snapshot at or before t,
+and only the moves since are replayed.
+"""
+
+from typing import Sequence
+
+import numpy as np
+
+from src.games.escalator import BaseEscalatorGame, EscalatorGame
+from src.training.rollout import Trajectory
+
+
+SNAPSHOT_DTYPE = np.dtype([
+    ("cleared", "<u4"),
+    ("stock_index", "u1"),
+    ("waste", "i1"),
+])
+
+
+class EpisodeSnapshots:
+    """
+    The positions of an episode, by the number of moves made.
+    """
+
+    def __init__(
+        self,
+        deal: Sequence[int],
+        actions: Sequence[int],
+        interval: int = 16,
+        engine: type[BaseEscalatorGame] = EscalatorGame,
+    ):
+        """
+        Args:
+            deal: The card indices the game was dealt from (see
+                EscalatorGame.deal_deck()).
+            actions: The action index of every move.
+            interval: The number of moves between snapshots.
+            engine: The class of the games made by state_at().
+
+        Raises:
+            ValueError: If the interval is not positive
+        """
+
+        if interval < 1:
+            raise ValueError("Interval must be positive")
+
+        self._deal = tuple(int(card) for card in deal)
+        self._actions = np.asarray(actions, dtype=np.uint8)
+        self._interval = interval
+        self._engine = engine
+
+        # Play through the episode once, snapshotting as it goes. The moves
+        # are only checked when replayed by the game.
+        self._snapshots = np.zeros(
+            len(self._actions) // interval + 1, dtype=SNAPSHOT_DTYPE
+        )
+        foundation = []
+        cleared = 0
+        stock_index = len(self._deal) - 1
+        waste = -1
+        for step, action in enumerate(self._actions.tolist()):
+            if step % interval == 0:
+                self._snapshots[step // interval] = (
+                    cleared, stock_index, waste
+                )
+            if action == 0:
+                waste = self._deal[stock_index]
+                stock_index -= 1
+            else:
+                foundation.append(waste)
+                cleared |= 1 << action - 1
+                waste = self._deal[action - 1]
+        if len(self._actions) % interval == 0:
+            self._snapshots[-1] = (cleared, stock_index, waste)
+        self._foundation = np.array(foundation, dtype=np.int8)
+
+    @classmethod
+    def from_trajectory(
+        cls,
+        trajectory: Trajectory,
+        interval: int = 16,
+        engine: type[BaseEscalatorGame] = EscalatorGame,
+    ) -> "EpisodeSnapshots":
+        return cls(trajectory.deal, trajectory.actions, interval, engine)
+
+    def __len__(self) -> int:
+        """
+        The number of positions, one more than the number of moves.
+        """
+        return len(self._actions) + 1
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The memory held by the snapshots and the foundation sequence.
+        """
+        return self._snapshots.nbytes + self._foundation.nbytes
+
+    def state_at(
+        self, step: int, game: BaseEscalatorGame | None = None
+    ) -> BaseEscalatorGame:
+        """
+        The position after a number of moves.
+
+        Args:
+            step: The number of moves made, from 0 for the deal to len() - 1
+                for the end of the episode.
+            game: A game to set up in the position, rather than making one.
+
+        Returns:
+            The game, in the position
+
+        Raises:
+            IndexError: If there is no such step
+            ValueError: If a move replayed is invalid
+        """
+
+        if not 0 <= step < len(self):
+            raise IndexError("Step out of range")
+        if game is None:
+            game = self._engine()
+
+        start = step // self._interval
+        cleared, stock_index, waste = self._snapshots[start].tolist()
+        game.deal_deck(
+            self._deal,
+            cleared=cleared,
+            stock_index=stock_index,
+            waste=waste,
+            foundation=self._foundation[:cleared.bit_count()].tolist(),
+        )
+        for action in self._actions[start * self._interval:step].tolist():
+            game.move_action(action)
+        return game
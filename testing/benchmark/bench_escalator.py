@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark the Escalator Solitaire engines
+
+Times the hot paths of each engine on a fixed set of seeded deals, and
+writes the rates as JSON so that runs can be compared across commits;
+    python3 -m testing.benchmark.bench_escalator --output before.json
+    (change the engine)
+    python3 -m testing.benchmark.bench_escalator --compare before.json
+
+Each figure is the best of several repeats, in calls (or episodes) per
+second, apart from the memory per live game which is in bytes.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tracemalloc
+from random import Random
+from time import perf_counter
+from typing import Callable
+
+from src.agents.policies import random_policy
+from src.games.deals import generate_deals
+from src.games.escalator import (
+    BaseEscalatorGame,
+    BitboardEscalatorGame,
+    EscalatorGame,
+)
+
+
+ENGINES = (EscalatorGame, BitboardEscalatorGame)
+
+
+def best_rate(run: Callable[[], int], repeat: int) -> float:
+    """
+    The best rate of a run over the repeats.
+
+    Args:
+        run: Does the work, returning the number of operations done.
+        repeat: The number of times to run it.
+    """
+
+    best = 0.0
+    for _ in range(repeat):
+        start = perf_counter()
+        count = run()
+        best = max(best, count / (perf_counter() - start))
+    return best
+
+
+def play_random(game: BaseEscalatorGame, seed: int) -> list[int]:
+    """
+    Play random moves to the end of the game.
+
+    Returns:
+        The destinations of the moves
+    """
+
+    rng = Random(seed)
+    destinations = []
+    while not (game.in_winning_state or game.in_losing_state):
+        destination = rng.choice(game.available_moves)[1]
+        game.move(destination)
+        destinations.append(destination)
+    return destinations
+
+
+def bench_engine(
+    engine: type[BaseEscalatorGame], deals: list[list[int]], repeat: int
+) -> dict[str, float]:
+    """
+    Benchmark an engine.
+
+    Args:
+        engine: The engine class.
+        deals: The deals to play.
+        repeat: The number of repeats of each timing.
+
+    Returns:
+        The results by name
+    """
+
+    # A random game from every deal, and positions part way through them.
+    # The positions are games of their own, as the games are dealt again
+    # by the other timings.
+    games = [engine() for _ in deals]
+    lines = []
+    for seed, (game, deal) in enumerate(zip(games, deals)):
+        game.deal_deck(deal)
+        lines.append(play_random(game, seed))
+    positions = []
+    for deal, destinations in zip(deals, lines):
+        position = engine()
+        position.deal_deck(deal)
+        for destination in destinations[:len(destinations) // 2]:
+            position.move(destination)
+        positions.append(position)
+
+    def deal():
+        for game, deal in zip(games, deals):
+            game.deal_deck(deal)
+        return len(deals)
+
+    def update_available_moves():
+        for game in positions:
+            game.update_available_moves()
+        return len(positions)
+
+    def encode():
+        for game in positions:
+            game.encode()
+        return len(positions)
+
+    def display():
+        for game in positions:
+            game.display()
+        return len(positions)
+
+    def move():
+        # Only the moves are timed, the deals are not
+        elapsed = 0.0
+        count = 0
+        for game, deal, destinations in zip(games, deals, lines):
+            game.deal_deck(deal)
+            start = perf_counter()
+            for destination in destinations:
+                game.move(destination)
+            elapsed += perf_counter() - start
+            count += len(destinations)
+        return count / elapsed
+
+    def episodes():
+        for seed, (game, deal) in enumerate(zip(games, deals)):
+            rng = Random(seed)
+            game.deal_deck(deal)
+            while not (game.in_winning_state or game.in_losing_state):
+                game.move_action(random_policy(game, rng))
+        return len(deals)
+
+    results = {
+        name: best_rate(run, repeat)
+        for name, run in (
+            ("deal", deal),
+            ("update_available_moves", update_available_moves),
+            ("encode", encode),
+            ("display", display),
+            ("episodes", episodes),
+        )
+    }
+    results["move"] = max(move() for _ in range(repeat))
+    results["memory_per_game"] = memory_per_game(engine, deals)
+    return results
+
+
+def memory_per_game(
+    engine: type[BaseEscalatorGame], deals: list[list[int]]
+) -> float:
+    """
+    The memory held by a dealt game, in bytes.
+    """
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    games = [engine() for _ in deals]
+    for game, deal in zip(games, deals):
+        game.deal_deck(deal)
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return used / len(games)
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, previous: dict) -> str:
+    """
+    A table of the change in each figure from a previous run.
+    """
+
+    lines = [f"{'':<46} {'previous':>12} {'current':>12} {'change':>8}"]
+    for engine, figures in results["results"].items():
+        for name, value in figures.items():
+            before = previous["results"].get(engine, {}).get(name)
+            if before is None:
+                continue
+            lines.append(
+                f"{engine + '.' + name:<46} {before:>12.1f} {value:>12.1f}"
+                f" {value / before - 1:>+8.1%}"
+            )
+    return "\n".join(lines)
+
+
+def main(args: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument(
+        "--deals", type=int, default=200, help="number of deals to play"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="seed of the deal set"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="repeats of each timing"
+    )
+    parser.add_argument("--output", help="file to write the results to")
+    parser.add_argument("--compare", help="results of a previous run")
+    options = parser.parse_args(args)
+
+    deals = generate_deals(options.deals, options.seed).tolist()
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "deals": options.deals,
+        "seed": options.seed,
+        "repeat": options.repeat,
+        "results": {
+            engine.__name__: bench_engine(engine, deals, options.repeat)
+            for engine in ENGINES
+        },
+    }
+
+    text = json.dumps(results, indent=2)
+    if options.output is None:
+        print(text)
+    else:
+        with open(options.output, "w") as file:
+            file.write(text + "\n")
+
+    if options.compare is not None:
+        with open(options.compare) as file:
+            print(compare(results, json.load(file)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,12 @@
 Testing the base / abstract class for the world
 """
 
+import copy
+import pickle
 import unittest
+
+import numpy as np
+
 from src.games.base import Card, SolitaireGame
 
 
@@ -17,32 +22,30 @@ class TestCard(unittest.TestCase):
         """
         Capture changes in constructor order
         """
-        card = Card(2, 1, True)
+        card = Card(2, 1)
         self.assertEqual(card.rank, 2)
         self.assertEqual(card.suit, 1)
-        self.assertEqual(card.visible, True)
+        self.assertEqual(card.value, 5)
 
-    def test_card_flip(self):
+    def test_cards_are_shared(self):
         """
-        Test that the card is flipped from not visible to visible
+        Test that there is only one of each card
         """
-        card = Card(3, 0)
-        self.assertEqual(card.visible, False)
-        card.flip()
-        self.assertEqual(card.visible, True)
-        card.flip()
-        self.assertEqual(card.visible, True)
+        self.assertIs(Card(3, 0), Card(3, 0))
+        self.assertIs(Card(3, 0), Card.DECK[8])
+        self.assertEqual(len(set(SolitaireGame.create_deck())), 52)
+        self.assertIs(copy.deepcopy(Card(4, 3)), Card(4, 3))
+        self.assertIs(pickle.loads(pickle.dumps(Card(4, 3))), Card(4, 3))
 
-    def test_card_hide(self):
+    def test_cards_cannot_change(self):
         """
-        Test that the card is hidden from visible to not visible
+        Test that the shared cards cannot be changed
         """
-        card = Card(4, 3, True)
-        self.assertEqual(card.visible, True)
-        card.hide()
-        self.assertEqual(card.visible, False)
-        card.hide()
-        self.assertEqual(card.visible, False)
+        card = Card(4, 3)
+        with self.assertRaises(AttributeError):
+            card.rank = 5
+        with self.assertRaises(AttributeError):
+            card.visible = True
 
     def test_valid_card_string_representation(self):
         """
@@ -73,6 +76,20 @@ class TestCard(unittest.TestCase):
         with self.assertRaises(ValueError):
             Card(1, 4)
 
+    def test_parse(self):
+        """
+        Test that cards are read back as written, or with suit letters
+        """
+        for card in Card.DECK:
+            self.assertIs(Card.parse(str(card)), card)
+        self.assertIs(Card.parse("AS"), Card(1, 0))
+        self.assertIs(Card.parse(" xd"), Card(10, 3))
+        self.assertIs(Card.parse("10H"), Card(10, 2))
+        self.assertIs(Card.parse("kc"), Card(13, 1))
+        for text in ("", "A", "1S", "11S", "AX", "ASS"):
+            with self.assertRaises(ValueError):
+                Card.parse(text)
+
 
 class TestSolitaireGame(unittest.TestCase):
     """
@@ -139,6 +156,69 @@ class TestSolitaireGame(unittest.TestCase):
         self.assertFalse(game.in_losing_state)
         self.assertFalse(game.in_winning_state)
 
+    def test_encode_into(self):
+        """
+        Cards in face up piles are flagged in the plane of their pile, while
+        only the number of cards in a face down pile is encoded.
+        """
+        game = SolitaireGame()
+        game._stock = [Card(1, 0), Card(5, 2)]
+        game._waste = [Card(2, 1)]
+        game._tableau = [[Card(13, 3), None], [Card(7, 0)]]
+        encoding = game.encode_array()
+        self.assertEqual(encoding.shape, (SolitaireGame.ENCODING_SIZE,))
+
+        size = SolitaireGame.ENCODED_PILE_SIZE
+        stock, waste, foundation, tableau, reserve = (
+            encoding.reshape(SolitaireGame.ENCODED_PILES, size)
+        )
+        self.assertEqual(stock.sum(), 2)
+        self.assertEqual(stock[-1], 2)
+        self.assertEqual(waste.nonzero()[0].tolist(), [5])
+        self.assertEqual(foundation.sum(), 0)
+        self.assertEqual(tableau.nonzero()[0].tolist(), [24, 51])
+        self.assertEqual(reserve.sum(), 0)
+
+        # The whole buffer is overwritten
+        buffer = np.ones(SolitaireGame.ENCODING_SIZE)
+        game.encode_into(buffer)
+        np.testing.assert_array_equal(buffer, encoding)
+
+    def test_compute_hash(self):
+        """
+        The hash depends on where each card is, but not on the order of the
+        cards in a foundation pile.
+        """
+        game = SolitaireGame()
+        self.assertEqual(game.compute_hash(), 0)
+        self.assertEqual(game.state_hash, 0)
+
+        game._stock = [Card(1, 0), Card(5, 2)]
+        stock_hash = game.compute_hash()
+        game._stock = [Card(5, 2), Card(1, 0)]
+        self.assertNotEqual(game.compute_hash(), stock_hash)
+
+        game._stock = []
+        game._foundation = [[Card(1, 0), Card(5, 2)]]
+        foundation_hash = game.compute_hash()
+        game._foundation = [[Card(5, 2), Card(1, 0)]]
+        self.assertEqual(game.compute_hash(), foundation_hash)
+        game._foundation = [[Card(5, 2)], [Card(1, 0)]]
+        self.assertNotEqual(game.compute_hash(), foundation_hash)
+
+    def test_encode_batch(self):
+        """
+        Games are encoded into the rows of one array.
+        """
+        games = [SolitaireGame(), SolitaireGame()]
+        games[1]._waste = [Card(1, 1)]
+        encodings = SolitaireGame.encode_batch(games)
+        self.assertEqual(
+            encodings.shape, (2, SolitaireGame.ENCODING_SIZE)
+        )
+        np.testing.assert_array_equal(encodings[0], games[0].encode_array())
+        np.testing.assert_array_equal(encodings[1], games[1].encode_array())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+"""
+Test src/training/checkpoints.py
+
+Background checkpoint writing
+"""
+
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from src.agents.escalator import EscalatorAgent
+from src.games.escalator import OBSERVATION_SIZE
+from src.training.checkpoints import (
+    CheckpointWriter,
+    checkpoint_paths,
+    load_checkpoint,
+)
+
+
+class TestCheckpointWriter(unittest.TestCase):
+    """
+    Test writing checkpoints in the background
+    """
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.root = Path(self._directory.name, "checkpoints")
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_keeps_newest(self):
+        """
+        Test that only the newest checkpoints are kept, whole, with no
+        temporary files left behind.
+        """
+
+        with CheckpointWriter(self.root, keep=2) as writer:
+            for iteration in range(1, 6):
+                writer.submit(iteration, {"weights": np.full(4, iteration)})
+                writer.flush()
+        self.assertEqual(writer.written, 5)
+        self.assertEqual(writer.dropped, 0)
+
+        paths = checkpoint_paths(self.root)
+        self.assertEqual(paths, [writer.path(4), writer.path(5)])
+        self.assertEqual(sorted(self.root.iterdir()), paths)
+        self.assertTrue(np.array_equal(
+            load_checkpoint(paths[-1])["weights"], np.full(4, 5)
+        ))
+
+    def test_coalesces(self):
+        """
+        Test that snapshots waiting to be written are replaced by newer
+        ones, and the newest is always written.
+        """
+
+        with CheckpointWriter(self.root, keep=100) as writer:
+            for iteration in range(1, 201):
+                writer.submit(iteration, {"weights": np.zeros(10_000)})
+        self.assertEqual(writer.written + writer.dropped, 200)
+        self.assertEqual(checkpoint_paths(self.root)[-1], writer.path(200))
+
+    def test_errors_raised(self):
+        """
+        Test that a failed write is raised to the trainer.
+        """
+
+        writer = CheckpointWriter(self.root)
+        shutil.rmtree(self.root)
+        writer.submit(1, {"weights": np.zeros(4)})
+        with self.assertRaises(OSError):
+            writer.flush()
+        writer.close()
+        with self.assertRaises(ValueError):
+            writer.submit(2, {"weights": np.zeros(4)})
+
+    def test_failed_write_removed(self):
+        """
+        Test that a checkpoint failing part way through is not left behind,
+        and later checkpoints are still written.
+        """
+
+        class Unwritable:
+            def __array__(self, *args, **kwargs):
+                raise RuntimeError("Cannot be written")
+
+        with CheckpointWriter(self.root) as writer:
+            writer.submit(1, {"weights": np.zeros(4), "bad": Unwritable()})
+            with self.assertRaises(RuntimeError):
+                writer.flush()
+            self.assertEqual(list(self.root.iterdir()), [])
+            writer.submit(2, {"weights": np.zeros(4)})
+        self.assertEqual(list(self.root.iterdir()), [writer.path(2)])
+
+
+class TestEscalatorAgentCheckpoints(unittest.TestCase):
+    """
+    Test saving and loading the agent
+    """
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.root = Path(self._directory.name, "escalator_agent")
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_save_and_load(self):
+        """
+        Test that the agent saves as it learns, and loads the newest save.
+        """
+
+        state = np.zeros(OBSERVATION_SIZE, dtype=np.int8)
+        with EscalatorAgent(
+            save_itr_count=2, history_capacity=64, batch_size=4,
+            keep_checkpoints=2, save_path=self.root,
+        ) as agent:
+            for game in range(7):
+                for step in range(3):
+                    agent.observe(
+                        state + step, step, -1, state + step + 1, step == 2
+                    )
+        # Earlier saves may have been dropped for later ones
+        paths = checkpoint_paths(self.root)
+        self.assertLessEqual(len(paths), 2)
+        self.assertEqual(paths[-1].name, "checkpoint-0000000006.npz")
+
+        loaded = EscalatorAgent(
+            save_itr_count=2, history_capacity=64, save_path=self.root
+        )
+        self.assertTrue(loaded.load_model())
+        saved = load_checkpoint(checkpoint_paths(self.root)[-1])
+        for name, array in loaded.state_dict().items():
+            self.assertTrue(np.array_equal(array, saved[name]))
+        self.assertEqual(int(saved["iteration"]), 6)
+
+        empty = EscalatorAgent(
+            save_itr_count=2, save_path=Path(self._directory.name, "none")
+        )
+        self.assertFalse(empty.load_model())
+        # Nothing is written until the first save
+        self.assertFalse(Path(self._directory.name, "none").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+"""
+Test src/games/deals.py
+
+Deals of a 52 card deck
+"""
+
+import random
+import unittest
+
+import numpy as np
+
+from src.games.deals import (
+    DECK_SIZE,
+    NUM_DEALS,
+    deal_from_index,
+    deal_to_index,
+    generate_deals,
+)
+from src.games.escalator import BitboardEscalatorGame, EscalatorGame
+
+
+class TestDeals(unittest.TestCase):
+    """
+    Test numbering and generating deals
+    """
+
+    def test_deal_index(self):
+        """
+        Test that deals and their indices convert back and forth.
+        """
+
+        self.assertEqual(deal_from_index(0), list(range(DECK_SIZE)))
+        self.assertEqual(
+            deal_from_index(NUM_DEALS - 1), list(range(DECK_SIZE))[::-1]
+        )
+        self.assertEqual(deal_from_index(1)[-2:], [51, 50])
+
+        chooser = random.Random(0)
+        for _ in range(50):
+            index = chooser.randrange(NUM_DEALS)
+            deal = deal_from_index(index)
+            self.assertEqual(sorted(deal), list(range(DECK_SIZE)))
+            self.assertEqual(deal_to_index(deal), index)
+
+        with self.assertRaises(ValueError):
+            deal_from_index(NUM_DEALS)
+        with self.assertRaises(ValueError):
+            deal_from_index(-1)
+        with self.assertRaises(ValueError):
+            deal_to_index([0] * DECK_SIZE)
+
+    def test_generate_deals(self):
+        """
+        Test that generated deals are permutations, and are the same for
+        the same seed.
+        """
+
+        deals = generate_deals(100, seed=0)
+        self.assertEqual(deals.shape, (100, DECK_SIZE))
+        self.assertTrue(np.all(
+            np.sort(deals, axis=1) == np.arange(DECK_SIZE)
+        ))
+        self.assertTrue(np.array_equal(deals, generate_deals(100, seed=0)))
+        self.assertFalse(np.array_equal(deals, generate_deals(100, seed=1)))
+        self.assertEqual(len(np.unique(deals, axis=0)), 100)
+
+    def test_seeded_games(self):
+        """
+        Test that games with the same seed are dealt the same, whatever the
+        engine and the global random state.
+        """
+
+        game = EscalatorGame(seed=5)
+        random.seed(1)
+        game.deal()
+        bitboard = BitboardEscalatorGame(seed=5)
+        random.seed(2)
+        bitboard.deal()
+        self.assertEqual(game.state_hash, bitboard.state_hash)
+        self.assertEqual(
+            list(bitboard.deck),
+            [card.value for row in game.tableau for card in row]
+            + [card.value for card in game.stock],
+        )
+
+        other = EscalatorGame(seed=6)
+        other.deal()
+        self.assertNotEqual(game.state_hash, other.state_hash)
+
+    def test_deal_from_index(self):
+        """
+        Test that both engines deal the numbered deal.
+        """
+
+        index = deal_to_index(generate_deals(1, seed=3)[0].tolist())
+        game = EscalatorGame()
+        game.deal_from_index(index)
+        bitboard = BitboardEscalatorGame()
+        bitboard.deal_from_index(index)
+        self.assertEqual(list(bitboard.deck), deal_from_index(index))
+        self.assertEqual(game.state_hash, bitboard.state_hash)
+        self.assertEqual(game.available_moves, bitboard.available_moves)
+
+        # Dealing again replaces the game
+        game.move(game.available_moves[0][1])
+        game.deal_from_index(index)
+        self.assertEqual(game.state_hash, bitboard.state_hash)
+        self.assertEqual(len(game.stock), DECK_SIZE - 28)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+"""
+Test src/training/episodes.py
+
+On-disk episode store for Escalator Solitaire
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.agents.policies import random_policy
+from src.training.episodes import EpisodeReader, EpisodeWriter
+from src.training.rollout import play_episode
+
+
+class TestEpisodeStore(unittest.TestCase):
+    """
+    Test writing and reading episodes
+    """
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.root = Path(self._directory.name, "episodes")
+        self.trajectories = [
+            play_episode(random_policy, seed) for seed in range(40)
+        ]
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_round_trip(self):
+        """
+        Test that the episodes read back as written, across shards and
+        writers.
+        """
+
+        with EpisodeWriter(self.root, shard_moves=100) as writer:
+            writer.write_all(self.trajectories[:25])
+        with EpisodeWriter(self.root) as writer:
+            writer.write_all(self.trajectories[25:])
+
+        reader = EpisodeReader(self.root)
+        self.assertEqual(len(reader), 40)
+        self.assertEqual(list(reader), self.trajectories)
+        self.assertEqual(
+            reader.num_moves,
+            sum(len(trajectory.actions) for trajectory in self.trajectories),
+        )
+        self.assertEqual(reader.episode(31), self.trajectories[31])
+        with self.assertRaises(IndexError):
+            reader.episode(40)
+
+    def test_concurrent_writers(self):
+        """
+        Test that writers opened together each claim shards of their own,
+        which are read in order of their numbers.
+        """
+
+        first = EpisodeWriter(self.root, shard_moves=100)
+        second = EpisodeWriter(self.root, shard_moves=100)
+        for trajectory in self.trajectories[:20]:
+            first.write(trajectory)
+            second.write(trajectory)
+        first.close()
+        second.close()
+
+        reader = EpisodeReader(self.root)
+        self.assertEqual(len(reader), 40)
+        self.assertEqual(
+            sorted(reader, key=lambda trajectory: trajectory.seed),
+            sorted(
+                self.trajectories[:20] * 2,
+                key=lambda trajectory: trajectory.seed,
+            ),
+        )
+
+        # Past five digits, shards still read in order
+        (self.root / "shard-100000").mkdir()
+        (self.root / "shard-100000" / "index.bin").touch()
+        with EpisodeWriter(self.root) as writer:
+            writer.write(self.trajectories[20])
+        self.assertTrue((self.root / "shard-100001").is_dir())
+        self.assertEqual(
+            list(EpisodeReader(self.root))[-1], self.trajectories[20]
+        )
+
+    def test_batches(self):
+        """
+        Test that the batches hold every episode, with its moves.
+        """
+
+        with EpisodeWriter(self.root, shard_moves=300) as writer:
+            writer.write_all(self.trajectories)
+
+        seen = 0
+        for batch in EpisodeReader(self.root).batches(7):
+            self.assertLessEqual(len(batch.seeds), 7)
+            for i, seed in enumerate(batch.seeds):
+                trajectory = self.trajectories[seed]
+                moves = slice(batch.offsets[i], batch.offsets[i + 1])
+                self.assertEqual(
+                    tuple(batch.deals[i].tolist()), trajectory.deal
+                )
+                self.assertEqual(batch.won[i], trajectory.won)
+                self.assertEqual(
+                    tuple(batch.actions[moves].tolist()), trajectory.actions
+                )
+                self.assertEqual(
+                    tuple(batch.rewards[moves].tolist()), trajectory.rewards
+                )
+                self.assertEqual(seed, seen)
+                seen += 1
+        self.assertEqual(seen, 40)
+
+    def test_unflushed_episodes(self):
+        """
+        Test that readers only see episodes once flushed, and pick them up
+        when refreshed.
+        """
+
+        writer = EpisodeWriter(self.root)
+        writer.write_all(self.trajectories[:10])
+        reader = EpisodeReader(self.root)
+        self.assertEqual(len(reader), 0)
+
+        writer.flush()
+        writer.write(self.trajectories[10])
+        reader.refresh()
+        self.assertEqual(list(reader), self.trajectories[:10])
+
+        writer.close()
+        reader.refresh()
+        self.assertEqual(len(reader), 11)
+        with self.assertRaises(ValueError):
+            writer.write(self.trajectories[11])
+
+    def test_compact(self):
+        """
+        Test that a move takes three bytes, besides its episode's record.
+        """
+
+        with EpisodeWriter(self.root) as writer:
+            writer.write_all(self.trajectories)
+        moves = EpisodeReader(self.root).num_moves
+        shard = next(self.root.iterdir())
+        self.assertEqual(
+            (shard / "actions.bin").stat().st_size
+            + (shard / "rewards.bin").stat().st_size,
+            3 * moves,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
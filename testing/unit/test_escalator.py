@@ -6,9 +6,40 @@ Test src/games/escalator.py
 Escalator Solitaire game
 """
 
+import random
 import unittest
+
+import numpy as np
+
+from src.agents.policies import legal_actions
 from src.games.base import Card
-from src.games.escalator import EscalatorGame
+from src.games.escalator import (
+    ACTION_DESTINATIONS,
+    ALL_RANKS,
+    PYRAMID_SIZE,
+    DECK_SIZE,
+    FULL_PYRAMID_MASK,
+    NUM_ACTIONS,
+    BitboardEscalatorGame,
+    EscalatorGame,
+    find_dead_end,
+)
+from src.solvers.escalator import EscalatorSolver
+
+
+def dead_end_args(game: BitboardEscalatorGame) -> tuple:
+    """
+    The arguments to find_dead_end() for the whole game, from scratch.
+    """
+
+    rank_masks = [0] * 14
+    for slot, card in enumerate(game.deck[:PYRAMID_SIZE]):
+        rank_masks[card // 4 + 1] |= 1 << slot
+    spare_ranks = 1 << game.waste_rank
+    for card in game.deck[PYRAMID_SIZE:game.stock_index + 1]:
+        spare_ranks |= 1 << card // 4 + 1
+    remaining = FULL_PYRAMID_MASK & ~game.cleared_mask
+    return rank_masks, remaining, spare_ranks, ALL_RANKS
 
 
 class TestEscalator(unittest.TestCase):
@@ -40,9 +71,8 @@ class TestEscalator(unittest.TestCase):
 
         game = EscalatorGame()
         game.deal()
-        for pile in game.tableau:
-            for card in pile:
-                self.assertEqual(card.visible, True)
+        self.assertTrue(game.TABLEAU_VISIBLE)
+        self.assertNotIn("?", game.display().split("\n", 1)[1])
 
     def test_deal_no_repeating_cards(self):
         """
@@ -71,7 +101,7 @@ class TestEscalator(unittest.TestCase):
         curr_suit = 0
         for _ in range(28):
             flat_tableau.append(
-                Card(rank=curr_rank, suit=curr_suit, visible=True)
+                Card(rank=curr_rank, suit=curr_suit)
             )
             curr_suit += 1
             if curr_suit == 4:
@@ -96,3 +126,388 @@ class TestEscalator(unittest.TestCase):
         self.assertEqual(len(encoded_state), 52)
         for card in encoded_state:
             self.assertEqual(len(card), 2)
+
+    def test_incremental_moves_match_rescan(self):
+        """
+        Test that the moves kept up to date by move() match a full rescan
+        of the tableau.
+        """
+
+        chooser = random.Random(0)
+        for _ in range(20):
+            game = EscalatorGame()
+            game.deal()
+            while not (game.in_winning_state or game.in_losing_state):
+                game.move(chooser.choice(game.available_moves)[1])
+                moves = list(game.available_moves)
+                game.update_available_moves()
+                self.assertEqual(moves, game.available_moves)
+
+    def test_legal_action_mask(self):
+        """
+        Test that the legal action mask agrees with the available moves.
+        """
+
+        chooser = random.Random(1)
+        for engine in (EscalatorGame, BitboardEscalatorGame):
+            for _ in range(10):
+                game = engine()
+                game.deal()
+                while not (game.in_winning_state or game.in_losing_state):
+                    mask = game.legal_action_mask()
+                    self.assertEqual(mask.shape, (NUM_ACTIONS,))
+                    self.assertEqual(
+                        [
+                            (0, ACTION_DESTINATIONS[action])
+                            for action in range(NUM_ACTIONS)
+                            if mask[action]
+                        ],
+                        game.available_moves,
+                    )
+                    actions = [i for i in range(NUM_ACTIONS) if mask[i]]
+                    game.move_action(chooser.choice(actions))
+
+    def test_undo_restores_game(self):
+        """
+        Test that undoing recorded moves restores every earlier state, on
+        both engines.
+        """
+
+        def snapshot(game):
+            return (
+                game.display(),
+                list(game.available_moves),
+                game.legal_actions,
+                game.encode(),
+                game.in_losing_state,
+            )
+
+        chooser = random.Random(4)
+        for game in (EscalatorGame(), BitboardEscalatorGame()):
+            game.deal()
+            history = []
+            while not (game.in_winning_state or game.in_losing_state):
+                history.append(snapshot(game))
+                game.move(chooser.choice(game.available_moves)[1], True)
+
+            while len(history) != 0:
+                game.undo()
+                self.assertEqual(snapshot(game), history.pop())
+            with self.assertRaises(ValueError):
+                game.undo()
+
+    def test_unrecorded_moves_not_undone(self):
+        """
+        Test that only recorded moves are undone.
+        """
+
+        for game in (EscalatorGame(), BitboardEscalatorGame()):
+            game.deal()
+            game.move(0)
+            with self.assertRaises(ValueError):
+                game.undo()
+
+    def test_state_hash(self):
+        """
+        Test that the state hash is kept up to date by moves and undo, and
+        agrees between the engines.
+        """
+
+        chooser = random.Random(6)
+        for seed in range(10):
+            game = EscalatorGame(seed)
+            game.deal()
+            bitboard = BitboardEscalatorGame(seed)
+            bitboard.deal()
+
+            hashes = []
+            while not (game.in_winning_state or game.in_losing_state):
+                self.assertEqual(game.state_hash, game.compute_hash())
+                self.assertEqual(game.state_hash, bitboard.state_hash)
+                hashes.append(game.state_hash)
+                destination = chooser.choice(game.available_moves)[1]
+                game.move(destination, record=True)
+                bitboard.move(destination, record=True)
+            self.assertEqual(game.state_hash, game.compute_hash())
+            self.assertEqual(len(hashes), len(set(hashes)))
+
+            while len(hashes) != 0:
+                game.undo()
+                bitboard.undo()
+                self.assertEqual(game.state_hash, hashes[-1])
+                self.assertEqual(bitboard.state_hash, hashes.pop())
+
+    def test_rank_key(self):
+        """
+        Test that the rank key and rank only encoding are the same for
+        deals that only differ by suits, and agree between the engines.
+        """
+
+        chooser = random.Random(7)
+        for seed in range(10):
+            deck = list(range(DECK_SIZE))
+            random.Random(seed).shuffle(deck)
+            suits = [1, 3, 0, 2]
+            games = []
+            for cards in (deck, [c - c % 4 + suits[c % 4] for c in deck]):
+                games.append(EscalatorGame())
+                games[-1].deal(
+                    stock=[Card.DECK[card] for card in cards[28:]],
+                    waste=[],
+                    tableau=[
+                        [Card.DECK[card] for card in cards[start:stop]]
+                        for start, stop in zip(
+                            (0, 1, 3, 6, 10, 15, 21),
+                            (1, 3, 6, 10, 15, 21, 28),
+                        )
+                    ],
+                    foundation=[],
+                    reserve=[],
+                )
+                games.append(BitboardEscalatorGame())
+                games[-1].deal_deck(cards)
+
+            while not (games[0].in_winning_state or games[0].in_losing_state):
+                self.assertEqual(len({game.rank_key for game in games}), 1)
+
+                # The bitboard does not track the foundation
+                size = EscalatorGame.RANK_ENCODED_PILE_SIZE
+                encoding = games[0].encode_array(rank_only=True)
+                encoding[2 * size:3 * size] = 0
+                for game in games[1:]:
+                    other = game.encode_array(rank_only=True)
+                    other[2 * size:3 * size] = 0
+                    np.testing.assert_array_equal(other, encoding)
+                self.assertNotEqual(games[0].state_hash, games[2].state_hash)
+
+                destination = chooser.choice(games[0].available_moves)[1]
+                for game in games:
+                    game.move(destination)
+
+        # A different rank gives a different key
+        key = games[0].rank_key
+        games[0].waste[0] = Card(games[0].waste[0].rank % 13 + 1, 0)
+        self.assertNotEqual(games[0].rank_key, key)
+
+    def test_invalid_action(self):
+        """
+        Test that illegal and out of range actions are rejected.
+        """
+
+        game = EscalatorGame()
+        game.deal()
+        with self.assertRaises(ValueError):
+            game.move_action(1)
+        with self.assertRaises(ValueError):
+            game.move_action(NUM_ACTIONS)
+        with self.assertRaises(ValueError):
+            game.move(12)
+
+    def test_cached_until_changed(self):
+        """
+        Test that the moves and legal mask are kept until the state changes,
+        and are then up to date.
+        """
+
+        for engine in (EscalatorGame, BitboardEscalatorGame):
+            game = engine(seed=2)
+            game.deal()
+            version = game.version
+            moves = game.available_moves
+            mask = game.legal_action_mask().copy()
+            self.assertIs(game.available_moves, moves)
+            self.assertEqual(game.version, version)
+
+            game.move(moves[-1][1], record=True)
+            self.assertGreater(game.version, version)
+            self.assertIsNot(game.available_moves, moves)
+            game.undo()
+            self.assertEqual(game.available_moves, moves)
+            np.testing.assert_array_equal(game.legal_action_mask(), mask)
+
+            # Moves made without ever being listed are still checked
+            while not (game.in_winning_state or game.in_losing_state):
+                game.move_action(legal_actions(game)[-1])
+            self.assertTrue(game.in_losing_state)
+            self.assertEqual(game.available_moves, [])
+            with self.assertRaises(ValueError):
+                game.move(0)
+
+    def test_dead_ends(self):
+        """
+        Test that dead ends are only found in games that cannot be won, are
+        kept up to date through moves and undo, and agree between engines.
+        """
+
+        solver = EscalatorSolver()
+        chooser = random.Random(8)
+        found = 0
+        for seed in range(20):
+            game = EscalatorGame(seed, detect_dead_ends=True)
+            game.deal()
+            bitboard = BitboardEscalatorGame(seed)
+            bitboard.deal()
+
+            was_dead_end = False
+            moves = 0
+            while not (game.in_winning_state or game.in_losing_state):
+                moves += 1
+                destination = chooser.choice(game.available_moves)[1]
+                game.move(destination, record=True)
+                bitboard.move(destination, record=True)
+                dead_end = find_dead_end(*dead_end_args(bitboard))
+                self.assertEqual(game.in_dead_end_state, dead_end)
+                self.assertEqual(bitboard.in_dead_end_state, dead_end)
+                if dead_end and not was_dead_end:
+                    # The move into a dead end is reported as a loss
+                    found += 1
+                    self.assertFalse(solver.is_winnable(bitboard))
+                    self.assertTrue(game.in_losing_state)
+                    self.assertEqual(
+                        bitboard.in_losing_state, bitboard.legal_actions == 0
+                    )
+                was_dead_end = dead_end
+
+            for _ in range(moves):
+                game.undo()
+                bitboard.undo()
+                dead_end = find_dead_end(*dead_end_args(bitboard))
+                self.assertEqual(game.in_dead_end_state, dead_end)
+                self.assertEqual(bitboard.in_dead_end_state, dead_end)
+        self.assertGreater(found, 0)
+
+
+class TestBitboardEscalator(unittest.TestCase):
+    """
+    Test the bitboard Escalator engine against EscalatorGame
+    """
+
+    def assert_same_game(self, game, bitboard):
+        self.assertEqual(game.available_moves, bitboard.available_moves)
+        self.assertEqual(game.display(), bitboard.display())
+        self.assertEqual(game.in_winning_state, bitboard.in_winning_state)
+        self.assertEqual(game.in_losing_state, bitboard.in_losing_state)
+        np.testing.assert_array_equal(
+            game.observation(), bitboard.observation()
+        )
+
+    def play_out(self, game, bitboard, seed):
+        """
+        Play random moves on both engines until the game ends.
+        """
+
+        chooser = random.Random(seed)
+        while not (game.in_winning_state or game.in_losing_state):
+            self.assert_same_game(game, bitboard)
+            destination = chooser.choice(game.available_moves)[1]
+            self.assertEqual(
+                game.move(destination), bitboard.move(destination)
+            )
+        self.assert_same_game(game, bitboard)
+
+    def test_same_shuffle_same_game(self):
+        """
+        Test that the same shuffle deals and plays the same game.
+        """
+
+        for seed in range(20):
+            game = EscalatorGame(seed)
+            game.deal()
+            bitboard = BitboardEscalatorGame(seed)
+            bitboard.deal()
+            self.play_out(game, bitboard, seed)
+
+    def test_seeded_deals(self):
+        """
+        Test that each deal() deals the next shuffle of the seed, whatever
+        is dealt by deal_deck() in between.
+        """
+
+        chooser = random.Random(3)
+        expected = []
+        for _ in range(2):
+            deck = list(range(DECK_SIZE))
+            chooser.shuffle(deck)
+            expected.append(deck)
+
+        for engine in (EscalatorGame, BitboardEscalatorGame):
+            game = engine(seed=3)
+            game.deal_deck(list(range(DECK_SIZE)))
+            for deck in expected:
+                game.deal()
+                other = engine()
+                other.deal_deck(deck)
+                self.assertEqual(game.display(), other.display())
+                self.assertEqual(game.state_hash, other.state_hash)
+
+    def test_deal_from_piles(self):
+        """
+        Test that a part played game can be given as piles.
+        """
+
+        game = EscalatorGame(0)
+        game.deal()
+        for _ in range(6):
+            game.move(game.available_moves[-1][1])
+
+        bitboard = BitboardEscalatorGame()
+        bitboard.deal(
+            stock=game.stock,
+            waste=game.waste,
+            tableau=game.tableau,
+            foundation=game.foundation,
+            reserve=game.reserve,
+        )
+        self.play_out(game, bitboard, 0)
+
+    def test_encode_into(self):
+        """
+        Test that both engines encode the same, apart from the foundation
+        which the bitboard does not track.
+        """
+
+        chooser = random.Random(3)
+        game = EscalatorGame(3)
+        game.deal()
+        bitboard = BitboardEscalatorGame(3)
+        bitboard.deal()
+
+        size = EscalatorGame.ENCODED_PILE_SIZE
+        while not (game.in_winning_state or game.in_losing_state):
+            expected = game.encode_array()
+            expected[2 * size:3 * size] = 0
+            np.testing.assert_array_equal(bitboard.encode_array(), expected)
+            destination = chooser.choice(game.available_moves)[1]
+            game.move(destination)
+            bitboard.move(destination)
+
+    def test_cleared_pyramid_wins(self):
+        """
+        Test that clearing the last slot wins, even with stock remaining.
+        """
+
+        bitboard = BitboardEscalatorGame()
+        # The last 6 left in the bottom row, a 7 on the waste
+        bitboard.deal_deck(
+            list(range(DECK_SIZE)),
+            cleared=FULL_PYRAMID_MASK & ~(1 << 21),
+            waste=24,
+        )
+        self.assertEqual(bitboard.available_moves, [(0, 0), (0, 71)])
+        self.assertEqual(bitboard.move(71), 101)
+        self.assertTrue(bitboard.in_winning_state)
+        self.assertFalse(bitboard.in_losing_state)
+
+    def test_invalid_moves(self):
+        """
+        Test that unavailable moves are rejected.
+        """
+
+        bitboard = BitboardEscalatorGame()
+        bitboard.deal_deck(list(range(DECK_SIZE)), stock_index=27)
+        with self.assertRaises(ValueError):
+            bitboard.move(0)
+        with self.assertRaises(ValueError):
+            bitboard.move(11)
+        with self.assertRaises(ValueError):
+            bitboard.move(99)
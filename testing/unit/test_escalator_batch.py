@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+"""
+Test src/games/escalator_batch.py
+
+Batched Escalator Solitaire
+"""
+
+import unittest
+
+import numpy as np
+
+from src.games.escalator import NUM_ACTIONS, BitboardEscalatorGame
+from src.games.escalator_batch import BatchEscalatorEnv
+
+
+class TestBatchEscalatorEnv(unittest.TestCase):
+    """
+    Test the batched games against the bitboard engine
+    """
+
+    def test_steps_match_bitboard(self):
+        """
+        Test that every game in the batch plays as the bitboard engine.
+        """
+
+        env = BatchEscalatorEnv(64, seed=0)
+        observation, legal = env.reset()
+        self.assertEqual(legal.shape, (64, NUM_ACTIONS))
+        games = []
+        for deck in env.decks:
+            games.append(BitboardEscalatorGame())
+            games[-1].deal_deck(deck.tolist())
+
+        chooser = np.random.default_rng(1)
+        finished = 0
+        for _ in range(200):
+            actions = np.zeros(len(games), dtype=np.int64)
+            for i, game in enumerate(games):
+                np.testing.assert_array_equal(
+                    legal[i], game.legal_action_mask()
+                )
+                np.testing.assert_array_equal(
+                    observation[i], game.observation()
+                )
+                actions[i] = chooser.choice(np.flatnonzero(legal[i]))
+
+            observation, rewards, done, legal = env.step(actions)
+            for i, game in enumerate(games):
+                reward = game.move_action(int(actions[i]))
+                self.assertEqual(rewards[i], reward)
+                self.assertEqual(
+                    done[i], game.in_winning_state or game.in_losing_state
+                )
+                if done[i]:
+                    finished += 1
+                    game.deal_deck(env.decks[i].tolist())
+        self.assertGreater(finished, 0)
+
+    def test_observation(self):
+        """
+        Test the observation of a fresh deal, and after clearing a slot.
+        """
+
+        env = BatchEscalatorEnv(4, seed=2)
+        observation, legal = env.reset()
+        np.testing.assert_array_equal(observation[:, :28], env.decks[:, :28])
+        np.testing.assert_array_equal(observation[:, 28], -1)
+        np.testing.assert_array_equal(observation[:, 29], 24)
+        self.assertTrue(legal[:, 0].all())
+        self.assertFalse(legal[:, 1:].any())
+
+        observation, _, _, legal = env.step(np.zeros(4, dtype=np.int64))
+        np.testing.assert_array_equal(observation[:, 28], env.decks[:, 51])
+        np.testing.assert_array_equal(observation[:, 29], 23)
+
+    def test_invalid_action(self):
+        """
+        Test that a covered slot cannot be cleared.
+        """
+
+        env = BatchEscalatorEnv(2, seed=3)
+        env.reset()
+        env.step(np.zeros(2, dtype=np.int64))
+        with self.assertRaises(ValueError):
+            env.step(np.array([0, 1]))
+
+    def test_action_out_of_range(self):
+        """
+        Test that actions outside of the action space are rejected, rather
+        than wrapping around, and leave the games as they were.
+        """
+
+        env = BatchEscalatorEnv(2, seed=3)
+        observation = env.reset()[0].copy()
+        for actions in ([0, -1], [0, 29], [0], [0, 0, 0]):
+            with self.assertRaises(ValueError):
+                env.step(np.array(actions))
+        next_observation = env.step(np.zeros(2, dtype=np.int64))[0]
+        np.testing.assert_array_equal(
+            next_observation[:, 29], observation[:, 29] - 1
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
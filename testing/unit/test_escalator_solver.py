@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+"""
+Test src/solvers/escalator.py
+
+Solver for Escalator Solitaire
+"""
+
+import unittest
+
+from src.games.escalator import (
+    DECK_SIZE,
+    FULL_PYRAMID_MASK,
+    PYRAMID_SIZE,
+    BitboardEscalatorGame,
+    EscalatorGame,
+)
+from src.solvers.escalator import EscalatorSolver
+
+
+def shortest_win(game):
+    """
+    Breadth first search for the length of the shortest win.
+    """
+
+    frontier = [(game.cleared_mask, game.stock_index, game.waste)]
+    seen = set()
+    for length in range(DECK_SIZE):
+        next_frontier = []
+        for cleared, stock_index, waste in frontier:
+            if cleared == FULL_PYRAMID_MASK:
+                return length
+            position = BitboardEscalatorGame()
+            position.deal_deck(
+                game.deck,
+                cleared,
+                stock_index,
+                waste[0].value if len(waste) != 0 else -1,
+            )
+            for _, destination in position.available_moves:
+                position.move(destination, record=True)
+                key = (
+                    position.cleared_mask,
+                    position.stock_index,
+                    position.waste_rank,
+                )
+                if key not in seen:
+                    seen.add(key)
+                    next_frontier.append(
+                        (key[0], key[1], position.waste)
+                    )
+                position.undo()
+        frontier = next_frontier
+    return None
+
+
+class TestEscalatorSolver(unittest.TestCase):
+    """
+    Test the Escalator solver
+    """
+
+    def test_solutions_win(self):
+        """
+        Test that the solutions found win the game, and that both engines
+        are solved the same.
+        """
+
+        solver = EscalatorSolver()
+        wins = 0
+        for seed in range(40):
+            game = EscalatorGame(seed)
+            game.deal()
+            bitboard = BitboardEscalatorGame(seed)
+            bitboard.deal()
+
+            solution = solver.solve(game)
+            self.assertEqual(solution, solver.solve(bitboard))
+            self.assertEqual(
+                solution is not None, solver.is_winnable(bitboard)
+            )
+            if solution is None:
+                continue
+
+            wins += 1
+            for destination in solution:
+                game.move(destination)
+            self.assertTrue(game.in_winning_state)
+        self.assertGreater(wins, 0)
+
+    def test_solutions_are_shortest(self):
+        """
+        Test the solutions against a breadth first search, from part way
+        into winnable games where the search is small enough.
+        """
+
+        solver = EscalatorSolver()
+        checked = 0
+        for seed in range(40):
+            game = BitboardEscalatorGame(seed)
+            game.deal()
+            solution = solver.solve(game)
+            if solution is None:
+                continue
+
+            # Stop when 10 slots are left, flipping the stock one more time
+            # to leave a longer way round
+            for destination in solution:
+                if game.cleared_mask.bit_count() == 18:
+                    break
+                game.move(destination)
+            if game.stock_index >= 28:
+                game.move(0)
+
+            checked += 1
+            solution = solver.solve(game)
+            expected = shortest_win(game)
+            if expected is None:
+                self.assertIsNone(solution)
+            else:
+                self.assertEqual(len(solution), expected)
+        self.assertGreater(checked, 0)
+
+    def test_full_deals_are_shortest(self):
+        """
+        Test the solutions of whole deals against a breadth first search,
+        for deals where the first win found flips more than it needs to.
+        """
+
+        solver = EscalatorSolver()
+        for seed in (58, 65):
+            game = BitboardEscalatorGame(seed)
+            game.deal()
+            solution = solver.solve(game)
+            # Every win clears the whole pyramid, the rest are flips
+            self.assertEqual(
+                solution.count(0), shortest_win(game) - PYRAMID_SIZE
+            )
+
+    def test_pruning_dead_ends(self):
+        """
+        Test that pruning dead ends finds the same solutions, searching
+        fewer positions.
+        """
+
+        solver = EscalatorSolver()
+        pruning = EscalatorSolver(prune_dead_ends=True)
+        nodes = pruned_nodes = 0
+        for seed in range(4):
+            game = BitboardEscalatorGame(seed)
+            game.deal()
+            self.assertEqual(solver.solve(game), pruning.solve(game))
+            nodes += solver.nodes
+            pruned_nodes += pruning.nodes
+        self.assertLess(pruned_nodes, nodes)
+
+    def test_won_game(self):
+        """
+        Test that a won game needs no moves.
+        """
+
+        game = BitboardEscalatorGame()
+        game.deal_deck(list(range(DECK_SIZE)), cleared=FULL_PYRAMID_MASK)
+        self.assertEqual(EscalatorSolver().solve(game), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
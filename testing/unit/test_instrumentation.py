@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+"""
+Test src/instrumentation.py
+
+Opt-in instrumentation of the hot paths
+"""
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from src import instrumentation
+from src.games.escalator import BitboardEscalatorGame, EscalatorGame
+
+
+class TestInstrumentation(unittest.TestCase):
+    """
+    Test timing the marked methods
+    """
+
+    def play(self, game: EscalatorGame) -> int:
+        game.deal()
+        moves = 0
+        while not (game.in_winning_state or game.in_losing_state):
+            game.move(game.available_moves[0][1])
+            moves += 1
+        game.encode()
+        return moves
+
+    def test_disabled_untouched(self):
+        """
+        Test that the methods are left as they are while disabled.
+        """
+
+        self.assertFalse(instrumentation.is_enabled())
+        move = EscalatorGame.move
+        with instrumentation.profiling():
+            self.assertIsNot(EscalatorGame.move, move)
+            self.assertEqual(EscalatorGame.move.__name__, "move")
+        self.assertIs(EscalatorGame.move, move)
+        self.assertFalse(instrumentation.is_enabled())
+
+        instrumentation.reset()
+        self.play(EscalatorGame(seed=0))
+        self.assertEqual(instrumentation.stats(), {})
+
+    def test_counts_calls(self):
+        """
+        Test that calls are counted by the class they are made on.
+        """
+
+        with instrumentation.profiling():
+            moves = self.play(EscalatorGame(seed=0))
+            bitboard_moves = self.play(BitboardEscalatorGame(seed=1))
+
+        stats = instrumentation.stats()
+        self.assertEqual(stats["EscalatorGame.move"]["calls"], moves)
+        self.assertEqual(
+            stats["BitboardEscalatorGame.move"]["calls"], bitboard_moves
+        )
+        self.assertEqual(stats["EscalatorGame.deal"]["calls"], 1)
+        self.assertEqual(stats["SolitaireGame.encode"]["calls"], 2)
+        self.assertGreater(stats["EscalatorGame.move"]["seconds"], 0)
+
+        report = json.loads(instrumentation.report("json"))
+        self.assertEqual(report["stats"], stats)
+        table = instrumentation.report()
+        self.assertIn("BitboardEscalatorGame.move", table)
+        with self.assertRaises(ValueError):
+            instrumentation.report("xml")
+
+    def test_environment(self):
+        """
+        Test that the environment variable profiles the whole process and
+        reports at exit.
+        """
+
+        code = (
+            "from src.games.escalator import EscalatorGame\n"
+            "game = EscalatorGame(seed=0)\n"
+            "game.deal()\n"
+            "game.move(game.available_moves[0][1])\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            env={**os.environ, instrumentation.PROFILE_ENV: "json"},
+            capture_output=True, text=True, check=True,
+        )
+        stats = json.loads(result.stderr)["stats"]
+        self.assertEqual(stats["EscalatorGame.move"]["calls"], 1)
+        self.assertEqual(stats["EscalatorGame.deal_deck"]["calls"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
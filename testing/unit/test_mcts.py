@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+"""
+Test src/agents/mcts.py
+
+Monte Carlo Tree Search agent for Escalator Solitaire
+"""
+
+import time
+import unittest
+
+from src.agents.mcts import MCTS, MCTSAgent, Ponderer, Position
+from src.games.escalator import (
+    NUM_ACTIONS,
+    PYRAMID_SIZE,
+    BitboardEscalatorGame,
+    EscalatorGame,
+)
+
+
+class TestMCTS(unittest.TestCase):
+    """
+    Test searching a position
+    """
+
+    def test_stock_order_hidden(self):
+        """
+        Test that games differing only in the order of the stock have the
+        same position.
+        """
+
+        deck = list(range(52))
+        game = BitboardEscalatorGame()
+        game.deal_deck(deck)
+        other = EscalatorGame()
+        other.deal_deck(
+            deck[:PYRAMID_SIZE] + list(reversed(deck[PYRAMID_SIZE:]))
+        )
+        before = Position.of(game)
+        self.assertEqual(Position.of(other), before)
+        game.move_action(0)
+        other.move_action(0)
+        self.assertNotEqual(Position.of(game), Position.of(other))
+        for position in (Position.of(game), Position.of(other)):
+            self.assertTrue(position.follows(before))
+            self.assertEqual(before.after(0, position.waste), position)
+
+    def test_iteration_budget(self):
+        """
+        Test that the search runs as many iterations as asked, each adding
+        one visit to the root.
+        """
+
+        game = BitboardEscalatorGame(seed=2)
+        game.deal()
+        tree = MCTS(seed=0)
+        self.assertFalse(tree.set_position(Position.of(game)))
+        self.assertEqual(tree.search(iterations=200), 200)
+        self.assertEqual(tree.root.total, 200)
+        self.assertEqual(sum(tree.root.visits), 200)
+        self.assertGreater(tree.search(time_limit=0.01), 0)
+        with self.assertRaises(ValueError):
+            tree.search()
+
+    def test_tree_reuse(self):
+        """
+        Test that the subtree below each move made is kept.
+        """
+
+        game = BitboardEscalatorGame(seed=3)
+        game.deal()
+        tree = MCTS(seed=0)
+        tree.set_position(Position.of(game))
+        for _ in range(6):
+            tree.search(iterations=300)
+            action = max(
+                range(NUM_ACTIONS), key=lambda action: tree.root.visits[action]
+            )
+            game.move_action(action)
+            position = Position.of(game)
+            key = action if action != 0 else NUM_ACTIONS + position.waste
+            child = tree.root.children.get(key)
+            self.assertEqual(tree.set_position(position), child is not None)
+            if child is not None:
+                self.assertIs(tree.root, child)
+
+        # A new deal starts a new tree
+        game.deal()
+        self.assertFalse(tree.set_position(Position.of(game)))
+        self.assertEqual(tree.root.total, 0)
+
+
+class TestPonderer(unittest.TestCase):
+    """
+    Test searching in the background
+    """
+
+    def test_ponder_flip(self):
+        """
+        Test that pondering a flip searches below it, ready for the card
+        turned up.
+        """
+
+        game = BitboardEscalatorGame(seed=8)
+        game.deal()
+        game.move_action(0)
+        tree = MCTS(seed=0)
+        tree.set_position(Position.of(game))
+        ponderer = Ponderer(tree, chunk=16)
+        try:
+            self.assertTrue(ponderer.start(first_action=0))
+            time.sleep(0.1)
+            iterations = ponderer.stop()
+            self.assertGreater(iterations, 0)
+            self.assertEqual(tree.root.total, iterations)
+            self.assertEqual(tree.root.visits[0], iterations)
+            # Stopped, so the tree no longer grows
+            time.sleep(0.05)
+            self.assertEqual(tree.root.total, iterations)
+
+            # Every card turned up that was searched has its subtree kept
+            key, child = max(
+                tree.root.children.items(), key=lambda item: item[1].total
+            )
+            position = Position.of(game).after(0, key - NUM_ACTIONS)
+            self.assertTrue(tree.set_position(position))
+            self.assertIs(tree.root, child)
+            self.assertGreater(tree.root.total, 0)
+        finally:
+            ponderer.close()
+
+    def test_nothing_to_ponder(self):
+        tree = MCTS(seed=0)
+        ponderer = Ponderer(tree)
+        self.assertFalse(ponderer.start())
+        self.assertEqual(ponderer.stop(), 0)
+        ponderer.close()
+
+
+class TestMCTSAgent(unittest.TestCase):
+    """
+    Test playing games by search
+    """
+
+    def test_plays_legal_moves(self):
+        """
+        Test that the agent plays games to the end on both engines.
+        """
+
+        agent = MCTSAgent(iterations=20, seed=1)
+        for engine in (EscalatorGame, BitboardEscalatorGame):
+            game = engine(seed=5)
+            game.deal()
+            while not (game.in_winning_state or game.in_losing_state):
+                action = agent(game, None)
+                self.assertTrue(game.legal_actions >> action & 1)
+                game.move_action(action)
+
+    def test_workers(self):
+        """
+        Test that searches across workers add up.
+        """
+
+        game = BitboardEscalatorGame(seed=6)
+        game.deal()
+        with MCTSAgent(iterations=50, num_workers=2, seed=1) as agent:
+            for _ in range(3):
+                action = agent(game, None)
+                self.assertEqual(agent.last_iterations, 150)
+                self.assertGreater(agent.simulations_per_second, 0)
+                game.move_action(action)
+
+    def test_no_budget(self):
+        with self.assertRaises(ValueError):
+            MCTSAgent()
+
+    def test_no_legal_moves(self):
+        """
+        Test that a game with no moves left is refused, rather than
+        searched.
+        """
+
+        game = BitboardEscalatorGame()
+        game.deal_deck(list(range(52)), stock_index=PYRAMID_SIZE - 1)
+        self.assertEqual(game.legal_actions, 0)
+        with self.assertRaisesRegex(ValueError, "No legal moves"):
+            MCTSAgent(iterations=10)(game, None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+"""
+Test src/training/metrics.py
+
+Streaming statistics of games played
+"""
+
+import pickle
+import unittest
+
+import numpy as np
+
+from src.agents.policies import greedy_policy
+from src.training.metrics import (
+    GameStats,
+    Histogram,
+    QuantileSketch,
+    RunningMoments,
+)
+from src.training.rollout import play_episode
+
+
+class TestStreamingStatistics(unittest.TestCase):
+    """
+    Test the online algorithms
+    """
+
+    def setUp(self):
+        self.values = np.random.default_rng(0).normal(5, 2, 20_000)
+
+    def test_moments(self):
+        """
+        Test that the moments match those of all the values, also when
+        merged from parts.
+        """
+
+        whole = RunningMoments()
+        parts = [RunningMoments() for _ in range(3)]
+        for i, value in enumerate(self.values.tolist()):
+            whole.add(value)
+            parts[i % 7 % 3].add(value)
+        merged = RunningMoments()
+        for part in parts + [RunningMoments()]:
+            merged.merge(part)
+
+        for moments in (whole, merged):
+            self.assertEqual(moments.count, len(self.values))
+            self.assertAlmostEqual(moments.mean, self.values.mean())
+            self.assertAlmostEqual(
+                moments.variance, self.values.var(ddof=1)
+            )
+            self.assertEqual(moments.minimum, self.values.min())
+            self.assertEqual(moments.maximum, self.values.max())
+        self.assertEqual(RunningMoments().variance, 0)
+
+    def test_histogram(self):
+        """
+        Test that the bins match numpy's, with values out of range counted
+        apart.
+        """
+
+        histogram = Histogram(0, 10, 20)
+        for value in self.values.tolist():
+            histogram.add(value)
+        expected, edges = np.histogram(self.values, 20, (0, 10))
+        self.assertTrue(np.array_equal(histogram.edges, edges))
+        self.assertEqual(histogram.underflow, np.sum(self.values < 0))
+        self.assertEqual(histogram.overflow, np.sum(self.values >= 10))
+        # numpy puts the end of the range in the last bin
+        expected[-1] -= np.sum(self.values == 10)
+        self.assertTrue(np.array_equal(histogram.counts, expected))
+
+        many = Histogram(0, 10, 20)
+        many.add_many(self.values[:5000])
+        many.add_many(self.values[5000:])
+        self.assertTrue(np.array_equal(many._counts, histogram._counts))
+        many.merge(histogram)
+        self.assertTrue(np.array_equal(many.counts, 2 * histogram.counts))
+        with self.assertRaises(ValueError):
+            many.merge(Histogram(0, 10, 10))
+
+    def test_quantile_sketch(self):
+        """
+        Test that the quantiles are close in rank, in bounded memory, also
+        when merged from pickled parts.
+        """
+
+        sketch = QuantileSketch(k=200, seed=0)
+        parts = [QuantileSketch(k=200, seed=seed) for seed in range(1, 4)]
+        for i, value in enumerate(self.values.tolist()):
+            sketch.add(value)
+            parts[i % 3].add(value)
+        merged = pickle.loads(pickle.dumps(parts[0]))
+        for part in parts[1:]:
+            merged.merge(pickle.loads(pickle.dumps(part)))
+
+        ordered = np.sort(self.values)
+        for estimate in (sketch, merged):
+            self.assertEqual(len(estimate), len(self.values))
+            self.assertLess(estimate.num_retained, 3 * 200)
+            for q in (0, 0.01, 0.25, 0.5, 0.9, 0.99, 1):
+                rank = np.searchsorted(ordered, estimate.quantile(q)) + 1
+                self.assertLess(abs(rank / len(ordered) - q), 0.02)
+
+        with self.assertRaises(ValueError):
+            QuantileSketch().quantile(0.5)
+        with self.assertRaises(ValueError):
+            sketch.quantile(1.5)
+
+
+class TestGameStats(unittest.TestCase):
+    """
+    Test gathering the statistics of games
+    """
+
+    def test_moves(self):
+        """
+        Test the figures of games fed move by move.
+        """
+
+        stats = GameStats()
+        # Two chains, of 2 and 1 clears
+        for action, reward in ((0, 0), (3, 1), (5, 1), (0, 0), (0, 0)):
+            stats.record_move(action, reward)
+        stats.record_move(1, -99)
+        stats.end_game(False)
+        stats.record_move(0, 0)
+        stats.end_game(True)
+
+        self.assertEqual(stats.games, 2)
+        self.assertEqual(stats.win_rate, 0.5)
+        self.assertEqual((stats.flips, stats.clears), (4, 3))
+        self.assertEqual(stats.length.summary()["max"], 6)
+        self.assertEqual(stats.score.moments.mean, -48.5)
+        self.assertEqual(stats.chain.moments.count, 2)
+        self.assertEqual(stats.chain.moments.mean, 1.5)
+
+    def test_merge(self):
+        """
+        Test that stats gathered apart and merged are those gathered
+        together.
+        """
+
+        trajectories = [
+            play_episode(greedy_policy, seed) for seed in range(60)
+        ]
+        whole = GameStats(seed=0)
+        parts = [GameStats(seed=0), GameStats(seed=1)]
+        for i, trajectory in enumerate(trajectories):
+            whole.add_trajectory(trajectory)
+            parts[i % 2].add_trajectory(trajectory)
+        parts[0].merge(pickle.loads(pickle.dumps(parts[1])))
+
+        self.assertEqual(whole.games, 60)
+        self.assertEqual(
+            whole.wins, sum(trajectory.won for trajectory in trajectories)
+        )
+        for name in ("games", "wins", "flips", "clears"):
+            self.assertEqual(getattr(parts[0], name), getattr(whole, name))
+        for name in ("score", "length", "chain"):
+            expected = getattr(whole, name)
+            actual = getattr(parts[0], name)
+            self.assertAlmostEqual(
+                actual.moments.mean, expected.moments.mean
+            )
+            self.assertTrue(np.array_equal(
+                actual.histogram.counts, expected.histogram.counts
+            ))
+        self.assertEqual(whole.score.histogram.underflow, 0)
+        self.assertEqual(whole.score.histogram.overflow, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+"""
+Test src/games/render.py
+
+Terminal rendering of Escalator Solitaire
+"""
+
+import io
+import random
+import re
+import unittest
+
+from src.games.escalator import EscalatorGame
+from src.games.render import FRAME_LINES, TerminalRenderer
+
+
+_ESCAPE = re.compile(r"\033\[(?:(\d+);(\d+)H|2J|K)")
+
+
+class Screen:
+    """
+    Applies the output of the renderer to a grid of characters.
+    """
+
+    def __init__(self):
+        self.lines = [[] for _ in range(FRAME_LINES + 2)]
+        self.cells_written = 0
+
+    def apply(self, output: str) -> None:
+        line = column = 0
+        for text, escape in zip(
+            _ESCAPE.split(output)[::3], _ESCAPE.finditer(output + "\033[K")
+        ):
+            self.write(line, column, text)
+            if escape.group(1) is not None:
+                line, column = int(escape.group(1)) - 1, int(escape.group(2))
+                column -= 1
+                self.cells_written += 1
+
+    def write(self, line: int, column: int, text: str) -> None:
+        if len(text) == 0:
+            return
+        row = self.lines[line]
+        row.extend(" " * (column + len(text) - len(row)))
+        row[column:column + len(text)] = text
+
+    def frame(self) -> str:
+        return "\n".join(
+            "".join(row).rstrip() for row in self.lines[:FRAME_LINES]
+        )
+
+
+class TestTerminalRenderer(unittest.TestCase):
+    """
+    Test drawing games to a terminal
+    """
+
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.time = 0.0
+        self.renderer = TerminalRenderer(
+            self.stream, max_fps=10, clock=lambda: self.time
+        )
+        self.screen = Screen()
+
+    def draw(self, game: EscalatorGame, force: bool = False) -> bool:
+        drawn = self.renderer.render(game, force)
+        self.screen.apply(self.stream.getvalue())
+        self.stream.seek(0)
+        self.stream.truncate()
+        return drawn
+
+    def expected(self, game: EscalatorGame) -> str:
+        return "\n".join(line.rstrip() for line in game.display().split("\n"))
+
+    def test_matches_display(self):
+        """
+        Test that the screen shows what display() does, while only the
+        changed cells are written.
+        """
+
+        game = EscalatorGame(seed=0)
+        game.deal()
+        chooser = random.Random(0)
+        self.assertTrue(self.draw(game))
+        self.assertEqual(self.screen.frame(), self.expected(game))
+        self.assertEqual(self.screen.cells_written, 30)
+
+        while not (game.in_winning_state or game.in_losing_state):
+            self.time += 1
+            destination = chooser.choice(game.available_moves)[1]
+            game.move(destination)
+            self.screen.cells_written = 0
+            self.assertTrue(self.draw(game))
+            self.assertEqual(self.screen.frame(), self.expected(game))
+            # A flip changes the waste (and the stock when emptied), and a
+            # clear changes the waste and the cleared slot
+            self.assertLessEqual(self.screen.cells_written, 2)
+
+    def test_frame_rate(self):
+        """
+        Test that frames too soon after the last are dropped, unless
+        forced, and that the next frame drawn catches up.
+        """
+
+        game = EscalatorGame(seed=1)
+        game.deal()
+        self.assertTrue(self.draw(game))
+        for _ in range(3):
+            self.time += 0.03
+            game.move(game.available_moves[0][1])
+            self.assertFalse(self.draw(game))
+        self.assertEqual(self.renderer.dropped, 3)
+        self.assertNotEqual(self.screen.frame(), self.expected(game))
+
+        self.time += 0.03
+        self.assertTrue(self.draw(game, force=True))
+        self.assertEqual(self.screen.frame(), self.expected(game))
+
+        game.move(game.available_moves[0][1])
+        self.time += 0.1
+        self.assertTrue(self.draw(game))
+        self.assertEqual(self.screen.frame(), self.expected(game))
+
+    def test_no_frame_rate(self):
+        """
+        Test that no frames are dropped without a limit, including for a
+        limit of 0 or less.
+        """
+
+        game = EscalatorGame(seed=1)
+        game.deal()
+        for max_fps in (None, 0, -1):
+            self.renderer = TerminalRenderer(
+                self.stream, max_fps=max_fps, clock=lambda: self.time
+            )
+            for _ in range(3):
+                self.assertTrue(self.draw(game, force=True))
+                self.assertTrue(self.draw(game))
+            self.assertEqual(self.renderer.dropped, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+"""
+Test src/agents/replay.py
+
+Ring buffer of transitions to learn from
+"""
+
+import unittest
+
+import numpy as np
+
+from src.agents.replay import ReplayBuffer
+
+
+def add_episode(
+    buffer: ReplayBuffer, start: int, length: int
+) -> list[int]:
+    """
+    Add an episode whose observations count up from start, with the action
+    and reward of each transition being its step.
+    """
+
+    indices = []
+    for step in range(length):
+        indices.append(buffer.add(
+            np.full(3, start + step),
+            step,
+            step,
+            np.full(3, start + step + 1),
+            step == length - 1,
+        ))
+    return indices
+
+
+class TestReplayBuffer(unittest.TestCase):
+    """
+    Test storing and sampling transitions
+    """
+
+    def test_observations_stored_once(self):
+        """
+        Test that the next state of a transition is the following slot, and
+        only the end of each episode takes an extra slot.
+        """
+
+        buffer = ReplayBuffer(16, (3,), seed=0)
+        self.assertEqual(add_episode(buffer, 0, 4), [0, 1, 2, 3])
+        self.assertEqual(add_episode(buffer, 10, 3), [5, 6, 7])
+        self.assertEqual(len(buffer), 7)
+
+        states, actions, rewards, next_states, dones, indices = (
+            buffer.sample(200)
+        )
+        self.assertTrue(np.all(next_states == states + 1))
+        self.assertTrue(np.all(actions == rewards))
+        self.assertTrue(np.all(dones == np.isin(indices, (3, 7))))
+        self.assertEqual(set(indices), {0, 1, 2, 3, 5, 6, 7})
+
+    def test_overwrites_oldest(self):
+        """
+        Test that once full, the oldest transitions are overwritten and no
+        longer sampled.
+        """
+
+        buffer = ReplayBuffer(8, (3,), seed=0)
+        add_episode(buffer, 0, 5)
+        add_episode(buffer, 20, 5)
+        # The second episode wraps round over the first four slots
+        self.assertEqual(len(buffer), 5 + 1)
+
+        states, _, _, next_states, _, indices = buffer.sample(200)
+        self.assertTrue(np.all(next_states == states + 1))
+        self.assertEqual(set(indices), {4, 6, 7, 0, 1, 2})
+        self.assertEqual(set(states[indices == 4, 0]), {4})
+
+    def test_prioritized_sampling(self):
+        """
+        Test that transitions are sampled by their priority.
+        """
+
+        buffer = ReplayBuffer(16, (3,), alpha=1.0, seed=0)
+        indices = np.array(add_episode(buffer, 0, 4))
+        buffer.update_priorities(indices, [1e-9, 1e-9, 1e-9, 1.0])
+
+        _, _, _, _, _, sampled, weights = buffer.sample_prioritized(100)
+        self.assertTrue(np.all(sampled == 3))
+        self.assertTrue(np.all(weights == 1))
+
+        buffer.update_priorities(indices, [1.0, 3.0, 1e-9, 1e-9])
+        _, _, _, _, _, sampled, weights = buffer.sample_prioritized(
+            4000, beta=1.0
+        )
+        self.assertEqual(set(sampled), {0, 1})
+        self.assertAlmostEqual(np.mean(sampled == 1), 0.75, delta=0.05)
+        self.assertTrue(np.allclose(weights[sampled == 0], 1))
+        self.assertTrue(np.allclose(weights[sampled == 1], 1 / 3))
+
+    def test_empty(self):
+        """
+        Test that nothing can be sampled before a transition is added.
+        """
+
+        buffer = ReplayBuffer(4, (3,))
+        with self.assertRaises(ValueError):
+            buffer.sample(1)
+        with self.assertRaises(ValueError):
+            buffer.sample_prioritized(1)
+
+    def test_state_dict(self):
+        """
+        Test that a buffer loaded from another carries on as it would.
+        """
+
+        buffer = ReplayBuffer(8, (3,), seed=0)
+        add_episode(buffer, 0, 5)
+        add_episode(buffer, 10, 2)
+        loaded = ReplayBuffer(8, (3,), seed=0)
+        loaded.load_state_dict(buffer.state_dict())
+        self.assertEqual(len(loaded), len(buffer))
+
+        # A copy, so later changes to the buffer are not seen
+        state = buffer.state_dict()
+        self.assertEqual(add_episode(buffer, 20, 3), [1, 2, 3])
+        self.assertEqual(add_episode(loaded, 20, 3), [1, 2, 3])
+        for name, array in buffer.state_dict().items():
+            self.assertTrue(np.array_equal(loaded.state_dict()[name], array))
+        self.assertFalse(np.array_equal(
+            state["observations"], buffer.state_dict()["observations"]
+        ))
+
+        with self.assertRaises(ValueError):
+            ReplayBuffer(4, (3,)).load_state_dict(state)
+
+    def test_memory_per_transition(self):
+        """
+        Test that a transition of Escalator observations takes tens of
+        bytes.
+        """
+
+        buffer = ReplayBuffer(1000, (30,))
+        self.assertLess(buffer.nbytes / buffer.capacity, 64)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+"""
+Test src/training/rollout.py
+
+Self-play rollouts for Escalator Solitaire
+"""
+
+import unittest
+
+from src.agents.policies import greedy_policy, random_policy
+from src.games.escalator import BitboardEscalatorGame
+from src.training.rollout import RolloutFarm, play_episode
+
+
+class TestRolloutFarm(unittest.TestCase):
+    """
+    Test playing games across worker processes
+    """
+
+    def test_same_games_for_seeds(self):
+        """
+        Test that the workers play the same games for the seeds as are
+        played in process, however they are split up.
+        """
+
+        expected = [play_episode(random_policy, seed) for seed in range(30)]
+        with RolloutFarm(random_policy, 2, chunk_size=4) as farm:
+            unordered = list(farm.run(range(30)))
+            ordered = list(farm.run(range(30), ordered=True))
+        self.assertEqual(ordered, expected)
+        self.assertEqual(
+            sorted(unordered, key=lambda trajectory: trajectory.seed),
+            expected,
+        )
+        with RolloutFarm(random_policy, 0) as farm:
+            self.assertEqual(list(farm.run(range(30))), expected)
+
+    def test_trajectory_replays(self):
+        """
+        Test that replaying the actions on the deal gives the rewards.
+        """
+
+        trajectory = play_episode(random_policy, 11)
+        game = BitboardEscalatorGame(detect_dead_ends=True)
+        game.deal_deck(trajectory.deal)
+        rewards = tuple(
+            game.move_action(action) for action in trajectory.actions
+        )
+        self.assertEqual(rewards, trajectory.rewards)
+        self.assertTrue(game.in_winning_state or game.in_losing_state)
+        self.assertEqual(game.in_winning_state, trajectory.won)
+
+    def test_greedy_policy(self):
+        """
+        Test that the greedy policy only flips the stock when it cannot
+        clear a card.
+        """
+
+        trajectory = play_episode(greedy_policy, 3)
+        game = BitboardEscalatorGame(detect_dead_ends=True)
+        game.deal_deck(trajectory.deal)
+        for action in trajectory.actions:
+            if action == 0:
+                self.assertEqual(game.legal_actions, 1)
+            game.move_action(action)
+        self.assertTrue(game.in_winning_state or game.in_losing_state)
+
+    def test_dead_ends_cut_short(self):
+        """
+        Test that stopping at dead ends only cuts games short, and only
+        those that are lost.
+        """
+
+        shorter = 0
+        for seed in range(30):
+            full = play_episode(random_policy, seed, detect_dead_ends=False)
+            cut = play_episode(random_policy, seed)
+            length = len(cut.actions)
+            self.assertEqual(cut.actions, full.actions[:length])
+            self.assertEqual(cut.rewards[:-1], full.rewards[:length - 1])
+            self.assertEqual(cut.won, full.won)
+            shorter += length < len(full.actions)
+        self.assertGreater(shorter, 0)
+
+    def test_closed_farm(self):
+        """
+        Test that a farm cannot be used once shut down.
+        """
+
+        farm = RolloutFarm(random_policy, 1)
+        farm.close()
+        with self.assertRaises(ValueError):
+            next(farm.run(range(2)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+"""
+Test src/training/snapshots.py
+
+Random access to the positions of a recorded episode
+"""
+
+import unittest
+
+from src.agents.policies import greedy_policy, random_policy
+from src.games.escalator import BitboardEscalatorGame, EscalatorGame
+from src.training.rollout import play_episode
+from src.training.snapshots import SNAPSHOT_DTYPE, EpisodeSnapshots
+
+
+class TestEpisodeSnapshots(unittest.TestCase):
+    """
+    Test rebuilding positions from snapshots
+    """
+
+    def setUp(self):
+        self.trajectories = [
+            play_episode(policy, seed, detect_dead_ends=False)
+            for seed in range(4)
+            for policy in (random_policy, greedy_policy)
+        ]
+
+    def assertSamePosition(self, game, expected):
+        self.assertEqual(game.state_hash, expected.state_hash)
+        self.assertEqual(game.state_hash, game.compute_hash())
+        self.assertEqual(game.display(), expected.display())
+        self.assertEqual(game.foundation, expected.foundation)
+        self.assertEqual(game.legal_actions, expected.legal_actions)
+        self.assertEqual(game.in_losing_state, expected.in_losing_state)
+        self.assertEqual(game.encode(), expected.encode())
+
+    def test_every_step(self):
+        """
+        Test that every position is the same as replaying from the deal, on
+        both engines.
+        """
+
+        for engine in (EscalatorGame, BitboardEscalatorGame):
+            for trajectory in self.trajectories:
+                for interval in (1, 5, 16):
+                    snapshots = EpisodeSnapshots.from_trajectory(
+                        trajectory, interval, engine
+                    )
+                    self.assertEqual(
+                        len(snapshots), len(trajectory.actions) + 1
+                    )
+
+                    expected = engine()
+                    expected.deal_deck(trajectory.deal)
+                    reused = engine()
+                    for step in range(len(snapshots)):
+                        game = snapshots.state_at(step)
+                        self.assertIsInstance(game, engine)
+                        self.assertSamePosition(game, expected)
+                        self.assertIs(
+                            snapshots.state_at(step, reused), reused
+                        )
+                        self.assertSamePosition(reused, expected)
+                        if step < len(trajectory.actions):
+                            expected.move_action(trajectory.actions[step])
+
+    def test_out_of_order(self):
+        """
+        Test that positions can be had in any order.
+        """
+
+        trajectory = self.trajectories[1]
+        snapshots = EpisodeSnapshots.from_trajectory(trajectory, 4)
+        games = [snapshots.state_at(step) for step in range(len(snapshots))]
+        game = EscalatorGame()
+        for step in reversed(range(len(snapshots))):
+            snapshots.state_at(step, game)
+            self.assertEqual(game.state_hash, games[step].state_hash)
+
+        with self.assertRaises(IndexError):
+            snapshots.state_at(len(snapshots))
+        with self.assertRaises(IndexError):
+            snapshots.state_at(-1)
+        with self.assertRaises(ValueError):
+            EpisodeSnapshots(trajectory.deal, trajectory.actions, 0)
+
+    def test_compact(self):
+        """
+        Test that the snapshots take a few bytes per interval.
+        """
+
+        trajectory = max(
+            self.trajectories, key=lambda trajectory: len(trajectory.actions)
+        )
+        snapshots = EpisodeSnapshots.from_trajectory(trajectory, 8)
+        self.assertLessEqual(
+            snapshots.nbytes,
+            (len(trajectory.actions) // 8 + 1) * SNAPSHOT_DTYPE.itemsize + 28,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()